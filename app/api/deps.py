@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from app.core import security
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.user_cache import CachedUser, user_cache
 from app.models.user import User, UserRole
 from app.crud import user as crud_user
 
@@ -14,7 +15,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login/acce
 def get_current_user(
     db: Session = Depends(get_db),
     token: str = Depends(oauth2_scheme)
-) -> User:
+) -> CachedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Não foi possível validar as credenciais",
@@ -28,16 +29,21 @@ def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = crud_user.get_user_by_username(db, username=username)
+    # Na maioria das requisições o usuário já está no cache e não vamos ao banco
+    user = user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        db_user = crud_user.get_user_by_username(db, username=username)
+        if db_user is None:
+            raise credentials_exception
+        user = user_cache.set(db_user)
+
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Usuário inativo")
     return user
 
 def get_current_active_superuser(
-    current_user: User = Depends(get_current_user),
-) -> User:
+    current_user: CachedUser = Depends(get_current_user),
+) -> CachedUser:
     if current_user.role != UserRole.ADMIN:
         raise HTTPException(
             status_code=400, detail="O usuário não tem privilégios suficientes (Requer Admin)"
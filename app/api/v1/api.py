@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, users, upload
+from app.api.v1.endpoints import auth, users, upload, resumable, catalog
 
 api_router = APIRouter()
 
@@ -13,4 +13,12 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 
 # 3. Rotas de Upload (Enviar Arquivo, Exportar CSV)
 # URL final: /api/v1/upload/
-api_router.include_router(upload.router, prefix="/upload", tags=["upload"])
\ No newline at end of file
+api_router.include_router(upload.router, prefix="/upload", tags=["upload"])
+
+# 4. Upload resumível em chunks (arquivos grandes)
+# URL final: /api/v1/upload/sessions/
+api_router.include_router(resumable.router, prefix="/upload/sessions", tags=["upload"])
+
+# 5. Catálogo do que está no SFTP (navegação/busca e reconciliação, só admin)
+# URL final: /api/v1/upload/catalog/
+api_router.include_router(catalog.router, prefix="/upload/catalog", tags=["catalog"])
\ No newline at end of file
@@ -0,0 +1,109 @@
+from typing import Any, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+import base64
+
+from app.core.database import get_db
+from app.api import deps
+from app.core.user_cache import CachedUser
+from app.models.upload import DataType
+from app.schemas import remote_catalog as catalog_schema
+from app.services.catalog import catalog_reconciler
+from app.crud import remote_catalog as crud_catalog
+
+router = APIRouter()
+
+def _encode_cursor(item) -> str:
+    raw = f"{item.sftp_host}|{item.path}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        sftp_host, path = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return path, sftp_host
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+@router.get("/", response_model=catalog_schema.RemoteObjectPage)
+def browse_catalog(
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin
+    data_type: Optional[DataType] = None,
+    year: Optional[int] = Query(None, ge=1000, le=9999),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    directory: Optional[str] = None,
+    q: Optional[str] = None,
+    kind: Optional[str] = Query("data", pattern="^(data|metadata|partial)$"),
+    sftp_host: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+) -> Any:
+    """
+    Navega/busca o que está no SFTP a partir do catálogo (sem listar o servidor).
+    - data_type + year/month: ex. "o que temos de dados_relogios em 2024/05".
+    - directory: só os arquivos desta pasta remota; q: parte do nome do arquivo.
+    - kind: data (padrão), metadata (.json/manifestos) ou partial (.part em andamento).
+    Itens com source "upload" ainda não foram conferidos pela reconciliação.
+    """
+    if month is not None and year is None:
+        raise HTTPException(status_code=400, detail="Informe year junto com month.")
+    period = None
+    if year is not None:
+        period = f"{year:04d}/{month:02d}" if month is not None else f"{year:04d}/"
+
+    filters = dict(
+        sftp_host=sftp_host, data_type=data_type, period=period, directory=directory, name_contains=q, kind=kind
+    )
+    after = _decode_cursor(cursor) if cursor else None
+
+    # Busca um a mais para saber se existe próxima página
+    items = crud_catalog.get_remote_objects_page(db, limit=limit + 1, after=after, **filters)
+    total_files, total_bytes = crud_catalog.get_remote_objects_totals(db, **filters)
+
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {
+        "items": items,
+        "total_files": total_files,
+        "total_bytes": total_bytes,
+        "next_cursor": _encode_cursor(items[-1]) if has_more else None,
+    }
+
+@router.get("/drift", response_model=catalog_schema.RemoteDriftPage)
+def list_catalog_drift(
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin
+    drift: Optional[str] = Query(None, pattern="^(unknown|missing|changed)$"),
+    sftp_host: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = None,
+) -> Any:
+    """
+    Diferenças encontradas pela reconciliação, da mais recente para a mais antiga.
+    Para a próxima página, envie o `next_cursor` recebido em `cursor`.
+    """
+    items = crud_catalog.get_drift_page(db, limit=limit + 1, before_id=cursor, sftp_host=sftp_host, drift=drift)
+    has_more = len(items) > limit
+    items = items[:limit]
+    return {"items": items, "next_cursor": str(items[-1].id) if has_more else None}
+
+@router.get("/reconcile")
+def read_reconcile_status(
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin
+) -> Any:
+    """
+    Configuração e resultado da última reconciliação do catálogo.
+    """
+    return catalog_reconciler.stats()
+
+@router.post("/reconcile")
+async def run_reconcile(
+    full: bool = False,
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin
+) -> Any:
+    """
+    Reconcilia o catálogo agora (full=true força relistar todas as pastas, não só as alteradas).
+    Responde quando termina, com o resumo por destino. 409 se já houver uma rodando.
+    """
+    return await run_in_threadpool(catalog_reconciler.reconcile, full or None)
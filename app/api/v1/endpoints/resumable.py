@@ -0,0 +1,286 @@
+from typing import Any, Dict, Optional, Tuple
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from starlette.requests import ClientDisconnect
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+
+from app.core.config import settings
+from app.core.database import SessionLocal, get_db
+from app.api import deps
+from app.models.user import UserRole
+from app.core.user_cache import CachedUser
+from app.models.upload import UploadStatus
+from app.models.upload_session import UploadSession, UploadSessionStatus
+from app.schemas import upload as upload_schema
+from app.schemas import upload_session as session_schema
+from app.services.sftp_router import sftp_service
+from app.services.streams import new_hasher
+from app.crud import upload as crud_upload
+from app.crud import upload_session as crud_session
+
+router = APIRouter()
+
+def _get_open_session(db: Session, session_id: str, current_user: CachedUser) -> UploadSession:
+    is_admin = current_user.role == UserRole.ADMIN
+    db_session = crud_session.get_upload_session(db, session_id, user_id=None if is_admin else current_user.id)
+    if db_session is None:
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada.")
+    if db_session.status != UploadSessionStatus.OPEN:
+        raise HTTPException(status_code=409, detail=f"Sessão de upload já está '{db_session.status.value}'.")
+    return db_session
+
+@router.post("/", response_model=session_schema.UploadSessionResponse, status_code=201)
+def create_upload_session(
+    *,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+    session_in: session_schema.UploadSessionCreate,
+) -> Any:
+    """
+    Abre um upload resumível. Depois: PUT dos chunks com o header Upload-Offset,
+    GET para saber o offset atual e POST /finalize ao terminar.
+    """
+    session_id = uuid.uuid4().hex
+    sftp_host, part_path, final_path = sftp_service.create_remote_file(
+        session_in.data_type.value, session_in.filename, session_id
+    )
+    return crud_session.create_upload_session(
+        db,
+        session_id=session_id,
+        filename=session_in.filename,
+        data_type=session_in.data_type,
+        user_id=current_user.id,
+        remote_path=part_path,
+        final_path=final_path,
+        total_size=session_in.total_size,
+        sftp_host=sftp_host
+    )
+
+@router.get("/{session_id}", response_model=session_schema.UploadSessionResponse)
+def read_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Estado da sessão; `offset` é de onde o cliente deve continuar após uma queda.
+    """
+    is_admin = current_user.role == UserRole.ADMIN
+    db_session = crud_session.get_upload_session(db, session_id, user_id=None if is_admin else current_user.id)
+    if db_session is None:
+        raise HTTPException(status_code=404, detail="Sessão de upload não encontrada.")
+    return db_session
+
+# Hash acumulado chunk a chunk das sessões que este processo recebeu desde o início:
+# {session_id: (offset até onde o hash vai, {algoritmo: hasher})}. Com ele o finalize
+# não relê o arquivo. Perdido num restart (ou chunk que caiu em outro worker): aí o
+# finalize usa o check-file do servidor ou calcula o hash em background.
+_chunk_hashes: Dict[str, Tuple[int, dict]] = {}
+_chunk_hashes_lock = threading.Lock()
+
+def _hash_algorithms() -> set:
+    algorithms = {settings.UPLOAD_HASH_ALGORITHM}
+    if settings.SFTP_VERIFY_MODE == "checksum":
+        algorithms.add(settings.SFTP_VERIFY_HASH_ALGORITHM)
+    return algorithms
+
+def _hashers_from(session_id: str, offset: int) -> Optional[dict]:
+    # Cópias: só viram o novo estado se o offset da sessão avançar
+    with _chunk_hashes_lock:
+        state = _chunk_hashes.get(session_id)
+    if state is not None and state[0] == offset:
+        return {algorithm: hasher.copy() for algorithm, hasher in state[1].items()}
+    if offset == 0:
+        return {algorithm: new_hasher(algorithm) for algorithm in _hash_algorithms()}
+    return None
+
+def _write_chunk(db_session: UploadSession, spool, offset: int, hashers: Optional[dict]) -> int:
+    """
+    Copia o chunk já recebido para o arquivo remoto (atualizando `hashers` com o que
+    foi escrito). Só aqui a sessão do pool é usada.
+    """
+    writer = sftp_service.open_chunk_writer(db_session.sftp_host, db_session.remote_path, offset)
+    try:
+        while True:
+            data = spool.read(settings.RESUMABLE_WRITE_BUFFER)
+            if not data:
+                break
+            writer.write(data)
+            for hasher in (hashers or {}).values():
+                hasher.update(data)
+    except Exception:
+        writer.abort()
+        raise
+    return writer.close()
+
+def _hash_in_background(upload_id: int, sftp_host: Optional[str], final_path: str):
+    """
+    Finalize sem hash acumulado nem check-file: relê o arquivo remoto fora da requisição
+    e preenche content_hash no log (e no catálogo) quando terminar.
+    """
+    try:
+        content_hash = sftp_service.hash_remote_file(sftp_host, final_path)
+        db = SessionLocal()
+        try:
+            crud_upload.set_content_hash(db, upload_id, content_hash)
+        finally:
+            db.close()
+        print(f"Hash de {final_path} calculado em background.")
+    except Exception as e:
+        print(f"Falha ao calcular o hash de {final_path} em background: {e}")
+
+@router.put("/{session_id}", response_model=session_schema.UploadSessionResponse)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Recebe um chunk (corpo bruto) e grava no arquivo remoto a partir de Upload-Offset.
+    O corpo é recebido inteiro antes de pegar uma sessão do pool (em memória até
+    RESUMABLE_WRITE_BUFFER, acima disso em arquivo temporário): cliente lento não
+    segura conexão SFTP. Nunca passa do total_size declarado (413).
+    """
+    db_session = await run_in_threadpool(_get_open_session, db, session_id, current_user)
+
+    if upload_offset != db_session.offset:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Offset inválido: esperado {db_session.offset}.",
+            headers={"Upload-Offset": str(db_session.offset)}
+        )
+
+    # Quanto ainda cabe na sessão; com Content-Length dá para recusar antes de ler o corpo
+    remaining = None
+    if db_session.total_size is not None:
+        remaining = db_session.total_size - upload_offset
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > remaining:
+            raise HTTPException(status_code=413, detail="Chunk ultrapassa o tamanho total declarado.")
+
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.RESUMABLE_WRITE_BUFFER)
+    try:
+        received = 0
+        buffer = bytearray()
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if remaining is not None and received > remaining:
+                    # Sem Content-Length (chunked): para de ler assim que passa do total
+                    raise HTTPException(status_code=413, detail="Chunk ultrapassa o tamanho total declarado.")
+                buffer.extend(chunk)
+                if len(buffer) >= settings.RESUMABLE_WRITE_BUFFER:
+                    await run_in_threadpool(spool.write, bytes(buffer))
+                    buffer.clear()
+        except ClientDisconnect:
+            # Conexão caiu no meio do chunk: grava e confirma o que já chegou
+            print(f"Cliente desconectou na sessão {session_id}; salvando progresso parcial.")
+        if buffer:
+            await run_in_threadpool(spool.write, bytes(buffer))
+        spool.seek(0)
+
+        hashers = _hashers_from(session_id, upload_offset)
+        written = await run_in_threadpool(_write_chunk, db_session, spool, upload_offset, hashers)
+    finally:
+        spool.close()
+
+    new_offset = upload_offset + written
+    advanced = await run_in_threadpool(crud_session.advance_offset, db, session_id, upload_offset, new_offset)
+    if not advanced:
+        raise HTTPException(status_code=409, detail="Outro envio alterou esta sessão ao mesmo tempo.")
+    with _chunk_hashes_lock:
+        if hashers is not None:
+            _chunk_hashes[session_id] = (new_offset, hashers)
+        else:
+            _chunk_hashes.pop(session_id, None)
+
+    await run_in_threadpool(db.refresh, db_session)
+    return db_session
+
+@router.post("/{session_id}/finalize", response_model=upload_schema.UploadResponse)
+def finalize_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Conclui a sessão: move o arquivo para o nome final, grava os metadados e o log.
+    """
+    db_session = _get_open_session(db, session_id, current_user)
+
+    if db_session.total_size is not None and db_session.offset != db_session.total_size:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incompleto: {db_session.offset} de {db_session.total_size} bytes.",
+            headers={"Upload-Offset": str(db_session.offset)}
+        )
+
+    owner = db_session.owner
+    metadata = {
+        "uploaded_by": owner.username if owner else current_user.username,
+        "user_role": owner.role.value if owner else current_user.role.value,
+        "data_type": db_session.data_type.value,
+        "batch_id": db_session.id,
+        "timestamp_utc": str(datetime.utcnow()),
+        "filename": db_session.final_path.rsplit("/", 1)[-1],
+        "uploaded_at": datetime.now().isoformat(),
+        "size_bytes": db_session.offset,
+        "resumable": True
+    }
+    with _chunk_hashes_lock:
+        state = _chunk_hashes.get(session_id)
+    digests = None
+    if state is not None and state[0] == db_session.offset:
+        digests = {algorithm: hasher.hexdigest() for algorithm, hasher in state[1].items()}
+
+    # Idempotente: se uma tentativa anterior já renomeou o arquivo, só confere o final
+    content_hash, verification = sftp_service.finalize_remote_file(
+        db_session.sftp_host, db_session.remote_path, db_session.final_path, db_session.offset, metadata, digests
+    )
+
+    # Tentativa anterior gravou o log e caiu antes de fechar a sessão: reaproveita
+    db_log = next(iter(crud_upload.get_uploads_by_batch(db, db_session.id)), None)
+    if db_log is None:
+        upload_in = upload_schema.UploadCreate(
+            filename=metadata["filename"],
+            data_type=db_session.data_type,
+            sftp_path=db_session.final_path,
+            user_id=db_session.user_id,
+            status=UploadStatus.UPLOADED,
+            batch_id=db_session.id,
+            size_bytes=db_session.offset,
+            content_hash=content_hash,
+            verification=verification,
+            sftp_host=db_session.sftp_host
+        )
+        db_log = crud_upload.create_upload_log(db, upload=upload_in)
+    crud_session.set_session_status(db, db_session, UploadSessionStatus.COMPLETED, upload_id=db_log.id)
+    with _chunk_hashes_lock:
+        _chunk_hashes.pop(session_id, None)
+
+    if db_log.content_hash is None:
+        threading.Thread(
+            target=_hash_in_background, args=(db_log.id, db_session.sftp_host, db_session.final_path), daemon=True
+        ).start()
+    return db_log
+
+@router.delete("/{session_id}", response_model=session_schema.UploadSessionResponse)
+def abort_upload_session(
+    session_id: str,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Cancela a sessão e remove o arquivo parcial do SFTP.
+    """
+    db_session = _get_open_session(db, session_id, current_user)
+    sftp_service.remove_remote_file(db_session.sftp_host, db_session.remote_path)
+    with _chunk_hashes_lock:
+        _chunk_hashes.pop(session_id, None)
+    return crud_session.set_session_status(db, db_session, UploadSessionStatus.ABORTED)
@@ -1,123 +1,544 @@
+from contextlib import nullcontext
 from typing import Any, List, Optional
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-import csv
-import io
-from datetime import datetime
+import base64
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import date, datetime
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, new_async_session
+from app.core.metrics import observe_stage, stage_timer
 from app.api import deps
-from app.models.user import User, UserRole # Importe o UserRole
+from app.models.user import UserRole # Importe o UserRole
+from app.core.user_cache import CachedUser
 from app.models.upload import DataType, UploadStatus
 from app.schemas import upload as upload_schema
-from app.services.sftp import sftp_service
+from app.services.export import EXPORT_FORMATS, check_export_format, export_chunks
+from app.services.sftp_router import sftp_service
+from app.services.sftp_async import async_sftp_service
+from app.services.ingest import ingest_service
+from app.services.scheduler import Ticket, upload_scheduler
+from app.services.stream_upload import MultipartSFTPStreamer
+from app.services.streams import hash_fileobj
 from app.crud import upload as crud_upload
+from app.crud import upload_async as crud_upload_async
+from app.crud import upload_stats as crud_upload_stats
 
 router = APIRouter()
 
-# --- NOTA: Removi o 'async' para evitar bloquear o servidor durante o upload SFTP ---
+# A rota é 'async', mas só a transferência do backend asyncssh roda no event loop; o
+# resto (paramiko, archive, background, dedup, get_db/get_current_user) usa o threadpool.
 @router.post("/", response_model=List[upload_schema.UploadResponse])
-def upload_files(
+async def upload_files(
     *,
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CachedUser = Depends(deps.get_current_user),
     files: List[UploadFile] = File(...),
-    data_type: DataType = Form(...)
+    data_type: DataType = Form(...),
+    background: bool = Form(False),
+    dedup: bool = Form(False),
+    archive: bool = Form(False)
 ) -> Any:
     """
     Realiza o upload de arquivos para o servidor SFTP e registra no banco.
+    - archive=true: cada arquivo é um zip/tar(.gz) extraído em streaming para
+      /tipo/ano/mes/<nome do pacote>/...; um log por entrada ou por pacote (ARCHIVE_LOG_MODE).
+    - background=true: grava o batch no disco local, responde 202 com o batch_id
+      e entrega no SFTP em segundo plano (consultar em /upload/batches/{batch_id}).
+    - dedup=true: arquivos cujo conteúdo (hash) já foi enviado para este data_type
+      não são transferidos de novo; o log aponta para o caminho já existente.
+    Com SFTP_BACKEND=asyncssh (e um único destino SFTP) a transferência e o INSERT
+    dos logs rodam no event loop; autenticação e demais consultas continuam síncronas.
+    A transferência passa pelo escalonador (fila justa entre usuários): sem vaga
+    dentro de UPLOAD_QUEUE_TIMEOUT, responde 429 com Retry-After.
     """
+    # Até aqui o FastAPI já leu o multipart inteiro para os SpooledTemporaryFile
+    received_at = getattr(request.state, "received_at", None)
+    if received_at is not None:
+        observe_stage("multipart_spool", time.perf_counter() - received_at)
+
     if not files:
         raise HTTPException(status_code=400, detail="Nenhum arquivo enviado.")
 
+    batch_id = uuid.uuid4().hex # Útil para agrupar uploads
+
     # Metadados para o arquivo .json auxiliar no servidor
     metadata_base = {
         "uploaded_by": current_user.username,
         "user_role": current_user.role.value if hasattr(current_user.role, 'value') else current_user.role,
         "data_type": data_type.value,
-        "batch_id": datetime.utcnow().timestamp(), # Útil para agrupar uploads
+        "batch_id": batch_id,
         "timestamp_utc": str(datetime.utcnow())
     }
 
-    # Chama o serviço (síncrono/bloqueante, por isso estamos numa rota 'def')
-    upload_results = sftp_service.upload_batch(files, data_type.value, metadata_base)
+    # Espera a vaga no event loop (sem segurar thread). Em background a requisição só
+    # grava no disco local; quem passa pelo escalonador é a entrega feita pelo ingest
+    cost = sum(file.size or 0 for file in files)
+    scheduled = nullcontext() if background else upload_scheduler.slot_async(
+        current_user.username, current_user.role, cost
+    )
+    async with scheduled as ticket:
+        # O backend asyncssh fala com um único servidor; com vários destinos o roteamento fica com o sftp_service
+        single_destination = len(sftp_service.destinations) == 1
+        if settings.SFTP_BACKEND == "asyncssh" and single_destination and not (background or dedup or archive):
+            # Limite de bytes/s esperado no event loop (throttle_files dormiria nas threads do read)
+            throttle = ticket.throttle_async if ticket is not None else None
+            upload_results = await async_sftp_service.upload_batch(files, data_type.value, metadata_base, throttle)
+            # Sessão async só neste ramo: os outros gravam pela sessão síncrona
+            with stage_timer("db_commit"):
+                async with new_async_session() as adb:
+                    return await crud_upload_async.create_upload_logs_bulk(
+                        adb, _build_upload_logs(current_user, data_type, batch_id, upload_results)
+                    )
+
+        return await run_in_threadpool(
+            _upload_files_sync,
+            db, current_user, files, data_type, batch_id, metadata_base, background, dedup, archive, ticket
+        )
+
+def _upload_files_sync(
+    db: Session,
+    current_user: CachedUser,
+    files: List[UploadFile],
+    data_type: DataType,
+    batch_id: str,
+    metadata_base: dict,
+    background: bool,
+    dedup: bool,
+    archive: bool,
+    ticket: Optional[Ticket] = None
+) -> Any:
+    if archive:
+        if background or dedup:
+            raise HTTPException(status_code=400, detail="archive=true não pode ser combinado com background ou dedup.")
+        if ticket is not None:
+            files = ticket.throttle_files(files)
+        return _save_results(db, current_user, data_type, batch_id, _upload_archives(files, data_type, metadata_base))
+
+    total_files = len(files)
+    skipped = {}
+    if dedup:
+        files, skipped = _dedup_files(db, files, data_type)
 
-    response_list = []
+    if background:
+        return _enqueue_batch(db, current_user, files, data_type, batch_id, metadata_base, list(skipped.values()))
+
+    # Limite de bytes/s do usuário vale para a transferência (não para o hash local do dedup)
+    if ticket is not None:
+        files = ticket.throttle_files(files)
+
+    # Chama o serviço (síncrono/bloqueante, por isso estamos no threadpool)
+    upload_results = sftp_service.upload_batch(files, data_type.value, metadata_base) if files else []
+
+    if skipped:
+        # Recoloca os deduplicados na posição original do batch
+        uploaded = iter(upload_results)
+        upload_results = [skipped[idx] if idx in skipped else next(uploaded) for idx in range(total_files)]
+
+    return _save_results(db, current_user, data_type, batch_id, upload_results)
+
+def _upload_archives(files: List[UploadFile], data_type: DataType, metadata_base: dict) -> List[dict]:
+    upload_results = []
+    for file in files:
+        entry_results = sftp_service.upload_archive(file, data_type.value, metadata_base)
+        if settings.ARCHIVE_LOG_MODE == "archive":
+            upload_results.append(_summarize_archive(file, entry_results))
+        else:
+            upload_results.extend(entry_results)
+    return upload_results
+
+def _summarize_archive(file: UploadFile, entry_results: List[dict]) -> dict:
+    """
+    Resultado único de um pacote: falha se qualquer entrada falhou, caminho = pasta remota.
+    """
+    failed = [result for result in entry_results if result["status"] != "uploaded"]
+    uploaded = [result for result in entry_results if result["status"] == "uploaded"]
+    root_dirs = {result["sftp_path"].rsplit("/", 1)[0] for result in uploaded}
+    levels = {result.get("verification") for result in uploaded}
+    hosts = {result.get("sftp_host") for result in uploaded}
+    return {
+        "filename": file.filename,
+        "sftp_path": os.path.commonpath(list(root_dirs)) if root_dirs else "",
+        "status": "failed" if failed or not entry_results else "uploaded",
+        "error": f"{len(failed)} de {len(entry_results)} entradas falharam" if failed else None,
+        "size": sum(result.get("size") or 0 for result in uploaded),
+        "content_hash": None,
+        "verification": levels.pop() if len(levels) == 1 else None,
+        "sftp_host": hosts.pop() if len(hosts) == 1 else None,
+        # Sem log próprio, mas cada arquivo do pacote entra no catálogo remoto
+        "entries": uploaded
+    }
+
+def _dedup_files(db: Session, files: List[UploadFile], data_type: DataType):
+    """
+    Separa os arquivos cujo conteúdo já está no SFTP para este data_type.
+    Custa uma leitura local (hash), não uma transferência.
+    Retorna (arquivos a enviar, {posição no batch: resultado já pronto}).
+    """
+    hashes = [hash_fileobj(file.file, sftp_service.hash_algorithm) for file in files]
+    known = crud_upload.find_uploaded_locations(db, data_type, hashes)
+
+    new_files = []
+    skipped = {}
+    for idx, (file, content_hash) in enumerate(zip(files, hashes)):
+        if content_hash in known:
+            skipped[idx] = {
+                "filename": file.filename,
+                "sftp_path": known[content_hash][0],
+                "sftp_host": known[content_hash][1],
+                "status": "uploaded",
+                "error": None,
+                "size": file.size,
+                "content_hash": content_hash,
+                "deduplicated": True
+            }
+        else:
+            new_files.append(file)
+    return new_files, skipped
+
+@router.post("/dedup/check", response_model=upload_schema.DedupCheckResponse)
+def check_known_hashes(
+    *,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+    check_in: upload_schema.DedupCheckRequest,
+) -> Any:
+    """
+    Pré-checagem: o cliente envia os hashes (UPLOAD_HASH_ALGORITHM) e só faz upload
+    dos que vierem em `missing`.
+    """
+    hashes = [h.lower() for h in check_in.hashes]
+    known = crud_upload.find_uploaded_by_hashes(db, check_in.data_type, hashes)
+    return {
+        "algorithm": sftp_service.hash_algorithm,
+        "known": known,
+        "missing": [h for h in dict.fromkeys(hashes) if h not in known],
+    }
+
+def _encode_cursor(log) -> str:
+    raw = f"{log.timestamp.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        timestamp, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+@router.get("/", response_model=upload_schema.UploadPage)
+def list_uploads(
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+    data_type: Optional[DataType] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+) -> Any:
+    """
+    Lista logs de upload do mais recente para o mais antigo.
+    Para a próxima página, envie o `next_cursor` recebido em `cursor`.
+    - Admin: Vê tudo.
+    - User: Vê apenas os seus.
+    """
+    is_admin = current_user.role == UserRole.ADMIN
+    after = _decode_cursor(cursor) if cursor else None
+
+    # Busca um a mais para saber se existe próxima página
+    logs = crud_upload.get_uploads_page(
+        db=db,
+        limit=limit + 1,
+        after=after,
+        user_id=None if is_admin else current_user.id,
+        data_type=data_type,
+        start_date=start_date,
+        end_date=end_date
+    )
+
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    return {
+        "items": logs,
+        "next_cursor": _encode_cursor(logs[-1]) if has_more else None,
+    }
+
+def _stats_item(row, group_by: List[str]) -> dict:
+    item = {name: getattr(row, name) for name in group_by}
+    item.update(files=row.files, uploaded=row.uploaded, failed=row.failed, pending=row.pending, bytes=row.bytes)
+    finished = row.uploaded + row.failed
+    item["failure_rate"] = round(row.failed / finished, 4) if finished else 0.0
+    return item
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+@router.get("/stats", response_model=upload_schema.UploadStatsResponse)
+def read_upload_stats(
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+    group_by: List[str] = Query(["day"]),
+    data_type: Optional[DataType] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> Any:
+    """
+    Totais de arquivos, bytes e falhas para o painel, lidos do agregado diário
+    (upload_stats_daily), sem varrer upload_logs.
+    - group_by: qualquer combinação de day, user_id e data_type (repetir o parâmetro).
+    - Responde com ETag; envie If-None-Match para receber 304 se nada mudou.
+    - Admin: Vê tudo. User: Vê apenas os seus.
+    """
+    group_by = list(dict.fromkeys(group_by))
+    invalid = [name for name in group_by if name not in crud_upload_stats.STATS_GROUPS]
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by inválido: {', '.join(invalid)} (use {', '.join(crud_upload_stats.STATS_GROUPS)})."
+        )
+
+    is_admin = current_user.role == UserRole.ADMIN
+    rows = crud_upload_stats.get_upload_stats(
+        db,
+        group_by=group_by,
+        user_id=None if is_admin else current_user.id,
+        data_type=data_type,
+        start_date=start_date,
+        end_date=end_date
+    )
+    items = [_stats_item(row, group_by) for row in rows]
+
+    totals = {key: sum(item[key] for item in items) for key in ("files", "uploaded", "failed", "pending", "bytes")}
+    finished = totals["uploaded"] + totals["failed"]
+    totals["failure_rate"] = round(totals["failed"] / finished, 4) if finished else 0.0
+
+    payload = jsonable_encoder({"group_by": group_by, "items": items, "totals": totals})
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    # private: cada usuário vê um recorte diferente; no-cache: sempre revalidar
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.post("/stream", response_model=List[upload_schema.UploadResponse])
+async def upload_files_stream(
+    request: Request,
+    data_type: DataType,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Upload sem spool local: o corpo multipart é lido incrementalmente e cada
+    arquivo vai direto para o SFTP. O data_type é passado na query string.
+    """
+    batch_id = uuid.uuid4().hex
+    metadata_base = {
+        "uploaded_by": current_user.username,
+        "user_role": current_user.role.value if hasattr(current_user.role, 'value') else current_user.role,
+        "data_type": data_type.value,
+        "batch_id": batch_id,
+        "timestamp_utc": str(datetime.utcnow())
+    }
+
+    # Custo na fila = tamanho declarado do corpo (0 se vier chunked)
+    cost = int(request.headers.get("content-length") or 0)
+    async with upload_scheduler.slot_async(current_user.username, current_user.role, cost) as ticket:
+        streamer = MultipartSFTPStreamer(request.headers.get("content-type"), data_type.value, metadata_base)
+        await run_in_threadpool(streamer.start)
+        try:
+            async for chunk in request.stream():
+                if ticket is not None:
+                    await ticket.throttle_async(len(chunk))
+                await run_in_threadpool(streamer.feed, chunk)
+            upload_results = await run_in_threadpool(streamer.finish)
+        except BaseException:
+            await run_in_threadpool(streamer.abort)
+            raise
+
+    if not upload_results:
+        raise HTTPException(status_code=400, detail="Nenhum arquivo enviado.")
+
+    return await run_in_threadpool(_save_results, db, current_user, data_type, batch_id, upload_results)
+
+def _save_results(
+    db: Session,
+    current_user: CachedUser,
+    data_type: DataType,
+    batch_id: str,
+    upload_results: List[dict]
+) -> List[Any]:
+    uploads_in = _build_upload_logs(current_user, data_type, batch_id, upload_results)
+    entries = [entry for result in upload_results for entry in result.get("entries", ())]
+    catalog_only = _build_upload_logs(current_user, data_type, batch_id, entries)
+
+    # Salva o batch inteiro numa única transação
+    with stage_timer("db_commit"):
+        return crud_upload.create_upload_logs_bulk(db, uploads_in, catalog_only)
+
+def _build_upload_logs(
+    current_user: CachedUser,
+    data_type: DataType,
+    batch_id: str,
+    upload_results: List[dict]
+) -> List[upload_schema.UploadCreate]:
+    uploads_in = []
 
     for result in upload_results:
         # Define status baseado no retorno do serviço
         status_enum = UploadStatus.UPLOADED if result["status"] == "uploaded" else UploadStatus.FAILED
-        
+
         # Cria o objeto Pydantic para passar ao CRUD
-        upload_in = upload_schema.UploadCreate(
+        uploads_in.append(upload_schema.UploadCreate(
             filename=result["filename"],
             data_type=data_type,
             sftp_path=result.get("sftp_path", ""),
             user_id=current_user.id,
-            status=status_enum
+            status=status_enum,
+            batch_id=batch_id,
+            content_hash=result.get("content_hash"),
+            size_bytes=result.get("size"),
+            verification=result.get("verification"),
+            sftp_host=result.get("sftp_host"),
+            attempts=result.get("attempts"),
+            last_error=result.get("last_error") or result.get("error")
+        ))
+    return uploads_in
+
+def _enqueue_batch(
+    db: Session,
+    current_user: CachedUser,
+    files: List[UploadFile],
+    data_type: DataType,
+    batch_id: str,
+    metadata_base: dict,
+    skipped_results: List[dict]
+) -> JSONResponse:
+    # Latência da requisição = escrita no disco local; o SFTP fica com os workers
+    spooled = ingest_service.spool_batch(batch_id, files, data_type.value, metadata_base) if files else []
+
+    uploads_in = [
+        upload_schema.UploadCreate(
+            filename=item["filename"],
+            data_type=data_type,
+            sftp_path="",
+            user_id=current_user.id,
+            status=UploadStatus.PENDING,
+            batch_id=batch_id
+        )
+        for item in spooled
+    ]
+    # Deduplicados já nascem UPLOADED (nada a entregar)
+    uploads_in += [
+        upload_schema.UploadCreate(
+            filename=result["filename"],
+            data_type=data_type,
+            sftp_path=result["sftp_path"],
+            user_id=current_user.id,
+            status=UploadStatus.UPLOADED,
+            batch_id=batch_id,
+            content_hash=result["content_hash"],
+            size_bytes=result["size"],
+            sftp_host=result["sftp_host"]
         )
+        for result in skipped_results
+    ]
+    with stage_timer("db_commit"):
+        db_logs = crud_upload.create_upload_logs_bulk(db, uploads_in)
+    for item, db_log in zip(spooled, db_logs):
+        item["upload_id"] = db_log.id
 
-        # Salva no banco
-        db_log = crud_upload.create_upload_log(db, upload=upload_in)
-        response_list.append(db_log)
+    if spooled:
+        ingest_service.submit(batch_id, data_type.value, metadata_base, spooled)
 
-    return response_list
+    accepted = upload_schema.BatchAccepted(batch_id=batch_id, status=UploadStatus.PENDING, files=len(uploads_in))
+    return JSONResponse(status_code=202, content=jsonable_encoder(accepted))
 
+@router.get("/batches/{batch_id}", response_model=upload_schema.BatchStatusResponse)
+def read_batch_status(
+    batch_id: str,
+    db: Session = Depends(get_db),
+    current_user: CachedUser = Depends(deps.get_current_user),
+) -> Any:
+    """
+    Situação de um batch (útil para acompanhar uploads feitos com background=true).
+    """
+    is_admin = current_user.role == UserRole.ADMIN
+    logs = crud_upload.get_uploads_by_batch(db, batch_id, user_id=None if is_admin else current_user.id)
+    if not logs:
+        raise HTTPException(status_code=404, detail="Batch não encontrado.")
+
+    return {
+        "batch_id": batch_id,
+        "total": len(logs),
+        "pending": sum(1 for log in logs if log.status == UploadStatus.PENDING),
+        "uploaded": sum(1 for log in logs if log.status == UploadStatus.UPLOADED),
+        "failed": sum(1 for log in logs if log.status == UploadStatus.FAILED),
+        "items": logs,
+    }
+
+@router.get("/export")
 @router.get("/export/csv")
 def export_upload_logs(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CachedUser = Depends(deps.get_current_user),
     data_type: Optional[DataType] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    format: str = Query("csv", description="csv, ndjson.gz ou parquet"),
 ):
     """
-    Gera CSV de logs.
+    Exporta os logs em streaming (memória constante).
+    - csv: planilha, como sempre foi.
+    - ndjson.gz: um JSON por linha, comprimido à medida que as linhas chegam.
+    - parquet: colunas tipadas, um row group por lote do banco (requer pyarrow).
     - Admin: Vê tudo.
     - User: Vê apenas os seus.
     """
-    
+    check_export_format(format)
+
     # Lógica de permissão corrigida usando o Enum
     is_admin = current_user.role == UserRole.ADMIN
     target_user_id = None if is_admin else current_user.id
 
-    logs = crud_upload.get_uploads_filtered(
-        db=db,
-        user_id=target_user_id,
-        data_type=data_type,
-        start_date=start_date,
-        end_date=end_date
-    )
-
-    # Criação do CSV na memória
-    stream = io.StringIO()
-    csv_writer = csv.writer(stream)
-
-    # Cabeçalhos
-    csv_writer.writerow(["ID", "Arquivo", "Tipo", "Status", "Caminho SFTP", "Usuário", "Data Upload (UTC)"])
-
-    for log in logs:
-        # Prevenção de erro caso usuário tenha sido deletado
-        owner_name = log.owner.username if log.owner else f"User ID {log.user_id}"
-        
-        csv_writer.writerow([
-            log.id,
-            log.filename,
-            log.data_type.value,
-            log.status.value,
-            log.sftp_path,
-            owner_name,
-            log.timestamp.strftime("%Y-%m-%d %H:%M:%S")
-        ])
-
-    stream.seek(0)
-    
-    filename = f"relatorio_uploads_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+    _, media_type, extension = EXPORT_FORMATS[format]
+    filename = f"relatorio_uploads_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}"
     
     # Retorna o stream como arquivo para download
     return StreamingResponse(
-        iter([stream.getvalue()]),
-        media_type="text/csv",
+        export_chunks(format, target_user_id, data_type, start_date, end_date),
+        media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
\ No newline at end of file
+    )
+
+@router.get("/sftp/pool")
+def read_sftp_pool_stats(
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin
+) -> Any:
+    """
+    Estatísticas de cada destino SFTP: saúde, batches em andamento e o pool de
+    conexões (tamanho, ociosas, tempo de espera).
+    """
+    return sftp_service.stats()
+
+@router.get("/scheduler")
+def read_scheduler_stats(
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin
+) -> Any:
+    """
+    Estado do escalonador de uploads: vagas em uso, fila por usuário e rejeições (429).
+    """
+    return upload_scheduler.stats()
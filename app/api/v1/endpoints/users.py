@@ -6,7 +6,7 @@ from app.core.database import get_db
 from app.api import deps
 from app.schemas import user as user_schema
 from app.crud import user as crud_user
-from app.models.user import User
+from app.core.user_cache import CachedUser, user_cache
 
 router = APIRouter()
 
@@ -15,7 +15,7 @@ def read_users(
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
-    current_user: User = Depends(deps.get_current_active_superuser), # Só Admin pode listar
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin pode listar
 ) -> Any:
     
     users = crud_user.get_users(db, skip=skip, limit=limit)
@@ -26,7 +26,7 @@ def create_user(
     *,
     db: Session = Depends(get_db),
     user_in: user_schema.UserCreate,
-    current_user: User = Depends(deps.get_current_active_superuser), # Só Admin pode criar
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin pode criar
 ) -> Any:
     
     user = crud_user.get_user_by_username(db, username=user_in.username)
@@ -36,11 +36,40 @@ def create_user(
             detail="Este username já existe no sistema.",
         )
     user = crud_user.create_user(db, user_in)
+    user_cache.invalidate(user.username)
     return user
 
+@router.patch("/{user_id}", response_model=user_schema.UserResponse)
+def update_user(
+    *,
+    db: Session = Depends(get_db),
+    user_id: int,
+    user_in: user_schema.UserUpdate,
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin pode alterar
+) -> Any:
+    """
+    Altera senha, role ou ativa/desativa um usuário.
+    """
+    user = crud_user.get_user(db, user_id=user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuário não encontrado.")
+    user = crud_user.update_user(db, user, user_in)
+    # Sem isso o usuário desativado continuaria autenticando até o TTL do cache
+    user_cache.invalidate(user.username)
+    return user
+
+@router.get("/cache/stats")
+def read_user_cache_stats(
+    current_user: CachedUser = Depends(deps.get_current_active_superuser), # Só Admin
+) -> Any:
+    """
+    Acertos/erros do cache de usuários autenticados.
+    """
+    return user_cache.stats()
+
 @router.get("/me", response_model=user_schema.UserResponse)
 def read_user_me(
-    current_user: User = Depends(deps.get_current_user),
+    current_user: CachedUser = Depends(deps.get_current_user),
 ) -> Any:
    
     return current_user
\ No newline at end of file
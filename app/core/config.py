@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Any, Dict, List, Literal
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "ECG Upload Service"
@@ -22,6 +22,112 @@ class Settings(BaseSettings):
     SFTP_KEY_PATH: str
     SFTP_REMOTE_PATH: str
 
+    # Pool de conexões SFTP (reaproveitadas entre requisições)
+    SFTP_POOL_SIZE: int = 8
+    SFTP_POOL_ACQUIRE_TIMEOUT: float = 30.0  # segundos esperando uma sessão livre
+    SFTP_CONNECT_TIMEOUT: float = 20.0
+    SFTP_KEEPALIVE_INTERVAL: int = 30
+    SFTP_POOL_MAX_IDLE: int = 300  # descarta sessões ociosas há mais de 5 min
+    SFTP_POOL_MAX_LIFETIME: int = 3600  # recicla sessões com mais de 1 hora
+    SFTP_POOL_HEALTHCHECK_AFTER: int = 30  # ping SFTP no checkout se ociosa há mais que isso
+
+    # Vários destinos SFTP (sharding/balanceamento). Vazio = só o SFTP_HOST acima.
+    # Cada item aceita name, host, port, username, key_path, remote_path e weight;
+    # o que faltar vem das variáveis SFTP_*. O name vai para upload_logs.sftp_host. Ex.:
+    # SFTP_DESTINATIONS='[{"name": "nas1", "host": "10.0.0.11", "weight": 2}, {"name": "nas2", "host": "10.0.0.12"}]'
+    SFTP_DESTINATIONS: List[Dict[str, Any]] = []
+    # Roteamento de cada batch: "least_loaded" (menos batches em andamento por peso),
+    # "hash" (mesma chave -> mesmo destino, ver SFTP_ROUTING_KEY) ou "replicate" (SFTP_REPLICAS cópias)
+    SFTP_ROUTING_POLICY: Literal["least_loaded", "hash", "replicate"] = "least_loaded"
+    SFTP_ROUTING_KEY: Literal["data_type", "user"] = "data_type"
+    SFTP_REPLICAS: int = 2
+    # Destino sai do rodízio após N falhas seguidas de conexão/batch e volta a ser tentado após X s
+    SFTP_EJECT_AFTER_FAILURES: int = 3
+    SFTP_EJECT_SECONDS: int = 30
+
+    # Backend do upload síncrono padrão (POST /upload sem background/dedup/archive):
+    # "paramiko" (threads, padrão) ou "asyncssh" (experimental: transferência em corrotinas
+    # e INSERT dos logs via asyncpg). O asyncssh só vale com um único destino (o de SFTP_*
+    # ou o único item de SFTP_DESTINATIONS), sem failover/réplicas e verificando só o
+    # tamanho; autenticação e sessão do banco continuam no threadpool. Ver README.
+    SFTP_BACKEND: Literal["paramiko", "asyncssh"] = "paramiko"
+    SFTP_ASYNC_CONNECTIONS: int = 2  # conexões SSH do backend asyncssh (cada uma multiplexa vários arquivos)
+    SFTP_ASYNC_WRITE_CHUNK: int = 1024 * 1024  # lido do arquivo recebido a cada escrita
+    SFTP_ASYNC_MAX_REQUESTS: int = 64  # pedidos de escrita (32 KB) em voo por arquivo
+
+    # Perfil de transferência (links com latência alta, ex.: NAS do hospital).
+    # Janela/pacote SSH (0 = padrão do paramiko: 2 MB / 32 KB), bloco de escrita pipelined,
+    # compressão SSH e cifras preferidas (ex.: ["aes128-gcm@openssh.com", "aes128-ctr"]).
+    SFTP_WINDOW_SIZE: int = 0
+    SFTP_MAX_PACKET_SIZE: int = 0
+    SFTP_WRITE_CHUNK: int = 256 * 1024
+    SFTP_SSH_COMPRESSION: bool = False
+    SFTP_PREFERRED_CIPHERS: List[str] = []
+    # Auto-tune: mede o RTT na primeira conexão e dimensiona janela/bloco pelo
+    # produto banda x atraso, considerando SFTP_LINK_MBPS como capacidade do link
+    SFTP_AUTO_TUNE: bool = False
+    SFTP_LINK_MBPS: float = 1000.0
+
+    # Retentativa por arquivo em erro transitório (queda de conexão, timeout, canal fechado):
+    # espera com backoff exponencial + jitter, reabre o canal (ou a conexão) e retoma a
+    # escrita do tamanho que já está no servidor. 1 = sem retentativa.
+    SFTP_RETRY_ATTEMPTS: int = 3
+    SFTP_RETRY_BACKOFF: float = 0.5  # segundos; dobra a cada tentativa
+    SFTP_RETRY_BACKOFF_MAX: float = 8.0
+
+    # Cria no startup as pastas do mês atual e do próximo para cada DataType
+    SFTP_PRECREATE_DIRECTORIES: bool = True
+
+    # Canais SFTP em paralelo dentro de um mesmo batch (1 = sequencial)
+    SFTP_TRANSFER_CONCURRENCY: int = 4
+
+    # Hash do conteúdo calculado durante o upload (deduplicação/integridade)
+    UPLOAD_HASH_ALGORITHM: str = "sha256"  # qualquer nome aceito por hashlib (ex.: blake2b)
+
+    # Verificação após o upload: "off", "size" (stat do remoto) ou "checksum"
+    # (size + hash calculado pelo servidor via extensão check-file, se disponível)
+    SFTP_VERIFY_MODE: Literal["off", "size", "checksum"] = "size"
+    SFTP_VERIFY_HASH_ALGORITHM: str = "sha256"  # precisa ser suportado pelo check-file (md5, sha1, sha256...)
+
+    # Metadados no SFTP: "sidecar" (um <arquivo>.json por arquivo, formato antigo) ou
+    # "manifest" (um <batch_id>.manifest.jsonl por batch: metade das criações remotas)
+    SFTP_METADATA_MODE: Literal["sidecar", "manifest"] = "sidecar"
+
+    # Compressão em streaming por DataType antes do envio, ex.:
+    # SFTP_COMPRESSION='{"dados_relogios": "gzip:6", "dados_anel": "zstd:3"}'
+    # (zstd requer o pacote opcional 'zstandard'). O nome remoto ganha .gz/.zst.
+    SFTP_COMPRESSION: Dict[str, str] = {}
+
+    # Upload de pacotes (archive=true): um log por entrada extraída ("entry")
+    # ou um log resumido por pacote ("archive")
+    ARCHIVE_LOG_MODE: Literal["entry", "archive"] = "entry"
+
+    # Escalonador de uploads (fair-share entre usuários, na frente do SFTP)
+    UPLOAD_SCHEDULER_ENABLED: bool = True
+    UPLOAD_MAX_CONCURRENT: int = 8  # batches transferindo ao mesmo tempo, somando todos os usuários
+    UPLOAD_USER_MAX_CONCURRENT: int = 2  # por usuário
+    UPLOAD_USER_BYTES_PER_S: int = 0  # por usuário, 0 = sem limite
+    UPLOAD_USER_MAX_QUEUED: int = 4  # batches esperando por usuário; além disso, 429 na hora
+    UPLOAD_QUEUE_TIMEOUT: float = 30.0  # espera máxima na fila antes do 429 (com Retry-After)
+    # Sobrescritas por papel (concurrency, bytes_per_s, weight), ex.:
+    # UPLOAD_ROLE_POLICIES='{"uploader_ti": {"concurrency": 1, "bytes_per_s": 50000000}, "uploader_saude": {"weight": 4}}'
+    UPLOAD_ROLE_POLICIES: Dict[str, Dict[str, float]] = {}
+
+    # Modo assíncrono: batch vai para o disco local e é entregue em background
+    INGEST_SPOOL_DIR: str = "/tmp/upload_spool"
+    INGEST_WORKERS: int = 2
+    # SFTP fora do ar (503): o batch fica no spool e é reagendado com backoff (segundos, dobra a cada vez)
+    INGEST_RETRY_BACKOFF: float = 5.0
+    INGEST_RETRY_BACKOFF_MAX: float = 300.0
+
+    # Upload resumível: acumula o corpo do chunk até este tamanho antes de escrever no SFTP
+    RESUMABLE_WRITE_BUFFER: int = 1024 * 1024
+
+    # Catálogo do SFTP (remote_catalog): alimentado pelos uploads e conferido pela reconciliação
+    CATALOG_RECONCILE_INTERVAL: int = 900  # segundos entre reconciliações em background; 0 = só sob demanda
+    CATALOG_RECONCILE_WORKERS: int = 4  # pastas de mês listadas em paralelo (cada uma ocupa um canal do pool)
+    CATALOG_FULL_SCAN_EVERY: int = 24  # a cada N reconciliações relista tudo, mesmo pastas com mtime igual
+
     FIRST_SUPERUSER: str = "admin"
     FIRST_SUPERUSER_PASSWORD: str = "admin123"
 
@@ -31,11 +137,22 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 480  # 8 HORAS
 
+    # Endpoint /metrics (Prometheus) com os tempos por etapa do upload
+    METRICS_ENABLED: bool = True
+
+    # Cache dos usuários autenticados (evita ir ao banco a cada requisição)
+    USER_CACHE_SIZE: int = 1024
+    USER_CACHE_TTL: int = 60  # segundos
+
     API_KEY: str = "ecguploads"
 
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
+
+    @property
+    def SQLALCHEMY_ASYNC_DATABASE_URI(self) -> str:
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
     
     class Config:
         env_file = ".env"
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.core.config import settings
 
@@ -6,6 +7,10 @@ engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Variante assíncrona (asyncpg), só usada pelo backend asyncssh: o engine é criado
+# no primeiro uso, então com SFTP_BACKEND=paramiko o asyncpg nem é carregado
+_async_sessionmaker = None
+
 Base = declarative_base()
 
 def get_db():
@@ -13,4 +18,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def new_async_session() -> AsyncSession:
+    global _async_sessionmaker
+    if _async_sessionmaker is None:
+        async_engine = create_async_engine(settings.SQLALCHEMY_ASYNC_DATABASE_URI)
+        _async_sessionmaker = async_sessionmaker(
+            bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+        )
+    return _async_sessionmaker()
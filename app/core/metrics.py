@@ -0,0 +1,106 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Iterable, Iterator
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+try:
+    from opentelemetry import trace
+    _tracer = trace.get_tracer("app.upload")
+except ImportError:  # tracing é opcional; sem o pacote os spans viram no-op
+    _tracer = None
+
+# Etapas do caminho de upload medidas em upload_stage_seconds:
+# multipart_spool, scheduler_wait, key_load, ssh_connect, pool_wait, mkdir, putfo, retry_backoff, verify,
+# metadata_write, db_commit
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+UPLOAD_STAGE_SECONDS = Histogram(
+    "upload_stage_seconds",
+    "Tempo gasto em cada etapa do upload",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+UPLOAD_FILES = Counter(
+    "upload_files_total",
+    "Arquivos processados, por tipo de dado e resultado",
+    ["data_type", "status"],
+)
+UPLOAD_FAILURES = Counter(
+    "upload_failures_total",
+    "Arquivos que falharam, por tipo de dado",
+    ["data_type"],
+)
+UPLOAD_BYTES = Counter(
+    "upload_bytes_total",
+    "Bytes (conteúdo original) entregues no SFTP, por tipo de dado",
+    ["data_type"],
+)
+
+# labels() faz lock + lookup a cada chamada; as séries de etapa são poucas e fixas
+_stage_series = {}
+
+
+def observe_stage(stage: str, seconds: float):
+    series = _stage_series.get(stage)
+    if series is None:
+        series = _stage_series.setdefault(stage, UPLOAD_STAGE_SECONDS.labels(stage))
+    series.observe(seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """
+    with stage_timer("putfo"): ...  -> registra a duração mesmo se o bloco levantar erro.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+def record_results(data_type: str, results: Iterable[dict]):
+    """
+    Contabiliza arquivos/bytes/falhas a partir dos resultados do SFTPService.
+    """
+    uploaded = failed = size = 0
+    for result in results:
+        if result["status"] == "uploaded":
+            uploaded += 1
+            size += result.get("size") or 0
+        else:
+            failed += 1
+    if uploaded:
+        UPLOAD_FILES.labels(data_type, "uploaded").inc(uploaded)
+        UPLOAD_BYTES.labels(data_type).inc(size)
+    if failed:
+        UPLOAD_FILES.labels(data_type, "failed").inc(failed)
+        UPLOAD_FAILURES.labels(data_type).inc(failed)
+
+
+def batch_span(name: str, **attributes):
+    """
+    Span de tracing para um batch (OpenTelemetry, se instalado e configurado).
+    """
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+class RequestStartMiddleware:
+    """
+    ASGI puro (sem o custo do BaseHTTPMiddleware): anota em request.state.received_at
+    o instante em que a requisição chegou, antes do parse do multipart.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["received_at"] = time.perf_counter()
+        await self.app(scope, receive, send)
+
+
+def render_latest():
+    return generate_latest(), CONTENT_TYPE_LATEST
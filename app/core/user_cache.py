@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import settings
+from app.models.user import User, UserRole
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    """
+    Cópia leve (sem sessão do SQLAlchemy) do usuário autenticado.
+    """
+    id: int
+    username: str
+    role: UserRole
+    is_active: bool
+    created_at: Optional[datetime] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+class UserCache:
+    """
+    Cache LRU com TTL dos usuários resolvidos a partir do JWT, por username.
+    A invalidação explícita só vale para este processo; em múltiplos workers o
+    TTL limita por quanto tempo uma alteração pode demorar a aparecer.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, username: str) -> Optional[CachedUser]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(username)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[username]
+                self.misses += 1
+                return None
+            self._data.move_to_end(username)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user: User) -> CachedUser:
+        cached = CachedUser.from_user(user)
+        with self._lock:
+            self._data[cached.username] = (time.monotonic() + self.ttl, cached)
+            self._data.move_to_end(cached.username)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return cached
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self._data.pop(username, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+# Instância Singleton
+user_cache = UserCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
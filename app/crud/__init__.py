@@ -1,2 +1,2 @@
-from .user import create_user, get_user_by_username, get_users
-from .upload import create_upload_log, get_uploads_by_user, get_all_uploads
\ No newline at end of file
+from .user import create_user, get_user, get_user_by_username, get_users, update_user
+from .upload import create_upload_log, create_upload_logs_bulk, get_uploads_by_user, get_all_uploads
\ No newline at end of file
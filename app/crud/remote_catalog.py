@@ -0,0 +1,299 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+from datetime import datetime, timezone
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models.remote_catalog import RemoteObject, RemoteCatalogDir, RemoteDrift
+from app.models.upload import DataType, UploadStatus
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Campos trocados quando (sftp_host, path) já está no catálogo
+CATALOG_UPSERT_FIELDS = (
+    "kind", "size_bytes", "mtime", "content_hash", "upload_id", "source", "confirmed_at", "updated_at"
+)
+
+def _utc(timestamp: Optional[datetime]) -> Optional[datetime]:
+    if timestamp is not None and timestamp.tzinfo is None:
+        # Sem fuso (SQLite) = já está em UTC
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp
+
+def object_kind(name: str, siblings: Set[str]) -> str:
+    """
+    data: arquivo enviado; metadata: <arquivo>.json ou <batch>.manifest.jsonl
+    gravados pela API; partial: .part de upload resumível em andamento.
+    """
+    if name.endswith(".part"):
+        return "partial"
+    if name.endswith(".manifest.jsonl") or (name.endswith(".json") and name[:-5] in siblings):
+        return "metadata"
+    return "data"
+
+def remote_object(
+    sftp_host: str, path: str, month_dir: str, data_type: Optional[str], period: Optional[str], **fields
+) -> dict:
+    directory, name = path.rsplit("/", 1)
+    return dict(
+        fields, sftp_host=sftp_host, path=path, name=name, directory=directory,
+        month_dir=month_dir, data_type=data_type, period=period
+    )
+
+def uploaded_objects(rows: Iterable[Any]) -> List[dict]:
+    """
+    Linhas de upload_logs (ou UploadCreate) -> entradas provisórias do catálogo, uma por
+    destino (réplicas gravam "a,b" em sftp_host). Ficam de fora falhas/pendentes e o log
+    resumido de pacote (ARCHIVE_LOG_MODE=archive), cujo caminho é a pasta, não um arquivo.
+    Saem sem repetir (sftp_host, path) e ordenadas pela chave, como em rollup_deltas.
+    """
+    now = datetime.now(timezone.utc)
+    objects = {}
+    for row in rows:
+        if UploadStatus(row.status) != UploadStatus.UPLOADED or not row.sftp_path or not row.sftp_host:
+            continue
+        if row.sftp_path.rsplit("/", 1)[-1] != row.filename:
+            continue
+        data_type = DataType(row.data_type).value
+        # <base>/<tipo>/<ano>/<mes>/...: a primeira ocorrência do tipo seguida de ano/mês
+        match = re.match(rf"^(.*?/{re.escape(data_type)}/(\d{{4}})/(\d{{2}}))/", row.sftp_path)
+        if match:
+            month_dir, period = match.group(1), f"{match.group(2)}/{match.group(3)}"
+        else:
+            month_dir, period = row.sftp_path.rsplit("/", 1)[0], None
+
+        for host in row.sftp_host.split(","):
+            objects[(host, row.sftp_path)] = remote_object(
+                host, row.sftp_path, month_dir, data_type, period,
+                kind="data",
+                size_bytes=row.size_bytes,
+                # Provisório até a varredura trazer o mtime real
+                mtime=int(now.timestamp()),
+                content_hash=row.content_hash,
+                upload_id=getattr(row, "id", None),
+                source="upload",
+                confirmed_at=None,
+                updated_at=now
+            )
+    return [objects[key] for key in sorted(objects)]
+
+@lru_cache(maxsize=None)
+def catalog_upsert_statement(dialect_name: str):
+    # Compartilhado com a variante assíncrona (crud/upload_async.py); SQLite só nos benchmarks.
+    # Montado uma vez por dialeto: o upsert roda a cada commit de upload
+    insert_fn = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+    statement = insert_fn(RemoteObject)
+    return statement.on_conflict_do_update(
+        index_elements=[RemoteObject.sftp_host, RemoteObject.path],
+        set_={name: statement.excluded[name] for name in CATALOG_UPSERT_FIELDS}
+    )
+
+def record_uploads(db: Session, rows: Iterable[Any]):
+    """
+    Registra no catálogo os arquivos enviados, sem commit: entra na transação de quem
+    gravou os logs (como apply_rollup).
+    """
+    objects = uploaded_objects(rows)
+    if objects:
+        db.execute(catalog_upsert_statement(db.get_bind().dialect.name), objects)
+
+# ----------------------------------------------------------------------
+# Reconciliação (services/catalog.py)
+# ----------------------------------------------------------------------
+def get_dir_states(db: Session, sftp_host: str) -> Dict[str, Optional[int]]:
+    """
+    {pasta de mês: mtime} da última varredura de um destino.
+    """
+    rows = db.execute(
+        select(RemoteCatalogDir.path, RemoteCatalogDir.mtime).where(RemoteCatalogDir.sftp_host == sftp_host)
+    )
+    return {row.path: row.mtime for row in rows}
+
+def get_catalogued_month_dirs(db: Session, sftp_host: str) -> Set[str]:
+    # Inclui pastas que só conhecemos pelos uploads (nunca vistas numa varredura)
+    rows = db.execute(
+        select(RemoteObject.month_dir).where(RemoteObject.sftp_host == sftp_host).distinct()
+    )
+    return {row.month_dir for row in rows}
+
+def apply_directory_scan(
+    db: Session,
+    sftp_host: str,
+    month_dir: str,
+    data_type: str,
+    period: str,
+    dir_mtime: Optional[int],
+    listing: List[Tuple[str, int, int]],
+    listed_at: datetime
+) -> dict:
+    """
+    Troca o conteúdo catalogado de uma pasta de mês pela listagem (caminho, tamanho, mtime)
+    feita em `listed_at`, registrando o drift, numa transação. dir_mtime=None: a pasta sumiu.
+    Entradas de upload gravadas depois de listed_at ficam como estão (o arquivo pode ter
+    chegado depois da listagem).
+    """
+    existing = {
+        row.path: row for row in db.execute(
+            select(
+                RemoteObject.id, RemoteObject.path, RemoteObject.kind, RemoteObject.size_bytes,
+                RemoteObject.mtime, RemoteObject.source, RemoteObject.updated_at
+            ).where(RemoteObject.sftp_host == sftp_host, RemoteObject.month_dir == month_dir)
+        )
+    }
+    names_by_dir = defaultdict(set)
+    for path, _, _ in listing:
+        directory, name = path.rsplit("/", 1)
+        names_by_dir[directory].add(name)
+
+    now = datetime.now(timezone.utc)
+    inserts, updates, removed, drift = [], [], [], []
+
+    def add_drift(path: str, kind: str, row=None, size: Optional[int] = None, mtime: Optional[int] = None):
+        drift.append({
+            "sftp_host": sftp_host,
+            "path": path,
+            "drift": kind,
+            "expected_size": row.size_bytes if row is not None else None,
+            "actual_size": size,
+            "expected_mtime": row.mtime if row is not None else None,
+            "actual_mtime": mtime,
+            "detected_at": now,
+        })
+
+    for path, size, mtime in listing:
+        directory, name = path.rsplit("/", 1)
+        kind = object_kind(name, names_by_dir[directory])
+        row = existing.pop(path, None)
+        if kind == "data" and row is not None and row.kind == "metadata" and name.endswith(".json"):
+            kind = "metadata"  # .json cujo arquivo foi apagado continua sendo metadado
+        if row is None:
+            inserts.append(remote_object(
+                sftp_host, path, month_dir, data_type, period,
+                kind=kind, size_bytes=size, mtime=mtime, content_hash=None, upload_id=None,
+                source="scan", confirmed_at=now, updated_at=now
+            ))
+            if kind == "data":
+                add_drift(path, "unknown", size=size, mtime=mtime)
+            continue
+
+        if row.source == "upload" and _utc(row.updated_at) >= listed_at:
+            continue
+        changed = row.source == "scan" and (row.size_bytes, row.mtime) != (size, mtime)
+        if row.source == "scan" and not changed and row.kind == kind:
+            continue
+        if changed and kind == "data":
+            add_drift(path, "changed", row, size, mtime)
+        item = {
+            "id": row.id, "kind": kind, "size_bytes": size, "mtime": mtime,
+            "source": "scan", "confirmed_at": now, "updated_at": now
+        }
+        if changed:
+            # O hash era do conteúdo enviado pela API, que não é mais o que está lá
+            item["content_hash"] = None
+        updates.append(item)
+
+    for path, row in existing.items():
+        if row.source == "upload" and _utc(row.updated_at) >= listed_at:
+            continue
+        removed.append(row.id)
+        if row.kind == "data":
+            add_drift(path, "missing", row)
+
+    dialect_name = db.get_bind().dialect.name
+    if inserts:
+        # upsert: um upload pode ter registrado o mesmo caminho nesse meio tempo
+        db.execute(catalog_upsert_statement(dialect_name), inserts)
+    if updates:
+        db.execute(update(RemoteObject), updates)
+    if removed:
+        db.execute(delete(RemoteObject).where(RemoteObject.id.in_(removed)))
+    if drift:
+        db.execute(insert(RemoteDrift), drift)
+
+    if dir_mtime is None:
+        db.execute(delete(RemoteCatalogDir).where(
+            RemoteCatalogDir.sftp_host == sftp_host, RemoteCatalogDir.path == month_dir
+        ))
+    else:
+        insert_fn = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+        statement = insert_fn(RemoteCatalogDir).values(
+            sftp_host=sftp_host, path=month_dir, mtime=dir_mtime, files=len(listing), scanned_at=now
+        )
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[RemoteCatalogDir.sftp_host, RemoteCatalogDir.path],
+            set_={"mtime": statement.excluded.mtime, "files": statement.excluded.files, "scanned_at": now}
+        ))
+    db.commit()
+    return {
+        "files": len(listing), "added": len(inserts), "updated": len(updates), "removed": len(removed), "drift": len(drift)
+    }
+
+# ----------------------------------------------------------------------
+# Navegação / busca
+# ----------------------------------------------------------------------
+def _filter_remote_objects(
+    query,
+    sftp_host: Optional[str] = None,
+    data_type: Optional[DataType] = None,
+    period: Optional[str] = None,
+    directory: Optional[str] = None,
+    name_contains: Optional[str] = None,
+    kind: Optional[str] = None
+):
+    if sftp_host:
+        query = query.where(RemoteObject.sftp_host == sftp_host)
+    if data_type:
+        query = query.where(RemoteObject.data_type == data_type.value)
+    if period:
+        # "2024" (ano inteiro) ou "2024/05"
+        query = query.where(RemoteObject.period.startswith(period, autoescape=True))
+    if directory:
+        query = query.where(RemoteObject.directory == directory.rstrip("/"))
+    if name_contains:
+        query = query.where(RemoteObject.name.icontains(name_contains, autoescape=True))
+    if kind:
+        query = query.where(RemoteObject.kind == kind)
+    return query
+
+def get_remote_objects_page(
+    db: Session,
+    limit: int = 100,
+    after: Optional[Tuple[str, str]] = None,
+    **filters
+) -> List[RemoteObject]:
+    """
+    Página do catálogo em ordem de caminho, com cursor (keyset) em (path, sftp_host).
+    Filtros: os de _filter_remote_objects.
+    """
+    query = _filter_remote_objects(select(RemoteObject), **filters)
+    if after is not None:
+        query = query.where(tuple_(RemoteObject.path, RemoteObject.sftp_host) > tuple_(*after))
+    query = query.order_by(RemoteObject.path, RemoteObject.sftp_host).limit(limit)
+    return db.execute(query).scalars().all()
+
+def get_remote_objects_totals(db: Session, **filters) -> Tuple[int, int]:
+    """
+    (arquivos, bytes) de tudo que casa com os filtros, não só da página.
+    """
+    query = _filter_remote_objects(
+        select(func.count(), func.coalesce(func.sum(RemoteObject.size_bytes), 0)), **filters
+    )
+    files, size = db.execute(query).one()
+    return files, size
+
+def get_drift_page(
+    db: Session,
+    limit: int = 100,
+    before_id: Optional[int] = None,
+    sftp_host: Optional[str] = None,
+    drift: Optional[str] = None
+) -> List[RemoteDrift]:
+    # Mais recente primeiro
+    query = select(RemoteDrift)
+    if sftp_host:
+        query = query.where(RemoteDrift.sftp_host == sftp_host)
+    if drift:
+        query = query.where(RemoteDrift.drift == drift)
+    if before_id is not None:
+        query = query.where(RemoteDrift.id < before_id)
+    return db.execute(query.order_by(RemoteDrift.id.desc()).limit(limit)).scalars().all()
@@ -1,39 +1,151 @@
+from sqlalchemy import insert, select, tuple_, update
 from sqlalchemy.orm import Session
-from app.models.upload import Upload, DataType
+from app.crud.remote_catalog import record_uploads
+from app.crud.upload_stats import apply_rollup
+from app.models.remote_catalog import RemoteObject
+from app.models.upload import Upload, DataType, UploadStatus
+from app.models.user import User
 from app.schemas.upload import UploadCreate
 from datetime import datetime
-from typing import Optional, List
+from types import SimpleNamespace
+from typing import Dict, Iterator, Optional, List, Sequence, Tuple
 
 def create_upload_log(db: Session, upload: UploadCreate):
     
-    db_upload = Upload(
-        filename=upload.filename,
-        data_type=upload.data_type,
-        sftp_path=upload.sftp_path,
-        user_id=upload.user_id,
-        status=upload.status
-    )
+    db_upload = Upload(**upload.model_dump())
     
     db.add(db_upload)
+    db.flush()
+    apply_rollup(db, [(db_upload, 1)])
+    record_uploads(db, [db_upload])
     db.commit()
     db.refresh(db_upload)
     return db_upload
 
+def create_upload_logs_bulk(db: Session, uploads: List[UploadCreate], catalog_only: Sequence[UploadCreate] = ()):
+    """
+    Grava todas as linhas de um batch numa única transação (INSERT multi-linha
+    com RETURNING), junto com o agregado de upload_stats_daily e o catálogo remoto.
+    `catalog_only`: arquivos que entram no catálogo sem log próprio (entradas de
+    pacote com ARCHIVE_LOG_MODE=archive).
+    Retorna as linhas na mesma ordem de `uploads`, já com id/timestamp.
+    """
+    if not uploads:
+        return []
+
+    rows = db.execute(bulk_insert_statement(), [upload.model_dump() for upload in uploads]).all()
+    apply_rollup(db, [(row, 1) for row in rows])
+    record_uploads(db, list(rows) + list(catalog_only))
+    db.commit()
+    return rows
+
+def bulk_insert_statement():
+    # Compartilhado com a variante assíncrona (crud/upload_async.py)
+    return insert(Upload).returning(
+        Upload.id,
+        Upload.filename,
+        Upload.data_type,
+        Upload.status,
+        Upload.sftp_path,
+        Upload.timestamp,
+        Upload.user_id,
+        Upload.batch_id,
+        Upload.content_hash,
+        Upload.size_bytes,
+        Upload.verification,
+        Upload.sftp_host,
+        Upload.attempts,
+        Upload.last_error,
+        sort_by_parameter_order=True
+    )
+
+def find_uploaded_by_hashes(db: Session, data_type: DataType, hashes: List[str]) -> Dict[str, str]:
+    """
+    Conteúdos já enviados com sucesso para este data_type: {hash: sftp_path}.
+    """
+    return {content_hash: path for content_hash, (path, _) in find_uploaded_locations(db, data_type, hashes).items()}
+
+def find_uploaded_locations(
+    db: Session, data_type: DataType, hashes: List[str]
+) -> Dict[str, Tuple[str, Optional[str]]]:
+    """
+    Como find_uploaded_by_hashes, mas com o destino: {hash: (sftp_path, sftp_host)}.
+    """
+    if not hashes:
+        return {}
+    rows = db.query(Upload.content_hash, Upload.sftp_path, Upload.sftp_host).filter(
+        Upload.data_type == data_type,
+        Upload.content_hash.in_(set(hashes)),
+        Upload.status == UploadStatus.UPLOADED
+    ).all()
+    return {row.content_hash: (row.sftp_path, row.sftp_host) for row in rows}
+
+def get_uploads_by_batch(db: Session, batch_id: str, user_id: Optional[int] = None) -> List[Upload]:
+    query = db.query(Upload).filter(Upload.batch_id == batch_id)
+    if user_id:
+        query = query.filter(Upload.user_id == user_id)
+    return query.order_by(Upload.id).all()
+
+def finish_pending_uploads(db: Session, updates: List[dict]):
+    """
+    Atualiza de uma vez (um único commit) as linhas PENDING de um batch entregue em background.
+    Cada item: {"id", "status", "sftp_path", "sftp_host", "content_hash", "size_bytes", "verification",
+    "attempts", "last_error"}.
+    O agregado troca cada linha de PENDING para o status final na mesma transação;
+    os arquivos entregues entram no catálogo remoto junto.
+    """
+    if not updates:
+        return
+    previous = {
+        row.id: row for row in db.execute(
+            select(
+                Upload.id, Upload.timestamp, Upload.user_id, Upload.data_type, Upload.status, Upload.size_bytes,
+                Upload.filename
+            )
+            .where(Upload.id.in_([item["id"] for item in updates]))
+        )
+    }
+    db.execute(update(Upload), updates)
+
+    changes = []
+    for item in updates:
+        row = previous.get(item["id"])
+        if row is None:
+            continue
+        current = SimpleNamespace(**row._asdict())
+        current.status = item["status"]
+        current.size_bytes = item.get("size_bytes")
+        current.sftp_path = item.get("sftp_path")
+        current.sftp_host = item.get("sftp_host")
+        current.content_hash = item.get("content_hash")
+        changes += [(row, -1), (current, 1)]
+    apply_rollup(db, changes)
+    record_uploads(db, [current for current, sign in changes if sign > 0])
+    db.commit()
+
+def set_content_hash(db: Session, upload_id: int, content_hash: str):
+    """
+    Preenche o hash calculado depois do log (finalize resumível sem hash acumulado),
+    no log e na entrada do catálogo remoto.
+    """
+    db.execute(update(Upload).where(Upload.id == upload_id).values(content_hash=content_hash))
+    db.execute(update(RemoteObject).where(RemoteObject.upload_id == upload_id).values(content_hash=content_hash))
+    db.commit()
+
 def get_uploads_by_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     return db.query(Upload).filter(Upload.user_id == user_id).offset(skip).limit(limit).all()
 
 def get_all_uploads(db: Session, skip: int = 0, limit: int = 100):
     return db.query(Upload).offset(skip).limit(limit).all()
 
-def get_uploads_filtered(
-    db: Session, 
-    user_id: Optional[int] = None, 
-    data_type: Optional[DataType] = None, 
-    start_date: Optional[datetime] = None, 
+def _filter_uploads(
+    query,
+    user_id: Optional[int] = None,
+    data_type: Optional[DataType] = None,
+    start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None
-) -> List[Upload]:
-    query = db.query(Upload)
-
+):
+    # Funciona tanto para Query (ORM) quanto para select()
     if user_id:
         query = query.filter(Upload.user_id == user_id)
     
@@ -45,6 +157,68 @@ def get_uploads_filtered(
         
     if end_date:
         query = query.filter(Upload.timestamp <= end_date)
-        
-    # Ordena do mais recente para o mais antigo
-    return query.order_by(Upload.timestamp.desc()).all()
\ No newline at end of file
+
+    # Ordena do mais recente para o mais antigo (id desempata, mesma ordem dos índices)
+    return query.order_by(Upload.timestamp.desc(), Upload.id.desc())
+
+def get_uploads_page(
+    db: Session,
+    limit: int = 100,
+    after: Optional[Tuple[datetime, int]] = None,
+    user_id: Optional[int] = None,
+    data_type: Optional[DataType] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> List[Upload]:
+    """
+    Paginação por cursor (keyset) em (timestamp, id): cada página é uma busca no
+    índice a partir do último item da anterior, sem OFFSET.
+    """
+    query = _filter_uploads(db.query(Upload), user_id, data_type, start_date, end_date)
+    if after is not None:
+        query = query.filter(tuple_(Upload.timestamp, Upload.id) < tuple_(*after))
+    return query.limit(limit).all()
+
+def get_uploads_filtered(
+    db: Session, 
+    user_id: Optional[int] = None, 
+    data_type: Optional[DataType] = None, 
+    start_date: Optional[datetime] = None, 
+    end_date: Optional[datetime] = None
+) -> List[Upload]:
+    query = _filter_uploads(db.query(Upload), user_id, data_type, start_date, end_date)
+    return query.all()
+
+def iter_upload_batches_for_export(
+    db: Session,
+    user_id: Optional[int] = None,
+    data_type: Optional[DataType] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    batch_size: int = 1000
+) -> Iterator[List]:
+    """
+    Linhas para exportação em lotes de até batch_size, lidas aos poucos com cursor
+    no servidor (yield_per). O nome do dono vem no mesmo SELECT (join), sem uma
+    query extra por linha.
+    """
+    query = select(
+        Upload.id,
+        Upload.filename,
+        Upload.data_type,
+        Upload.status,
+        Upload.sftp_path,
+        Upload.sftp_host,
+        Upload.user_id,
+        Upload.timestamp,
+        Upload.batch_id,
+        Upload.size_bytes,
+        Upload.content_hash,
+        Upload.verification,
+        Upload.attempts,
+        User.username
+    ).outerjoin(User, Upload.user_id == User.id)
+    query = _filter_uploads(query, user_id, data_type, start_date, end_date)
+
+    result = db.execute(query.execution_options(yield_per=batch_size))
+    yield from result.partitions()
@@ -0,0 +1,27 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.crud.remote_catalog import catalog_upsert_statement, uploaded_objects
+from app.crud.upload import bulk_insert_statement
+from app.crud.upload_stats import rollup_deltas, rollup_upsert_statement
+from app.schemas.upload import UploadCreate
+from typing import List
+
+# Variantes AsyncSession (asyncpg) das funções de crud/upload.py usadas pelas rotas async
+
+async def create_upload_logs_bulk(db: AsyncSession, uploads: List[UploadCreate]):
+    """
+    Mesmo INSERT multi-linha com RETURNING de crud.upload.create_upload_logs_bulk
+    (com o agregado e o catálogo remoto na mesma transação).
+    """
+    if not uploads:
+        return []
+
+    result = await db.execute(bulk_insert_statement(), [upload.model_dump() for upload in uploads])
+    rows = result.all()
+    deltas = rollup_deltas((row, 1) for row in rows)
+    if deltas:
+        await db.execute(rollup_upsert_statement(db.get_bind().dialect.name), deltas)
+    objects = uploaded_objects(rows)
+    if objects:
+        await db.execute(catalog_upsert_statement(db.get_bind().dialect.name), objects)
+    await db.commit()
+    return rows
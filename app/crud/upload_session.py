@@ -0,0 +1,63 @@
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.models.upload_session import UploadSession, UploadSessionStatus
+from typing import Optional
+
+def create_upload_session(
+    db: Session,
+    session_id: str,
+    filename: str,
+    data_type,
+    user_id: int,
+    remote_path: str,
+    final_path: str,
+    total_size: Optional[int] = None,
+    sftp_host: Optional[str] = None
+) -> UploadSession:
+    db_session = UploadSession(
+        id=session_id,
+        filename=filename,
+        data_type=data_type,
+        user_id=user_id,
+        remote_path=remote_path,
+        final_path=final_path,
+        sftp_host=sftp_host,
+        total_size=total_size,
+        offset=0,
+        status=UploadSessionStatus.OPEN
+    )
+    db.add(db_session)
+    db.commit()
+    db.refresh(db_session)
+    return db_session
+
+def get_upload_session(db: Session, session_id: str, user_id: Optional[int] = None) -> Optional[UploadSession]:
+    query = db.query(UploadSession).filter(UploadSession.id == session_id)
+    if user_id:
+        query = query.filter(UploadSession.user_id == user_id)
+    return query.first()
+
+def advance_offset(db: Session, session_id: str, expected_offset: int, new_offset: int) -> bool:
+    """
+    Avança o offset só se ninguém mexeu nele desde a leitura (evita dois PUTs no mesmo trecho).
+    """
+    result = db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == session_id, UploadSession.offset == expected_offset)
+        .values(offset=new_offset)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def set_session_status(
+    db: Session,
+    db_session: UploadSession,
+    status: UploadSessionStatus,
+    upload_id: Optional[int] = None
+) -> UploadSession:
+    db_session.status = status
+    if upload_id is not None:
+        db_session.upload_id = upload_id
+    db.commit()
+    db.refresh(db_session)
+    return db_session
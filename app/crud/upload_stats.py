@@ -0,0 +1,133 @@
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from sqlalchemy import Date, case, cast, delete, func, insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models.upload import Upload, DataType, UploadStatus
+from app.models.upload_stats import UploadStatsDaily
+from typing import Any, Iterable, List, Optional, Tuple
+
+# Agrupamentos aceitos por GET /upload/stats
+STATS_GROUPS = {
+    "day": UploadStatsDaily.day,
+    "user_id": UploadStatsDaily.user_id,
+    "data_type": UploadStatsDaily.data_type,
+}
+
+def _utc_day(timestamp: Optional[datetime]) -> date:
+    if timestamp is None:
+        return datetime.now(timezone.utc).date()
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date()
+
+def rollup_deltas(changes: Iterable[Tuple[Any, int]]) -> List[dict]:
+    """
+    (linha de upload_logs, +1/-1) -> incrementos de upload_stats_daily somados por chave.
+    A linha precisa de timestamp, user_id, data_type, status e size_bytes.
+    Saem ordenados pela chave: transações concorrentes travam as linhas na mesma
+    ordem (sem deadlock) e o upsert fica com uma linha por chave.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for row, sign in changes:
+        key = (_utc_day(row.timestamp), row.user_id or 0, DataType(row.data_type), UploadStatus(row.status))
+        totals[key][0] += sign
+        totals[key][1] += sign * (row.size_bytes or 0)
+
+    return [
+        {"day": day, "user_id": user_id, "data_type": data_type, "status": status, "files": files, "bytes": size}
+        for (day, user_id, data_type, status), (files, size) in sorted(
+            totals.items(), key=lambda item: (item[0][0], item[0][1], item[0][2].value, item[0][3].value)
+        )
+        if files or size
+    ]
+
+def rollup_upsert_statement(dialect_name: str):
+    # Compartilhado com a variante assíncrona (crud/upload_async.py); SQLite só nos benchmarks
+    insert_fn = sqlite.insert if dialect_name == "sqlite" else postgresql.insert
+    statement = insert_fn(UploadStatsDaily)
+    return statement.on_conflict_do_update(
+        index_elements=[
+            UploadStatsDaily.day, UploadStatsDaily.user_id, UploadStatsDaily.data_type, UploadStatsDaily.status
+        ],
+        set_={
+            "files": UploadStatsDaily.files + statement.excluded.files,
+            "bytes": UploadStatsDaily.bytes + statement.excluded.bytes,
+        }
+    )
+
+def apply_rollup(db: Session, changes: Iterable[Tuple[Any, int]]):
+    """
+    Soma as mudanças no agregado, sem commit: entra na transação de quem gravou os logs.
+    """
+    deltas = rollup_deltas(changes)
+    if deltas:
+        db.execute(rollup_upsert_statement(db.get_bind().dialect.name), deltas)
+
+def get_upload_stats(
+    db: Session,
+    group_by: List[str],
+    user_id: Optional[int] = None,
+    data_type: Optional[DataType] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> List:
+    """
+    Totais por status agrupados por `group_by` (chaves de STATS_GROUPS).
+    O custo depende de dias x usuários x tipos, não do tamanho de upload_logs.
+    """
+    def files_with(status: UploadStatus):
+        return func.coalesce(func.sum(case((UploadStatsDaily.status == status, UploadStatsDaily.files), else_=0)), 0)
+
+    columns = [STATS_GROUPS[name].label(name) for name in group_by]
+    query = select(
+        *columns,
+        func.coalesce(func.sum(UploadStatsDaily.files), 0).label("files"),
+        files_with(UploadStatus.UPLOADED).label("uploaded"),
+        files_with(UploadStatus.FAILED).label("failed"),
+        files_with(UploadStatus.PENDING).label("pending"),
+        # Bytes entregues: só o que chegou ao SFTP
+        func.coalesce(func.sum(case(
+            (UploadStatsDaily.status == UploadStatus.UPLOADED, UploadStatsDaily.bytes), else_=0
+        )), 0).label("bytes"),
+    )
+    if user_id:
+        query = query.where(UploadStatsDaily.user_id == user_id)
+    if data_type:
+        query = query.where(UploadStatsDaily.data_type == data_type)
+    if start_date:
+        query = query.where(UploadStatsDaily.day >= start_date)
+    if end_date:
+        query = query.where(UploadStatsDaily.day <= end_date)
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+    return db.execute(query).all()
+
+def rebuild_upload_stats(db: Session) -> int:
+    """
+    Recalcula upload_stats_daily inteiro a partir de upload_logs (uma varredura, uma transação).
+    Usado no backfill; no PostgreSQL bloqueia escritas em upload_logs enquanto roda.
+    Retorna o número de linhas do agregado.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("LOCK TABLE upload_logs IN SHARE MODE"))
+        day = cast(func.timezone("UTC", Upload.timestamp), Date)
+    else:
+        day = func.date(Upload.timestamp)
+    user_id = func.coalesce(Upload.user_id, 0)
+
+    source = select(
+        day,
+        user_id,
+        Upload.data_type,
+        Upload.status,
+        func.count(),
+        func.coalesce(func.sum(Upload.size_bytes), 0)
+    ).group_by(day, user_id, Upload.data_type, Upload.status)
+
+    db.execute(delete(UploadStatsDaily))
+    result = db.execute(
+        insert(UploadStatsDaily).from_select(["day", "user_id", "data_type", "status", "files", "bytes"], source)
+    )
+    db.commit()
+    return result.rowcount
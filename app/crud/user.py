@@ -1,11 +1,14 @@
 from sqlalchemy.orm import Session
 from app.models.user import User
-from app.schemas.user import UserCreate
+from app.schemas.user import UserCreate, UserUpdate
 from app.core.security import get_password_hash
 
 def get_user_by_username(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
 
+def get_user(db: Session, user_id: int):
+    return db.query(User).filter(User.id == user_id).first()
+
 def get_users(db: Session, skip: int = 0, limit: int = 100):
     return db.query(User).offset(skip).limit(limit).all()
 
@@ -22,4 +25,18 @@ def create_user(db: Session, user: UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user) 
+    return db_user
+
+def update_user(db: Session, db_user: User, user_in: UserUpdate):
+    update_data = user_in.model_dump(exclude_unset=True)
+
+    if update_data.get("password"):
+        db_user.hashed_password = get_password_hash(update_data.pop("password"))
+    update_data.pop("password", None)
+
+    for field, value in update_data.items():
+        setattr(db_user, field, value)
+
+    db.commit()
+    db.refresh(db_user)
     return db_user
\ No newline at end of file
@@ -1,13 +1,19 @@
+import threading
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.config import settings
 from app.core.database import engine, SessionLocal, Base
+from app.core.metrics import RequestStartMiddleware, render_latest
 from app.api.v1.api import api_router
 from app.crud import user as crud_user
 from app.schemas.user import UserCreate
 from app.models.user import UserRole
+from app.services.sftp_router import sftp_service
+from app.services.sftp_async import async_sftp_service
+from app.services.ingest import ingest_service
+from app.services.catalog import catalog_reconciler
 
 # ==========================================
 # 1. Função para criar o Admin Inicial
@@ -48,10 +54,24 @@ async def lifespan(app: FastAPI):
     
     print("Verificando usuário Admin...")
     init_db() 
+
+    # Batches assíncronos que ficaram no spool antes do último desligamento
+    ingest_service.resume_pending()
+
+    # Pastas do mês atual/próximo criadas em segundo plano (não atrasa o startup)
+    if settings.SFTP_PRECREATE_DIRECTORIES:
+        threading.Thread(target=sftp_service.precreate_directories, daemon=True).start()
+
+    # Reconciliação periódica do catálogo remoto (CATALOG_RECONCILE_INTERVAL)
+    catalog_reconciler.start()
     
     yield 
     
     print("Servidor desligando...")
+    catalog_reconciler.shutdown()
+    ingest_service.shutdown()
+    sftp_service.close()
+    await async_sftp_service.close()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -70,9 +90,18 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# Marca a chegada de cada requisição (tempo de spool do multipart nas métricas)
+app.add_middleware(RequestStartMiddleware)
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        # Formato texto do Prometheus (histogramas por etapa + contadores por DataType)
+        body, content_type = render_latest()
+        return Response(content=body, media_type=content_type)
+
 @app.get("/")
 def root():
     return {"message": "API de Uploads SFTP está rodando! 🚀", "docs": "/docs"}
\ No newline at end of file
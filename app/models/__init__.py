@@ -1,2 +1,5 @@
 from app.models.user import User
-from app.models.upload import Upload
\ No newline at end of file
+from app.models.upload import Upload
+from app.models.upload_session import UploadSession
+from app.models.upload_stats import UploadStatsDaily
+from app.models.remote_catalog import RemoteObject, RemoteCatalogDir, RemoteDrift
\ No newline at end of file
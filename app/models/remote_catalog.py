@@ -0,0 +1,68 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+class RemoteObject(Base):
+    """
+    Catálogo do que existe no SFTP (um registro por arquivo e destino), para navegar
+    e buscar sem listar o servidor. Nasce dos uploads (provisório, source="upload")
+    e é confirmado/corrigido pela reconciliação (source="scan", crud/remote_catalog.py).
+    """
+    __tablename__ = "remote_catalog"
+    __table_args__ = (
+        UniqueConstraint("sftp_host", "path", name="uq_remote_catalog_host_path"),
+        # Reconciliação: tudo de uma pasta de mês (tipo/ano/mes) de um destino
+        Index("ix_remote_catalog_host_month_dir", "sftp_host", "month_dir"),
+        # Navegação: "o que tem do tipo X neste mês", em ordem de caminho
+        Index("ix_remote_catalog_type_period_path", "data_type", "period", "path"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    sftp_host = Column(String, nullable=False)  # nome do destino (como em upload_logs.sftp_host)
+    path = Column(String, nullable=False)
+    name = Column(String, nullable=False)  # último trecho do caminho (busca por nome)
+    directory = Column(String, nullable=False)
+    month_dir = Column(String, nullable=False)  # <base>/<tipo>/<ano>/<mes> que contém o arquivo
+    data_type = Column(String(64), nullable=True)
+    period = Column(String(7), nullable=True)  # "2024/05"
+    kind = Column(String(16), nullable=False, default="data")  # data | metadata | partial
+    size_bytes = Column(BigInteger, nullable=True)
+    mtime = Column(BigInteger, nullable=True)  # epoch (s), como o servidor informa
+    # Hash do conteúdo enviado (antes da compressão), vindo do upload; a varredura não lê arquivos
+    content_hash = Column(String(128), nullable=True)
+    upload_id = Column(Integer, nullable=True)
+    source = Column(String(16), nullable=False)  # upload | scan
+    confirmed_at = Column(DateTime(timezone=True), nullable=True)  # última vez visto na varredura
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RemoteCatalogDir(Base):
+    """
+    mtime de cada pasta de mês na última varredura: a reconciliação só relista as
+    pastas cujo mtime mudou desde então.
+    """
+    __tablename__ = "remote_catalog_dirs"
+
+    sftp_host = Column(String, primary_key=True)
+    path = Column(String, primary_key=True)
+    mtime = Column(BigInteger, nullable=True)
+    files = Column(Integer, nullable=False, default=0)
+    scanned_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RemoteDrift(Base):
+    """
+    Diferença entre o catálogo e o servidor encontrada pela reconciliação:
+    - unknown: arquivo no servidor que nenhum upload registrou;
+    - missing: arquivo catalogado que sumiu do servidor;
+    - changed: arquivo já confirmado cujo tamanho/mtime mudou fora da API.
+    """
+    __tablename__ = "remote_catalog_drift"
+
+    id = Column(Integer, primary_key=True)
+    sftp_host = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    drift = Column(String(16), nullable=False)
+    expected_size = Column(BigInteger, nullable=True)
+    actual_size = Column(BigInteger, nullable=True)
+    expected_mtime = Column(BigInteger, nullable=True)
+    actual_mtime = Column(BigInteger, nullable=True)
+    detected_at = Column(DateTime(timezone=True), server_default=func.now())
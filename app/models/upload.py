@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum as SAEnum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index, Enum as SAEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -19,6 +19,15 @@ class UploadStatus(str, enum.Enum):
 
 class Upload(Base):
     __tablename__ = "upload_logs"
+    # Índices casando com os filtros + ORDER BY timestamp DESC, id DESC (listagem/exportação)
+    __table_args__ = (
+        Index("ix_upload_logs_timestamp_id", "timestamp", "id"),
+        Index("ix_upload_logs_user_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_upload_logs_type_timestamp_id", "data_type", "timestamp", "id"),
+        Index("ix_upload_logs_user_type_timestamp_id", "user_id", "data_type", "timestamp", "id"),
+        # Deduplicação: "já temos este conteúdo para este tipo?"
+        Index("ix_upload_logs_type_content_hash", "data_type", "content_hash"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
@@ -26,6 +35,13 @@ class Upload(Base):
     status = Column(SAEnum(UploadStatus, name='uploadstatus_enum'), nullable=False)
     sftp_path = Column(String, nullable=False)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    batch_id = Column(String, index=True, nullable=True)
+    content_hash = Column(String(128), nullable=True)
+    size_bytes = Column(BigInteger, nullable=True)
+    verification = Column(String(16), nullable=True)  # "size", "checksum" ou vazio (não verificado)
+    sftp_host = Column(String, nullable=True)  # destino SFTP (nome em SFTP_DESTINATIONS); "a,b" se replicado
+    attempts = Column(Integer, nullable=True)  # tentativas de envio (>1 = houve retentativa)
+    last_error = Column(String, nullable=True)  # último erro (motivo da falha ou o que foi superado)
     
     user_id = Column(Integer, ForeignKey("users.id"))
 
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Enum as SAEnum
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.core.database import Base
+from app.models.upload import DataType
+import enum
+
+class UploadSessionStatus(str, enum.Enum):
+    OPEN = "open"
+    COMPLETED = "completed"
+    ABORTED = "aborted"
+
+class UploadSession(Base):
+    """
+    Estado de um upload resumível (chunks gravados direto no SFTP por offset).
+    """
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True, index=True)
+    filename = Column(String, nullable=False)
+    data_type = Column(SAEnum(DataType, name='datatype_enum'), nullable=False)
+    status = Column(SAEnum(UploadSessionStatus, name='uploadsessionstatus_enum'), default=UploadSessionStatus.OPEN, nullable=False)
+    total_size = Column(BigInteger, nullable=True)  # opcional: validado no finalize
+    offset = Column(BigInteger, default=0, nullable=False)  # bytes já confirmados no remoto
+    remote_path = Column(String, nullable=False)  # arquivo temporário (.part) no SFTP
+    final_path = Column(String, nullable=False)
+    sftp_host = Column(String, nullable=True)  # destino SFTP que guarda o .part
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    upload_id = Column(Integer, ForeignKey("upload_logs.id"), nullable=True)
+
+    owner = relationship("User")
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, BigInteger, Date, Enum as SAEnum
+from app.core.database import Base
+from app.models.upload import DataType, UploadStatus
+
+class UploadStatsDaily(Base):
+    """
+    Agregado de upload_logs por (dia UTC, usuário, tipo, status), mantido na mesma
+    transação que grava/atualiza os logs (crud/upload_stats.py). O painel lê daqui
+    em vez de varrer upload_logs.
+    """
+    __tablename__ = "upload_stats_daily"
+
+    day = Column(Date, primary_key=True)
+    user_id = Column(Integer, primary_key=True, autoincrement=False)  # 0 = log sem usuário
+    data_type = Column(SAEnum(DataType, name='datatype_enum'), primary_key=True)
+    status = Column(SAEnum(UploadStatus, name='uploadstatus_enum'), primary_key=True)
+    files = Column(BigInteger, nullable=False, default=0)
+    bytes = Column(BigInteger, nullable=False, default=0)
@@ -1,3 +1,4 @@
 from .user import UserCreate, UserResponse, UserUpdate
 from .upload import UploadCreate, UploadResponse
-from .token import Token, TokenData
\ No newline at end of file
+from .token import Token, TokenData
+from .upload_session import UploadSessionCreate, UploadSessionResponse
\ No newline at end of file
@@ -0,0 +1,45 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import List, Optional
+
+class RemoteObjectResponse(BaseModel):
+    sftp_host: str
+    path: str
+    name: str
+    directory: str
+    data_type: Optional[str] = None
+    period: Optional[str] = None
+    kind: str
+    size_bytes: Optional[int] = None
+    mtime: Optional[int] = None
+    content_hash: Optional[str] = None
+    upload_id: Optional[int] = None
+    source: str  # upload (ainda não conferido) | scan (visto na reconciliação)
+    confirmed_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+# Página do catálogo; os totais são de tudo que casa com os filtros
+class RemoteObjectPage(BaseModel):
+    items: List[RemoteObjectResponse]
+    total_files: int
+    total_bytes: int
+    next_cursor: Optional[str] = None
+
+class RemoteDriftResponse(BaseModel):
+    id: int
+    sftp_host: str
+    path: str
+    drift: str  # unknown | missing | changed
+    expected_size: Optional[int] = None
+    actual_size: Optional[int] = None
+    expected_mtime: Optional[int] = None
+    actual_mtime: Optional[int] = None
+    detected_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class RemoteDriftPage(BaseModel):
+    items: List[RemoteDriftResponse]
+    next_cursor: Optional[str] = None
@@ -1,7 +1,7 @@
 from pydantic import BaseModel, ConfigDict
-from datetime import datetime
+from datetime import date, datetime
 from app.models.upload import DataType, UploadStatus
-from typing import Optional
+from typing import Dict, List, Optional
 
 class UploadBase(BaseModel):
     filename: str
@@ -11,11 +11,71 @@ class UploadBase(BaseModel):
 
 class UploadCreate(UploadBase):
     user_id: int
+    batch_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    size_bytes: Optional[int] = None
+    verification: Optional[str] = None
+    sftp_host: Optional[str] = None
+    attempts: Optional[int] = None
+    last_error: Optional[str] = None
 
 class UploadResponse(UploadBase):
     id: int
     timestamp: datetime
     user_id: int
+    batch_id: Optional[str] = None
+    content_hash: Optional[str] = None
+    size_bytes: Optional[int] = None
+    verification: Optional[str] = None
+    sftp_host: Optional[str] = None
+    attempts: Optional[int] = None
+    last_error: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+# Página da listagem com paginação por cursor
+class UploadPage(BaseModel):
+    items: List[UploadResponse]
+    next_cursor: Optional[str] = None
+
+# Pré-checagem de deduplicação: o cliente manda os hashes antes dos arquivos
+class DedupCheckRequest(BaseModel):
+    data_type: DataType
+    hashes: List[str]
+
+class DedupCheckResponse(BaseModel):
+    algorithm: str
+    known: Dict[str, str]  # hash -> caminho SFTP já existente
+    missing: List[str]
+
+# Resposta do modo assíncrono (202): o cliente consulta o batch depois
+class BatchAccepted(BaseModel):
+    batch_id: str
+    status: UploadStatus
+    files: int
+
+class BatchStatusResponse(BaseModel):
+    batch_id: str
+    total: int
+    pending: int
+    uploaded: int
+    failed: int
+    items: List[UploadResponse]
+
+# Agregados do painel (GET /upload/stats); campos de agrupamento ficam vazios quando não agrupados
+class UploadStatsItem(BaseModel):
+    day: Optional[date] = None
+    user_id: Optional[int] = None
+    data_type: Optional[DataType] = None
+    files: int
+    uploaded: int
+    failed: int
+    pending: int
+    bytes: int  # bytes entregues (status uploaded)
+    failure_rate: float  # failed / (uploaded + failed)
+
+class UploadStatsResponse(BaseModel):
+    group_by: List[str]
+    items: List[UploadStatsItem]
+    totals: UploadStatsItem
@@ -0,0 +1,24 @@
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime
+from typing import Optional
+from app.models.upload import DataType
+from app.models.upload_session import UploadSessionStatus
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    data_type: DataType
+    total_size: Optional[int] = None
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    filename: str
+    data_type: DataType
+    status: UploadSessionStatus
+    total_size: Optional[int] = None
+    offset: int
+    final_path: str
+    sftp_host: Optional[str] = None
+    upload_id: Optional[int] = None
+    created_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,29 @@
+"""
+Recalcula o agregado upload_stats_daily a partir de upload_logs.
+
+Rodar uma vez após o deploy que criou a tabela (ou sempre que quiser reconciliar):
+
+    python -m app.scripts.backfill_upload_stats
+
+Depois disso o agregado é mantido pelas próprias gravações de upload_logs.
+"""
+import time
+
+from app.core.database import Base, SessionLocal, engine
+from app.crud.upload_stats import rebuild_upload_stats
+import app.models  # noqa: F401  (registra as tabelas no Base)
+
+
+def main():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        rows = rebuild_upload_stats(db)
+        print(f"upload_stats_daily recalculado: {rows} linhas em {time.perf_counter() - start:.1f}s.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
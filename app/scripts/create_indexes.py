@@ -0,0 +1,54 @@
+"""
+Cria nos bancos já existentes os índices declarados nos models (create_all não mexe
+em tabelas que já existem, então índices novos de upload_logs nunca chegariam lá).
+
+Rodar em cada deploy, depois de app.scripts.upgrade_schema (alguns índices usam
+colunas novas):
+
+    python -m app.scripts.create_indexes
+
+No PostgreSQL usa CREATE INDEX CONCURRENTLY IF NOT EXISTS: não bloqueia as gravações
+de upload_logs enquanto constrói. Um índice que ficou inválido (CONCURRENTLY
+interrompido) é apagado e recriado. Idempotente.
+"""
+import time
+
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+from app.core.database import Base, engine
+import app.models  # noqa: F401  (registra as tabelas no Base)
+
+
+def _invalid_indexes(connection) -> set:
+    rows = connection.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+    ))
+    return {row[0] for row in rows}
+
+
+def main():
+    # CONCURRENTLY não roda dentro de transação
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        dialect = connection.dialect
+        postgres = dialect.name == "postgresql"
+        existing_tables = set(inspect(connection).get_table_names())
+        invalid = _invalid_indexes(connection) if postgres else set()
+
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue  # create_all cria a tabela já com os índices
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in invalid:
+                    print(f"Índice inválido, recriando: {index.name}")
+                    connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                statement = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+                if postgres:
+                    statement = statement.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)
+                start = time.perf_counter()
+                connection.execute(text(statement))
+                print(f"{index.name}: ok ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Adiciona às tabelas já existentes as colunas que os models ganharam depois que elas
+foram criadas (create_all só cria tabelas novas, não altera as existentes).
+
+Rodar em cada deploy, antes de subir a nova versão da API:
+
+    python -m app.scripts.upgrade_schema
+
+Idempotente: compara os models com o banco e só faz ALTER TABLE ... ADD COLUMN do que
+falta (no PostgreSQL com IF NOT EXISTS). As colunas novas são sempre anuláveis, então
+o ALTER não reescreve a tabela. Os índices ficam com app.scripts.create_indexes.
+"""
+from sqlalchemy import inspect, text
+
+from app.core.database import Base, engine
+import app.models  # noqa: F401  (registra as tabelas no Base)
+
+
+def missing_columns(connection) -> list:
+    """
+    [(tabela, coluna)] dos models que o banco ainda não tem, em tabelas que já existem.
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue  # create_all cria a tabela inteira
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing += [(table, column) for column in table.columns if column.name not in existing]
+    return missing
+
+
+def main():
+    with engine.begin() as connection:
+        dialect = connection.dialect
+        if_not_exists = "IF NOT EXISTS " if dialect.name == "postgresql" else ""
+        added = 0
+        for table, column in missing_columns(connection):
+            if not column.nullable and column.server_default is None:
+                raise SystemExit(
+                    f"{table.name}.{column.name} é NOT NULL sem server_default: precisa de migração manual."
+                )
+            column_type = column.type.compile(dialect=dialect)
+            connection.execute(text(
+                f'ALTER TABLE {table.name} ADD COLUMN {if_not_exists}"{column.name}" {column_type}'
+            ))
+            print(f"Coluna adicionada: {table.name}.{column.name} {column_type}")
+            added += 1
+
+    # Tabelas que ainda não existem (upload_sessions, upload_stats_daily, ...)
+    Base.metadata.create_all(bind=engine)
+    print(f"Schema atualizado ({added} colunas adicionadas).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import tarfile
+import zipfile
+from typing import BinaryIO, Optional, Tuple
+
+# Extensões removidas do nome do pacote para formar a pasta remota
+ARCHIVE_SUFFIXES = (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".tar", ".zip")
+
+# Lixo que ferramentas de compactação colocam nos pacotes
+IGNORED_PREFIXES = ("__MACOSX/",)
+
+
+def archive_stem(filename: str) -> str:
+    """
+    "coleta 01.tar.gz" -> "coleta_01": nome da pasta remota que recebe as entradas.
+    """
+    name = filename.rsplit("/", 1)[-1]
+    lowered = name.lower()
+    for suffix in ARCHIVE_SUFFIXES:
+        if lowered.endswith(suffix) and len(name) > len(suffix):
+            name = name[:-len(suffix)]
+            break
+    return name.replace(" ", "_")
+
+
+def entry_path(name: str) -> Optional[Tuple[str, str]]:
+    """
+    Caminho de uma entrada do pacote -> (subpasta relativa, nome do arquivo).
+    Partes vazias, "." e ".." são descartadas (nada escapa da pasta do pacote).
+    Retorna None para entradas que devem ser ignoradas.
+    """
+    name = name.replace("\\", "/")
+    if name.startswith(IGNORED_PREFIXES):
+        return None
+    parts = [part.replace(" ", "_") for part in name.split("/") if part not in ("", ".", "..")]
+    if not parts:
+        return None
+    return "/".join(parts[:-1]), parts[-1]
+
+
+def open_archive(fileobj: BinaryIO):
+    """
+    Detecta o formato pelo conteúdo e devolve ("zip", ZipFile) ou ("tar", TarFile).
+    O tar é aberto em modo stream ("r|*"): lido uma única vez, em ordem, com
+    gzip/bz2/xz descomprimidos no caminho. Levanta ValueError se não reconhecer.
+    """
+    fileobj.seek(0)
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        return "zip", zipfile.ZipFile(fileobj)
+
+    fileobj.seek(0)
+    try:
+        return "tar", tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.TarError as e:
+        raise ValueError(f"Formato de pacote não suportado (esperado zip ou tar[.gz]): {e}")
@@ -0,0 +1,245 @@
+import re
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.crud import remote_catalog as crud_catalog
+from app.models.upload import DataType
+from app.services.sftp_router import Destination, sftp_service
+
+YEAR_DIR = re.compile(r"\d{4}")
+MONTH_DIR = re.compile(r"\d{2}")
+# Pastas alteradas há menos que isso (relógio do servidor) não têm o mtime gravado
+MTIME_SETTLE_SECONDS = 2
+
+
+def _subdirs(sftp, path: str) -> list:
+    return [attr for attr in sftp.listdir_attr(path) if stat.S_ISDIR(attr.st_mode or 0)]
+
+
+class CatalogReconciler:
+    """
+    Confere o catálogo (remote_catalog) contra o que está de fato em cada destino SFTP.
+
+    Incremental: lista só os níveis <base>/<tipo>/<ano> para ler o mtime das pastas de
+    mês e relista (recursivamente, CATALOG_RECONCILE_WORKERS em paralelo) apenas as
+    pastas cujo mtime mudou desde a última varredura, ou que sumiram. O mtime de uma
+    pasta muda quando um arquivo é criado/apagado/renomeado nela, mas não quando um
+    arquivo é sobrescrito no lugar nem quando algo muda numa subpasta (pacotes), então
+    a cada CATALOG_FULL_SCAN_EVERY execuções todas as pastas são relistadas.
+    """
+    def __init__(self):
+        self.interval = settings.CATALOG_RECONCILE_INTERVAL
+        self.workers = max(1, settings.CATALOG_RECONCILE_WORKERS)
+        self.full_scan_every = settings.CATALOG_FULL_SCAN_EVERY
+        self.data_types = {data_type.value for data_type in DataType}
+
+        self._running = threading.Lock()  # uma reconciliação por vez
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._runs = 0
+        self.last_run: Optional[dict] = None
+
+    # ------------------------------------------------------------------
+    # Listagem remota
+    # ------------------------------------------------------------------
+    def _month_dirs(self, sftp, base: str) -> Dict[str, Tuple[str, str, int]]:
+        """
+        {<base>/<tipo>/<ano>/<mes>: (tipo, "ano/mes", mtime)} de um destino.
+        Só entra em pastas de DataType conhecidos.
+        """
+        months = {}
+        for type_attr in _subdirs(sftp, base):
+            if type_attr.filename not in self.data_types:
+                continue
+            type_dir = f"{base}/{type_attr.filename}"
+            for year_attr in _subdirs(sftp, type_dir):
+                if not YEAR_DIR.fullmatch(year_attr.filename):
+                    continue
+                year_dir = f"{type_dir}/{year_attr.filename}"
+                for month_attr in _subdirs(sftp, year_dir):
+                    if MONTH_DIR.fullmatch(month_attr.filename):
+                        months[f"{year_dir}/{month_attr.filename}"] = (
+                            type_attr.filename, f"{year_attr.filename}/{month_attr.filename}", month_attr.st_mtime
+                        )
+        return months
+
+    @staticmethod
+    def _walk(sftp, month_dir: str) -> Optional[List[Tuple[str, int, int]]]:
+        """
+        (caminho, tamanho, mtime) de todos os arquivos abaixo da pasta; None se ela não existe mais.
+        """
+        files = []
+        pending = [month_dir]
+        while pending:
+            current = pending.pop()
+            try:
+                entries = sftp.listdir_attr(current)
+            except FileNotFoundError:
+                if current == month_dir:
+                    return None
+                continue  # subpasta apagada durante a listagem
+            for attr in entries:
+                path = f"{current}/{attr.filename}"
+                if stat.S_ISDIR(attr.st_mode or 0):
+                    pending.append(path)
+                elif stat.S_ISREG(attr.st_mode or 0):
+                    files.append((path, attr.st_size, attr.st_mtime))
+        return files
+
+    # ------------------------------------------------------------------
+    # Reconciliação
+    # ------------------------------------------------------------------
+    def _reconcile_destination(self, destination: Destination, full: bool) -> dict:
+        service = destination.service
+        base = service.base_remote_dir
+        summary = {
+            "sftp_host": destination.name, "month_dirs": 0, "scanned": 0,
+            "files": 0, "added": 0, "updated": 0, "removed": 0, "drift": 0, "errors": [],
+        }
+        try:
+            with service.pool.session() as session:
+                months = self._month_dirs(session.sftp, base)
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            summary["errors"].append(f"{base}: {error}")
+            return summary
+
+        def scan(month_dir: str):
+            # listed_at antes de listar: uploads registrados depois disso não são julgados por esta listagem
+            listed_at = datetime.now(timezone.utc)
+            with service.pool.session() as session:
+                return listed_at, self._walk(session.sftp, month_dir)
+
+        def apply(month_dir: str, listed: Callable[[], tuple]):
+            # Falha numa pasta não para as outras; ela fica com o mtime antigo e volta na próxima passada
+            try:
+                listed_at, listing = listed()
+                if listing is None:
+                    # Pasta sumiu: o que estava catalogado nela vira "missing"
+                    data_type, year, month = month_dir.split("/")[-3:]
+                    counts = crud_catalog.apply_directory_scan(
+                        db, destination.name, month_dir, data_type, f"{year}/{month}", None, [], listed_at
+                    )
+                else:
+                    data_type, period, mtime = months[month_dir]
+                    if mtime is not None and mtime >= listed_at.timestamp() - MTIME_SETTLE_SECONDS:
+                        # mtime tem resolução de segundos: algo criado ainda neste segundo não
+                        # mudaria o mtime, então a pasta é relistada na próxima passada
+                        mtime = None
+                    counts = crud_catalog.apply_directory_scan(
+                        db, destination.name, month_dir, data_type, period, mtime, listing, listed_at
+                    )
+            except Exception as e:
+                db.rollback()
+                error = e.detail if isinstance(e, HTTPException) else str(e)
+                summary["errors"].append(f"{month_dir}: {error}")
+                return
+            summary["scanned"] += 1
+            for key, value in counts.items():
+                summary[key] += value
+
+        db = SessionLocal()
+        try:
+            stored = crud_catalog.get_dir_states(db, destination.name)
+            known = set(stored)
+            if full:
+                known |= crud_catalog.get_catalogued_month_dirs(db, destination.name)
+            changed = [
+                month_dir for month_dir, (_, _, mtime) in sorted(months.items())
+                if full or stored.get(month_dir) != mtime
+            ]
+            # Só pastas no formato <base>/<tipo>/<ano>/<mes> deste destino
+            layout = re.compile(rf"{re.escape(base)}/[^/]+/\d{{4}}/\d{{2}}")
+            vanished = sorted(month_dir for month_dir in known - set(months) if layout.fullmatch(month_dir))
+            summary["month_dirs"] = len(months)
+
+            if changed:
+                with ThreadPoolExecutor(
+                    max_workers=min(self.workers, len(changed)), thread_name_prefix="catalog"
+                ) as executor:
+                    futures = {executor.submit(scan, month_dir): month_dir for month_dir in changed}
+                    # Cada pasta é gravada assim que a listagem dela chega (uma transação por pasta)
+                    for future in as_completed(futures):
+                        apply(futures[future], future.result)
+            for month_dir in vanished:
+                apply(month_dir, lambda: (datetime.now(timezone.utc), None))
+        finally:
+            db.close()
+        return summary
+
+    def reconcile(self, full: Optional[bool] = None) -> dict:
+        """
+        Uma passada por todos os destinos. full=None: completa a cada CATALOG_FULL_SCAN_EVERY
+        execuções, incremental nas outras. 409 se já houver uma em andamento.
+        """
+        if not self._running.acquire(blocking=False):
+            raise HTTPException(status_code=409, detail="Reconciliação do catálogo já em andamento.")
+        try:
+            self._runs += 1
+            if full is None:
+                full = self.full_scan_every > 0 and self._runs % self.full_scan_every == 0
+            started = time.monotonic()
+            started_at = datetime.now(timezone.utc)
+            destinations = [
+                self._reconcile_destination(destination, full) for destination in sftp_service.destinations
+            ]
+            result = {
+                "full": full,
+                "started_at": started_at,
+                "duration_s": round(time.monotonic() - started, 3),
+                "destinations": destinations,
+            }
+            self.last_run = result
+            print(
+                f"Catálogo reconciliado ({'completo' if full else 'incremental'}, {result['duration_s']}s): "
+                + ", ".join(
+                    f"{item['sftp_host']} {item['scanned']}/{item['month_dirs']} pastas, drift {item['drift']}"
+                    for item in destinations
+                )
+            )
+            return result
+        finally:
+            self._running.release()
+
+    # ------------------------------------------------------------------
+    # Background
+    # ------------------------------------------------------------------
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reconcile()
+            except HTTPException:
+                pass  # uma execução sob demanda ainda está rodando
+            except Exception as e:
+                print(f"Erro na reconciliação do catálogo: {e}")
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="catalog-reconciler", daemon=True)
+        self._thread.start()
+
+    def shutdown(self):
+        # Não espera a passada em andamento: a próxima refaz as pastas que não foram gravadas
+        self._stop.set()
+
+    def stats(self) -> dict:
+        return {
+            "interval_s": self.interval,
+            "workers": self.workers,
+            "full_scan_every": self.full_scan_every,
+            "running": self._running.locked(),
+            "runs": self._runs,
+            "last_run": self.last_run,
+        }
+
+# Instância Singleton
+catalog_reconciler = CatalogReconciler()
@@ -0,0 +1,213 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # opcional: só a exportação em Parquet precisa
+    pyarrow = None
+
+from fastapi import HTTPException
+
+from app.core.database import SessionLocal
+from app.crud import upload as crud_upload
+from app.models.upload import DataType
+
+# Tamanho aproximado de cada pedaço enviado ao cliente durante a exportação
+EXPORT_FLUSH_BYTES = 64 * 1024
+# Linhas por row group do Parquet (= linhas por lote lido do banco)
+PARQUET_ROW_GROUP = 10000
+
+# Colunas do NDJSON/Parquet (tipadas: o loader não precisa interpretar texto)
+EXPORT_COLUMNS = (
+    "id", "filename", "data_type", "status", "sftp_path", "sftp_host", "user_id", "username",
+    "batch_id", "size_bytes", "content_hash", "verification", "attempts", "timestamp",
+)
+
+
+def _utc(timestamp: Optional[datetime]) -> Optional[datetime]:
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        # Sem fuso (SQLite) = já está em UTC
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def _record(row) -> dict:
+    record = {name: getattr(row, name) for name in EXPORT_COLUMNS}
+    record["data_type"] = row.data_type.value
+    record["status"] = row.status.value
+    record["timestamp"] = _utc(row.timestamp)
+    return record
+
+
+def _csv_chunks(batches: Iterator) -> Iterator[str]:
+    stream = io.StringIO()
+    csv_writer = csv.writer(stream)
+
+    # Cabeçalhos (vai logo no primeiro pedaço, antes da consulta)
+    csv_writer.writerow(["ID", "Arquivo", "Tipo", "Status", "Caminho SFTP", "Host SFTP", "Usuário", "Data Upload (UTC)"])
+    yield stream.getvalue()
+    stream.seek(0)
+    stream.truncate()
+
+    for batch in batches:
+        for row in batch:
+            # Prevenção de erro caso usuário tenha sido deletado
+            owner_name = row.username if row.username else f"User ID {row.user_id}"
+
+            csv_writer.writerow([
+                row.id,
+                row.filename,
+                row.data_type.value,
+                row.status.value,
+                row.sftp_path,
+                row.sftp_host or "",
+                owner_name,
+                row.timestamp.strftime("%Y-%m-%d %H:%M:%S")
+            ])
+
+            if stream.tell() >= EXPORT_FLUSH_BYTES:
+                yield stream.getvalue()
+                stream.seek(0)
+                stream.truncate()
+
+    if stream.tell():
+        yield stream.getvalue()
+
+
+def _ndjson_gz_chunks(batches: Iterator) -> Iterator[bytes]:
+    """
+    Um objeto JSON por linha, comprimido em gzip à medida que as linhas chegam.
+    """
+    # wbits=31: formato gzip (legível por gunzip / pandas.read_json(compression="gzip"))
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = bytearray()
+    for batch in batches:
+        lines = "".join(
+            json.dumps(_record(row), ensure_ascii=False, separators=(",", ":"), default=datetime.isoformat) + "\n"
+            for row in batch
+        )
+        pending += compressor.compress(lines.encode("utf-8"))
+        if len(pending) >= EXPORT_FLUSH_BYTES:
+            yield bytes(pending)
+            pending.clear()
+    pending += compressor.flush()
+    yield bytes(pending)
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    Destino do ParquetWriter: acumula o que foi escrito até o gerador repassar ao cliente.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _parquet_schema():
+    return pyarrow.schema([
+        ("id", pyarrow.int64()),
+        ("filename", pyarrow.string()),
+        ("data_type", pyarrow.string()),
+        ("status", pyarrow.string()),
+        ("sftp_path", pyarrow.string()),
+        ("sftp_host", pyarrow.string()),
+        ("user_id", pyarrow.int64()),
+        ("username", pyarrow.string()),
+        ("batch_id", pyarrow.string()),
+        ("size_bytes", pyarrow.int64()),
+        ("content_hash", pyarrow.string()),
+        ("verification", pyarrow.string()),
+        ("attempts", pyarrow.int32()),
+        ("timestamp", pyarrow.timestamp("us", tz="UTC")),
+    ])
+
+
+def _parquet_chunks(batches: Iterator) -> Iterator[bytes]:
+    """
+    Um row group por lote lido do banco: cada lote é escrito e repassado ao cliente
+    antes de ler o próximo (memória limitada a um lote). O rodapé vai no fim.
+    """
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in batches:
+            records = [_record(row) for row in batch]
+            columns = {name: [record[name] for record in records] for name in schema.names}
+            writer.write_table(pyarrow.Table.from_pydict(columns, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+# formato -> (gerador, media type, extensão do arquivo)
+EXPORT_FORMATS = {
+    "csv": (_csv_chunks, "text/csv", "csv"),
+    "ndjson.gz": (_ndjson_gz_chunks, "application/gzip", "ndjson.gz"),
+    "parquet": (_parquet_chunks, "application/vnd.apache.parquet", "parquet"),
+}
+
+
+def check_export_format(export_format: str):
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato de exportação inválido: {export_format}. Use {', '.join(EXPORT_FORMATS)}."
+        )
+    if export_format == "parquet" and pyarrow is None:
+        raise HTTPException(
+            status_code=501, detail="Exportação em Parquet requer o pacote opcional 'pyarrow'."
+        )
+
+
+def export_chunks(
+    export_format: str,
+    user_id: Optional[int],
+    data_type: Optional[DataType],
+    start_date: Optional[datetime],
+    end_date: Optional[datetime]
+) -> Iterator:
+    """
+    Gera a exportação de upload_logs em pedaços, no formato pedido (ver EXPORT_FORMATS).
+    """
+    # Sessão própria: o gerador roda depois que a dependência get_db já foi encerrada
+    db = SessionLocal()
+    try:
+        batch_size = PARQUET_ROW_GROUP if export_format == "parquet" else 1000
+        batches = crud_upload.iter_upload_batches_for_export(
+            db=db,
+            user_id=user_id,
+            data_type=data_type,
+            start_date=start_date,
+            end_date=end_date,
+            batch_size=batch_size
+        )
+        yield from EXPORT_FORMATS[export_format][0](batches)
+    finally:
+        db.close()
@@ -0,0 +1,221 @@
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import UploadFile, HTTPException
+from typing import Dict, List
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.metrics import stage_timer
+from app.crud import upload as crud_upload
+from app.models.upload import UploadStatus
+from app.services.scheduler import upload_scheduler
+from app.services.sftp import SFTPService
+from app.services.sftp_pool import backoff_delay, is_transient
+from app.services.sftp_router import sftp_service
+
+MANIFEST_NAME = "batch.json"
+
+
+class IngestService:
+    """
+    Modo assíncrono de upload: o batch é gravado no disco local (spool), as linhas
+    ficam PENDING e um pool de workers entrega os arquivos no SFTP em background.
+    Com o SFTP fora do ar (503) nada se perde: o batch continua no spool e é
+    reagendado com backoff até ser entregue.
+    """
+    def __init__(self):
+        self.spool_dir = settings.INGEST_SPOOL_DIR
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, settings.INGEST_WORKERS),
+            thread_name_prefix="ingest",
+        )
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def _batch_dir(self, batch_id: str) -> str:
+        return os.path.join(self.spool_dir, batch_id)
+
+    def _write_manifest(self, batch_id: str, manifest: dict):
+        # Troca atômica: um restart nunca encontra manifesto pela metade
+        manifest_path = os.path.join(self._batch_dir(batch_id), MANIFEST_NAME)
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, default=str)
+        os.replace(tmp_path, manifest_path)
+
+    def spool_batch(self, batch_id: str, files: List[UploadFile], data_type: str, metadata_base: dict) -> List[dict]:
+        """
+        Copia os arquivos recebidos para o spool local e grava o manifesto antes de o
+        chamador criar as linhas PENDING: se o processo cair entre uma coisa e outra,
+        resume_pending ainda encontra o batch. Retorna nome/caminho de cada um.
+        """
+        batch_dir = self._batch_dir(batch_id)
+        os.makedirs(batch_dir, exist_ok=True)
+
+        spooled = []
+        for idx, file in enumerate(files):
+            # Nome local neutro; o nome original vai no manifesto
+            local_path = os.path.join(batch_dir, f"{idx:06d}.part")
+            file.file.seek(0)
+            with open(local_path, "wb") as out:
+                shutil.copyfileobj(file.file, out, 1024 * 1024)
+            spooled.append({
+                "filename": file.filename,
+                "local_path": local_path,
+                "size": os.path.getsize(local_path),
+            })
+        self._write_manifest(batch_id, {
+            "batch_id": batch_id, "data_type": data_type, "metadata_base": metadata_base, "items": spooled
+        })
+        return spooled
+
+    def submit(self, batch_id: str, data_type: str, metadata_base: dict, items: List[dict]):
+        """
+        Completa o manifesto com o upload_id (linha PENDING) de cada item e agenda a entrega.
+        Cada item deve ter filename, local_path, size e upload_id.
+        """
+        self._write_manifest(batch_id, {
+            "batch_id": batch_id, "data_type": data_type, "metadata_base": metadata_base, "items": items
+        })
+        self.executor.submit(self._deliver, batch_id)
+
+    def _retry_later(self, batch_id: str, manifest: dict, error: str):
+        """
+        Falha transitória do batch inteiro: mantém spool e linhas PENDING e tenta de
+        novo após o backoff. O número de tentativas fica no manifesto (sobrevive a restart).
+        """
+        attempt = manifest.get("attempts", 0) + 1
+        manifest["attempts"] = attempt
+        self._write_manifest(batch_id, manifest)
+        delay = max(1.0, backoff_delay(attempt, settings.INGEST_RETRY_BACKOFF, settings.INGEST_RETRY_BACKOFF_MAX))
+        print(f"Batch {batch_id} não entregue (tentativa {attempt}): {error}; nova tentativa em {delay:.0f}s")
+
+        def resubmit():
+            with self._lock:
+                self._timers.pop(batch_id, None)
+            self.executor.submit(self._deliver, batch_id)
+
+        timer = threading.Timer(delay, resubmit)
+        timer.daemon = True
+        with self._lock:
+            self._timers[batch_id] = timer
+        timer.start()
+
+    def _attach_upload_ids(self, batch_id: str, manifest: dict) -> bool:
+        """
+        Manifesto gravado antes das linhas PENDING (o processo caiu no meio): busca as
+        linhas do batch, na mesma ordem do spool. Sem linhas, o cliente nunca recebeu o
+        202 e o spool é descartado. Retorna se há o que entregar.
+        """
+        db = SessionLocal()
+        try:
+            pending = [
+                upload for upload in crud_upload.get_uploads_by_batch(db, batch_id)
+                if upload.status == UploadStatus.PENDING
+            ]
+        finally:
+            db.close()
+        items = manifest["items"]
+        if not pending:
+            print(f"Batch {batch_id} no spool sem linhas no banco; descartando.")
+            shutil.rmtree(self._batch_dir(batch_id), ignore_errors=True)
+            return False
+        if len(pending) != len(items):
+            raise RuntimeError(f"{len(pending)} linhas PENDING para {len(items)} arquivos no spool")
+        for item, upload in zip(items, pending):
+            item["upload_id"] = upload.id
+        self._write_manifest(batch_id, manifest)
+        return True
+
+    def _deliver(self, batch_id: str):
+        try:
+            self._deliver_batch(batch_id)
+        except Exception as e:
+            # O spool fica no disco e o batch é retomado no próximo start
+            print(f"Erro Crítico no batch em background {batch_id}: {e}")
+
+    def _deliver_batch(self, batch_id: str):
+        batch_dir = self._batch_dir(batch_id)
+        with open(os.path.join(batch_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+
+        items = manifest["items"]
+        if any("upload_id" not in item for item in items) and not self._attach_upload_ids(batch_id, manifest):
+            return
+        handles = [open(item["local_path"], "rb") for item in items]
+        try:
+            files = [
+                UploadFile(handle, filename=item["filename"], size=item["size"])
+                for handle, item in zip(handles, items)
+            ]
+            metadata_base = manifest["metadata_base"]
+            cost = sum(item["size"] or 0 for item in items)
+            try:
+                # Mesma fila justa das requisições; em background espera a vez sem 429
+                user, role = metadata_base.get("uploaded_by", ""), metadata_base.get("user_role")
+                with upload_scheduler.slot(user, role, cost) as ticket:
+                    if ticket is not None:
+                        files = ticket.throttle_files(files)
+                    results = sftp_service.upload_batch(files, manifest["data_type"], metadata_base)
+            except HTTPException as e:
+                if is_transient(e):
+                    # Destinos fora do ar/pool esgotado: nada foi gravado, tenta de novo depois
+                    self._retry_later(batch_id, manifest, e.detail)
+                    return
+                # Erro permanente: as linhas viram FAILED e o spool é descartado
+                print(f"Falha ao entregar batch {batch_id}: {e.detail}")
+                results = [SFTPService._failed_result(item["filename"], e.detail) for item in items]
+        finally:
+            for handle in handles:
+                handle.close()
+
+        updates = [
+            {
+                "id": item["upload_id"],
+                "status": UploadStatus.UPLOADED if result["status"] == "uploaded" else UploadStatus.FAILED,
+                "sftp_path": result.get("sftp_path", ""),
+                "sftp_host": result.get("sftp_host"),
+                "content_hash": result.get("content_hash"),
+                "size_bytes": result.get("size"),
+                "verification": result.get("verification"),
+                "attempts": result.get("attempts"),
+                "last_error": result.get("last_error") or result.get("error"),
+            }
+            for item, result in zip(items, results)
+        ]
+
+        db = SessionLocal()
+        try:
+            with stage_timer("db_commit"):
+                crud_upload.finish_pending_uploads(db, updates)
+        finally:
+            db.close()
+
+        # Só apaga o spool depois que o banco refletiu o resultado
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        print(f"Batch {batch_id} entregue em background ({len(items)} arquivos).")
+
+    def resume_pending(self):
+        """
+        Reagenda batches que ficaram no spool (ex.: servidor reiniciou no meio da entrega).
+        """
+        if not os.path.isdir(self.spool_dir):
+            return
+        for batch_id in os.listdir(self.spool_dir):
+            if os.path.isfile(os.path.join(self._batch_dir(batch_id), MANIFEST_NAME)):
+                print(f"Retomando batch pendente: {batch_id}")
+                self.executor.submit(self._deliver, batch_id)
+
+    def shutdown(self):
+        # Batches ainda na fila (ou esperando nova tentativa) continuam no spool e são retomados no próximo start
+        with self._lock:
+            timers, self._timers = list(self._timers.values()), {}
+        for timer in timers:
+            timer.cancel()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+# Instância Singleton
+ingest_service = IngestService()
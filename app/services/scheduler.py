@@ -0,0 +1,290 @@
+import asyncio
+import math
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List, NamedTuple, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.core.metrics import observe_stage
+from app.services.streams import ThrottledReader
+
+
+class UserPolicy(NamedTuple):
+    concurrency: int  # batches transferindo ao mesmo tempo por usuário
+    bytes_per_s: float  # 0 = sem limite
+    weight: float  # fatia relativa na fila (fair queuing)
+
+
+class TokenBucket:
+    """
+    Limite de bytes/s compartilhado por todos os batches de um usuário.
+    consume() nunca bloqueia: devolve quantos segundos o chamador deve esperar
+    (o saldo pode ficar negativo; a dívida é paga com o tempo).
+    """
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = rate  # rajada de até 1 s
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class Ticket:
+    """
+    Pedido de um batch na fila do escalonador. Vira "granted" quando ganha vaga.
+    """
+    def __init__(self, user: str, policy: UserPolicy, cost: int, finish: float, bucket: Optional[TokenBucket]):
+        self.user = user
+        self.policy = policy
+        self.cost = cost
+        self.finish = finish  # tag de término virtual (WFQ): menor sai primeiro
+        self.bucket = bucket
+        self.granted = False
+        self.enqueued_at = time.monotonic()
+        self.granted_at: Optional[float] = None
+        self._notify: Optional[Callable[[], None]] = None
+
+    def throttle_files(self, files: List[UploadFile]) -> List[UploadFile]:
+        """
+        Arquivos com leitura limitada ao bytes/s do usuário (os mesmos, se não houver limite).
+        """
+        if self.bucket is None:
+            return files
+        return [
+            UploadFile(
+                ThrottledReader(file.file, self.bucket), filename=file.filename, size=file.size, headers=file.headers
+            )
+            for file in files
+        ]
+
+    async def throttle_async(self, amount: int):
+        # Para quem já está no event loop (/upload/stream lendo o corpo, backend asyncssh)
+        if self.bucket is not None:
+            wait = self.bucket.consume(amount)
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+
+class UploadScheduler:
+    """
+    Admissão e fila justa na frente das transferências para o SFTP.
+
+    - UPLOAD_MAX_CONCURRENT batches transferindo ao mesmo tempo no total;
+    - por usuário (com sobrescritas por papel em UPLOAD_ROLE_POLICIES): máximo de
+      batches simultâneos, bytes/s (lidos via TokenBucket) e peso na fila;
+    - fila por weighted fair queuing: cada pedido recebe a tag
+      max(V, último término do usuário) + bytes / peso e a vaga vai para a menor tag.
+      Um batch pequeno passa na frente de um lote enorme que chegou antes, e quem
+      já mandou muito espera a vez dos outros;
+    - fila cheia ou espera acima de UPLOAD_QUEUE_TIMEOUT -> 429 com Retry-After.
+
+    Funciona para threads (acquire) e para o event loop (acquire_async): quem espera
+    na rota async não ocupa thread do threadpool.
+    """
+    def __init__(self):
+        self.enabled = settings.UPLOAD_SCHEDULER_ENABLED
+        self.max_concurrent = max(1, settings.UPLOAD_MAX_CONCURRENT)
+        self.queue_timeout = settings.UPLOAD_QUEUE_TIMEOUT
+        self.max_queued_per_user = settings.UPLOAD_USER_MAX_QUEUED
+
+        self._lock = threading.Lock()
+        self._waiting: List[Ticket] = []
+        self._active: Dict[str, int] = {}  # usuário -> batches transferindo
+        self._last_finish: Dict[str, float] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._virtual_time = 0.0
+        self._running = 0
+        self._avg_hold = 1.0  # média móvel (s) de quanto um batch segura a vaga, para o Retry-After
+        self._rejected = 0
+
+    def policy_for(self, role) -> UserPolicy:
+        role = getattr(role, "value", role)
+        overrides = settings.UPLOAD_ROLE_POLICIES.get(role, {})
+        return UserPolicy(
+            concurrency=max(1, int(overrides.get("concurrency", settings.UPLOAD_USER_MAX_CONCURRENT))),
+            bytes_per_s=float(overrides.get("bytes_per_s", settings.UPLOAD_USER_BYTES_PER_S)),
+            weight=max(0.001, float(overrides.get("weight", 1))),
+        )
+
+    # ------------------------------------------------------------------
+    # Fila
+    # ------------------------------------------------------------------
+    def _retry_after(self, ahead: int) -> int:
+        # Quantas "rodadas" de vagas até chegar a vez, vezes a duração média de um batch
+        return max(1, math.ceil(self._avg_hold * (ahead + 1) / self.max_concurrent))
+
+    def _reject(self, ahead: int, reason: str) -> HTTPException:
+        self._rejected += 1
+        return HTTPException(status_code=429, detail=reason, headers={"Retry-After": str(self._retry_after(ahead))})
+
+    def _enqueue(self, user: str, role, cost: int, bounded: bool = True) -> Ticket:
+        policy = self.policy_for(role)
+        with self._lock:
+            queued = sum(1 for ticket in self._waiting if ticket.user == user)
+            if bounded and queued >= self.max_queued_per_user:
+                raise self._reject(len(self._waiting), "Muitos uploads deste usuário na fila, tente novamente.")
+
+            bucket = None
+            if policy.bytes_per_s > 0:
+                bucket = self._buckets.get(user)
+                if bucket is None or bucket.rate != policy.bytes_per_s:
+                    bucket = self._buckets[user] = TokenBucket(policy.bytes_per_s)
+
+            start = max(self._virtual_time, self._last_finish.get(user, 0.0))
+            finish = start + max(cost, 1) / policy.weight
+            self._last_finish[user] = finish
+            ticket = Ticket(user, policy, cost, finish, bucket)
+            self._waiting.append(ticket)
+            self._dispatch()
+            return ticket
+
+    def _dispatch(self):
+        """
+        Distribui vagas livres (chamado com o lock): menor tag primeiro, pulando
+        quem já está no limite de batches simultâneos do próprio usuário.
+        """
+        while self._running < self.max_concurrent:
+            eligible = [
+                ticket for ticket in self._waiting
+                if self._active.get(ticket.user, 0) < ticket.policy.concurrency
+            ]
+            if not eligible:
+                return
+            ticket = min(eligible, key=lambda t: t.finish)
+            self._waiting.remove(ticket)
+            self._running += 1
+            self._active[ticket.user] = self._active.get(ticket.user, 0) + 1
+            self._virtual_time = max(self._virtual_time, ticket.finish - max(ticket.cost, 1) / ticket.policy.weight)
+            ticket.granted = True
+            ticket.granted_at = time.monotonic()
+            if ticket._notify is not None:
+                ticket._notify()
+
+    def _withdraw(self, ticket: Ticket) -> bool:
+        """
+        Tira da fila quem desistiu. Retorna False se a vaga saiu nesse meio tempo
+        (aí o ticket vale e precisa de release).
+        """
+        with self._lock:
+            if ticket.granted:
+                return False
+            self._waiting.remove(ticket)
+            return True
+
+    def _queue_timeout(self, ticket: Ticket) -> HTTPException:
+        with self._lock:
+            ahead = sum(1 for other in self._waiting if other.finish <= ticket.finish)
+        return self._reject(ahead, "Fila de uploads cheia, tente novamente.")
+
+    def release(self, ticket: Ticket):
+        with self._lock:
+            self._running -= 1
+            active = self._active[ticket.user] - 1
+            if active:
+                self._active[ticket.user] = active
+            else:
+                del self._active[ticket.user]
+            hold = time.monotonic() - ticket.granted_at
+            self._avg_hold = 0.8 * self._avg_hold + 0.2 * hold
+            # Usuários ociosos (nada transferindo nem na fila) cujo último término já ficou
+            # para trás não precisam de estado; com ticket na fila a tag ainda vale
+            queued = {waiting.user for waiting in self._waiting}
+            for user in [u for u, finish in self._last_finish.items() if finish <= self._virtual_time]:
+                if user not in self._active and user not in queued:
+                    del self._last_finish[user]
+            self._dispatch()
+
+    # ------------------------------------------------------------------
+    # Entrada: threads e event loop
+    # ------------------------------------------------------------------
+    def acquire(self, user: str, role, cost: int, timeout: Optional[float] = None) -> Ticket:
+        """
+        Espera a vaga bloqueando a thread. timeout=None espera sem limite e sem
+        teto de fila (ingest em background, que não tem a quem devolver 429).
+        """
+        event = threading.Event()
+        ticket = self._enqueue(user, role, cost, bounded=timeout is not None)
+        with self._lock:
+            if not ticket.granted:
+                ticket._notify = event.set
+        if not ticket.granted and not event.wait(timeout) and self._withdraw(ticket):
+            raise self._queue_timeout(ticket)
+        observe_stage("scheduler_wait", ticket.granted_at - ticket.enqueued_at)
+        return ticket
+
+    async def acquire_async(self, user: str, role, cost: int) -> Ticket:
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        ticket = self._enqueue(user, role, cost)
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        with self._lock:
+            if not ticket.granted:
+                ticket._notify = notify
+        if not ticket.granted:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if self._withdraw(ticket):
+                    raise self._queue_timeout(ticket)
+            except asyncio.CancelledError:
+                # Cliente foi embora: devolve a vaga se ela chegou a sair
+                if not self._withdraw(ticket):
+                    self.release(ticket)
+                raise
+        observe_stage("scheduler_wait", ticket.granted_at - ticket.enqueued_at)
+        return ticket
+
+    @contextmanager
+    def slot(self, user: str, role, cost: int, timeout: Optional[float] = None) -> Iterator[Optional[Ticket]]:
+        if not self.enabled:
+            yield None
+            return
+        ticket = self.acquire(user, role, cost, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @asynccontextmanager
+    async def slot_async(self, user: str, role, cost: int) -> AsyncIterator[Optional[Ticket]]:
+        if not self.enabled:
+            yield None
+            return
+        ticket = await self.acquire_async(user, role, cost)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "max_concurrent": self.max_concurrent,
+                "running": self._running,
+                "queued": len(self._waiting),
+                "active_by_user": dict(self._active),
+                "queued_by_user": {
+                    user: sum(1 for ticket in self._waiting if ticket.user == user)
+                    for user in {ticket.user for ticket in self._waiting}
+                },
+                "avg_hold_s": round(self._avg_hold, 3),
+                "rejected": self._rejected,
+            }
+
+# Instância Singleton
+upload_scheduler = UploadScheduler()
@@ -1,140 +1,1102 @@
 import paramiko
+import io
 import json
 import os
 import stat
-from datetime import datetime
+import tarfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from fastapi import UploadFile, HTTPException
 from app.core.config import settings
-from typing import List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.metrics import batch_span, record_results, stage_timer
+from app.models.upload import DataType
+from app.services.archive import archive_stem, entry_path, open_archive
+from app.services.sftp_pool import (
+    PooledSession,
+    SFTPConnectionPool,
+    TransferMismatch,
+    TransferProfile,
+    backoff_delay,
+    is_transient,
+)
+from app.services.streams import (
+    ALREADY_COMPRESSED,
+    COMPRESSION_SUFFIXES,
+    CompressingReader,
+    HashingReader,
+    hash_fileobj,
+    make_compressor,
+    new_hasher,
+    parse_compression,
+)
 
-class SFTPService:
+class RemoteDirCache:
+    """
+    Diretórios remotos que já sabemos existir, por (host, caminho). Compartilhado
+    por todo o processo: batches "quentes" não gastam nenhum stat/mkdir.
+    """
     def __init__(self):
-        self.host = settings.SFTP_HOST
-        self.port = settings.SFTP_PORT
-        self.username = settings.SFTP_USERNAME
-        self.key_path = settings.SFTP_KEY_PATH
+        self._known = set()
+        self._lock = threading.Lock()
+
+    def contains(self, host: str, path: str) -> bool:
+        return (host, path) in self._known
+
+    def add(self, host: str, path: str):
+        with self._lock:
+            self._known.add((host, path))
+
+    def invalidate(self, host: str, path: str):
+        """
+        Esquece o diretório, seus filhos e seus pais (qualquer um deles pode ter sumido).
+        """
+        prefix = path.rstrip("/") + "/"
+        with self._lock:
+            self._known = {
+                (h, p) for (h, p) in self._known
+                if h != host or not (p == path or p.startswith(prefix) or prefix.startswith(p.rstrip("/") + "/"))
+            }
+
+    def clear(self):
+        with self._lock:
+            self._known.clear()
+
+remote_dir_cache = RemoteDirCache()
+
+
+class SFTPService:
+    def __init__(self, destination: Optional[dict] = None):
+        # Um item de SFTP_DESTINATIONS; o que faltar vem das variáveis SFTP_*
+        destination = destination or {}
+        self.host = destination.get("host", settings.SFTP_HOST)
+        self.port = int(destination.get("port", settings.SFTP_PORT))
+        self.username = destination.get("username", settings.SFTP_USERNAME)
+        self.key_path = destination.get("key_path", settings.SFTP_KEY_PATH)
         # Remove barra final para evitar caminhos duplicados (//)
-        self.base_remote_dir = settings.SFTP_REMOTE_PATH.rstrip("/")
-
-    def _create_connection(self):
-        try:
-            client = paramiko.SSHClient()
-            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            # Carrega a chave explicitamente para evitar erros de formato
-            pkey = paramiko.RSAKey.from_private_key_file(self.key_path)
-            
-            client.connect(
-                hostname=self.host,
-                port=self.port,
-                username=self.username,
-                pkey=pkey, # Passando o objeto da chave
-                look_for_keys=False,
-                timeout=20
-            )
-            return client
-        except Exception as e:
-            print(f"Erro ao conectar no SFTP ({self.host}): {e}")
-            raise HTTPException(status_code=503, detail=f"Falha na conexão SFTP: {str(e)}")
+        self.base_remote_dir = destination.get("remote_path", settings.SFTP_REMOTE_PATH).rstrip("/")
+        # Nome gravado em upload_logs.sftp_host (identifica o destino nas buscas/exportações)
+        self.name = destination.get("name") or self.host
+
+        self.hash_algorithm = settings.UPLOAD_HASH_ALGORITHM
+        self.verify_mode = settings.SFTP_VERIFY_MODE
+        self.verify_hash_algorithm = settings.SFTP_VERIFY_HASH_ALGORITHM
+        self._check_file_supported = True
+
+        # "sidecar": um <arquivo>.json por arquivo; "manifest": um .jsonl por batch
+        self.metadata_mode = settings.SFTP_METADATA_MODE
+
+        # Política de compressão por DataType: {"dados_relogios": ("gzip", 6), ...}
+        self.compression = self.parse_compression_policy()
+
+        # Quantos canais SFTP simultâneos um único batch pode usar
+        self.transfer_concurrency = max(1, settings.SFTP_TRANSFER_CONCURRENCY)
+
+        # Retentativa em erro transitório (ver _retry)
+        self.retry_attempts = max(1, settings.SFTP_RETRY_ATTEMPTS)
+        self.retry_backoff = settings.SFTP_RETRY_BACKOFF
+        self.retry_backoff_max = settings.SFTP_RETRY_BACKOFF_MAX
+
+        # Sessões SSH/SFTP reaproveitadas (evita handshake + leitura da chave a cada batch)
+        self.pool = SFTPConnectionPool(
+            host=self.host,
+            port=self.port,
+            username=self.username,
+            key_path=self.key_path,
+            max_size=settings.SFTP_POOL_SIZE,
+            acquire_timeout=settings.SFTP_POOL_ACQUIRE_TIMEOUT,
+            connect_timeout=settings.SFTP_CONNECT_TIMEOUT,
+            keepalive_interval=settings.SFTP_KEEPALIVE_INTERVAL,
+            max_idle=settings.SFTP_POOL_MAX_IDLE,
+            max_lifetime=settings.SFTP_POOL_MAX_LIFETIME,
+            healthcheck_after=settings.SFTP_POOL_HEALTHCHECK_AFTER,
+            profile=TransferProfile(
+                window_size=settings.SFTP_WINDOW_SIZE,
+                max_packet_size=settings.SFTP_MAX_PACKET_SIZE,
+                write_chunk=settings.SFTP_WRITE_CHUNK,
+                compression=settings.SFTP_SSH_COMPRESSION,
+                ciphers=settings.SFTP_PREFERRED_CIPHERS,
+            ),
+            auto_tune=settings.SFTP_AUTO_TUNE,
+            link_mbps=settings.SFTP_LINK_MBPS,
+        )
+
+    @staticmethod
+    def parse_compression_policy() -> dict:
+        policy = {}
+        for data_type, spec in settings.SFTP_COMPRESSION.items():
+            parsed = parse_compression(spec)
+            if parsed:
+                policy[data_type] = parsed
+        return policy
+
+    def _retry(
+        self,
+        session: PooledSession,
+        call: Callable[[paramiko.SFTPClient, int], Any],
+        what: str,
+        attempts: Optional[int] = None,
+        errors: Optional[List[str]] = None
+    ) -> Any:
+        """
+        Executa call(sftp, tentativa) até `attempts` vezes (padrão SFTP_RETRY_ATTEMPTS).
+        Em erro transitório espera o backoff e recupera a sessão (pool.revive: reabre
+        o canal ou reconecta) antes de repetir; erro permanente sobe na hora.
+        O erro de cada tentativa que falhou é anotado em `errors`.
+        """
+        attempts = attempts or self.retry_attempts
+        for attempt in range(1, attempts + 1):
+            try:
+                if attempt > 1:
+                    self.pool.revive(session)
+                return call(session.sftp, attempt)
+            except Exception as e:
+                error = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+                if errors is not None:
+                    errors.append(error)
+                if attempt == attempts or not is_transient(e):
+                    raise
+                delay = backoff_delay(attempt, self.retry_backoff, self.retry_backoff_max)
+                print(f"Erro transitório em {what} ({self.name}), tentativa {attempt}/{attempts}; "
+                      f"repetindo em {delay:.2f}s: {error}")
+                with stage_timer("retry_backoff"):
+                    time.sleep(delay)
 
     def _ensure_directories(self, sftp, remote_path: str):
         """
         Cria diretórios recursivamente no servidor remoto se não existirem.
+        Diretórios que já sabemos existir (cache do processo) não custam round trip.
         """
-        dirs = remote_path.split("/")
-        current_path = ""
-        
-        for dir_name in dirs:
-            if not dir_name: continue # Pula strings vazias causadas por //
-            
-            current_path += f"/{dir_name}"
-            
-            try:
-                sftp.stat(current_path)
-            except IOError:
+        if remote_dir_cache.contains(self.name, remote_path):
+            return
+
+        with stage_timer("mkdir"):
+            dirs = remote_path.split("/")
+            current_path = ""
+
+            for dir_name in dirs:
+                if not dir_name: continue # Pula strings vazias causadas por //
+
+                current_path += f"/{dir_name}"
+
+                if remote_dir_cache.contains(self.name, current_path):
+                    continue
+
                 try:
-                    sftp.mkdir(current_path)
-                    print(f"Diretório criado: {current_path}")
-                except Exception as e:
-                    # Se falhar ao criar, pode ser que outro processo criou ao mesmo tempo
-                    print(f"Aviso ao criar diretório {current_path}: {e}")
+                    sftp.stat(current_path)
+                    remote_dir_cache.add(self.name, current_path)
+                except IOError:
+                    try:
+                        sftp.mkdir(current_path)
+                        remote_dir_cache.add(self.name, current_path)
+                        print(f"Diretório criado: {current_path}")
+                    except Exception as e:
+                        # Se falhar ao criar, pode ser que outro processo criou ao mesmo tempo
+                        print(f"Aviso ao criar diretório {current_path}: {e}")
 
-    def upload_batch(self, files: List[UploadFile], data_type: str, metadata_base: dict) -> List[dict]:
-        ssh = None
-        sftp = None
-        results = []
-
-        try:
-            ssh = self._create_connection()
-            sftp = ssh.open_sftp()
-            
-            # Define caminho base: /remote/path/tipo/ano/mes
-            date_folder = datetime.now().strftime("%Y/%m")
-            # Garante que não temos barras duplas
-            target_dir = f"{self.base_remote_dir}/{data_type}/{date_folder}".replace("//", "/")
-            
-            # Cria a estrutura de pastas uma única vez
-            self._ensure_directories(sftp, target_dir)
-
-            for file in files:
+    def _target_dir(self, data_type: str, when: Optional[datetime] = None) -> str:
+        # Define caminho base: /remote/path/tipo/ano/mes
+        date_folder = (when or datetime.now()).strftime("%Y/%m")
+        # Garante que não temos barras duplas
+        return f"{self.base_remote_dir}/{data_type}/{date_folder}".replace("//", "/")
+
+    def _open_remote(self, sftp, remote_dir: str, open_fn: Callable):
+        """
+        Executa uma escrita remota; se o diretório sumiu (cache desatualizado),
+        invalida o cache, recria a árvore e tenta mais uma vez.
+        """
+        try:
+            return open_fn()
+        except FileNotFoundError:
+            print(f"Diretório remoto ausente, recriando: {remote_dir}")
+            remote_dir_cache.invalidate(self.name, remote_dir)
+            self._ensure_directories(sftp, remote_dir)
+            return open_fn()
+
+    def precreate_directories(self):
+        """
+        Cria de antemão as pastas do mês atual e do próximo para cada DataType,
+        para a virada do mês não custar mkdir no meio de um batch.
+        """
+        now = datetime.now()
+        next_month = (now.replace(day=1) + timedelta(days=32)).replace(day=1)
+        try:
+            with self.pool.session() as session:
+                for data_type in DataType:
+                    for when in (now, next_month):
+                        self._ensure_directories(session.sftp, self._target_dir(data_type.value, when))
+        except Exception as e:
+            print(f"Aviso ao pré-criar diretórios no SFTP: {e}")
+
+    @staticmethod
+    def _safe_filename(filename: str) -> str:
+        # Higieniza o nome do arquivo
+        return filename.replace(" ", "_").replace("/", "_")
+
+    @staticmethod
+    def _write_metadata(sftp, full_path_meta: str, meta: dict):
+        # Escreve JSON direto no pipe
+        meta_json = json.dumps(meta, indent=4, default=str)
+        sftp.putfo(io.BytesIO(meta_json.encode('utf-8')), full_path_meta)
+
+    def _store_metadata(self, sftp, full_path_file: str, meta: dict, result: dict):
+        """
+        Modo sidecar: grava <arquivo>.json agora. Modo manifest: guarda os metadados
+        no resultado para entrarem no manifesto do batch (_write_manifest).
+        """
+        if self.metadata_mode == "manifest":
+            meta["sftp_path"] = full_path_file
+            result["metadata"] = meta
+        else:
+            self._write_metadata(sftp, f"{full_path_file}.json", meta)
+
+    def _write_manifest(self, session: PooledSession, target_dir: str, metadata_base: dict, results: List[dict]):
+        """
+        Grava, numa única criação remota, o manifesto JSON Lines do batch
+        (<target_dir>/<batch_id>.manifest.jsonl, uma linha compacta por arquivo enviado).
+        Se falhar (já com as retentativas), os arquivos do batch ficam como falha,
+        como aconteceria com o sidecar.
+        """
+        entries = [result.pop("metadata") for result in results if "metadata" in result]
+        if not entries:
+            return
+
+        batch_id = metadata_base.get("batch_id") or datetime.now().strftime("%Y%m%d%H%M%S%f")
+        manifest_path = f"{target_dir}/{batch_id}.manifest.jsonl"
+        body = "".join(json.dumps(entry, separators=(",", ":"), default=str) + "\n" for entry in entries)
+        try:
+            with stage_timer("metadata_write"):
+                self._retry(session, lambda sftp, _: self._open_remote(
+                    sftp, target_dir, lambda: sftp.putfo(io.BytesIO(body.encode("utf-8")), manifest_path)
+                ), "manifesto")
+        except Exception as e:
+            print(f"FALHA ao gravar manifesto {manifest_path}: {e}")
+            for result in results:
+                if result["status"] == "uploaded":
+                    result.update(status="failed", sftp_path="", error=f"Falha ao gravar manifesto: {e}")
+
+    def _put_stream(
+        self, sftp, fileobj, remote_path: str, offset: int = 0, on_open: Optional[Callable[[], None]] = None
+    ):
+        """
+        Equivalente ao putfo(confirm=False), mas lendo em blocos de write_chunk do perfil
+        (putfo lê de 32 KB em 32 KB). Com pipelining cada bloco vira vários pedidos
+        de escrita em voo, sem esperar a resposta de cada um: em link com latência
+        alta é isso que mantém o canal cheio.
+        Com `offset` (retomada) os primeiros bytes são lidos do fileobj, para os hashes
+        ficarem completos, mas não são reenviados: a escrita continua dali no remoto.
+        `on_open` é chamado assim que o arquivo remoto está aberto (já truncado, se offset=0).
+        """
+        chunk_size = self.pool.profile.write_chunk
+        skip = offset
+        while skip:
+            data = fileobj.read(min(chunk_size, skip))
+            if not data:
+                break
+            skip -= len(data)
+        with sftp.open(remote_path, "r+b" if offset else "wb") as remote_file:
+            if offset:
+                remote_file.seek(offset - skip)
+            if on_open is not None:
+                on_open()
+            remote_file.set_pipelined(True)
+            while True:
+                data = fileobj.read(chunk_size)
+                if not data:
+                    break
+                remote_file.write(data)
+
+    def _upload_file(
+        self,
+        session: PooledSession,
+        file: UploadFile,
+        target_dir: str,
+        metadata_base: dict,
+        compression: Optional[Tuple[str, int]] = None
+    ) -> dict:
+        """
+        Envia um arquivo (e seus metadados, ver _store_metadata). Falhas ficam isoladas no próprio arquivo.
+        Com `compression` = (codec, nível), o conteúdo é comprimido no caminho até o putfo.
+        Erro transitório (ver _retry) não derruba o arquivo: a nova tentativa retoma a
+        escrita do tamanho que já chegou ao servidor. O resultado leva "attempts" e
+        "last_error" (último erro, mesmo que recuperado).
+        """
+        errors: List[str] = []
+        try:
+            safe_filename = self._safe_filename(file.filename)
+            if compression and safe_filename.lower().endswith(ALREADY_COMPRESSED):
+                compression = None
+            if compression:
+                safe_filename += COMPRESSION_SUFFIXES[compression[0]]
+            full_path_file = f"{target_dir}/{safe_filename}"
+
+            print(f"Iniciando upload (stream): {safe_filename} -> {full_path_file}")
+
+            # Só retoma o que esta chamada já escreveu: antes do primeiro open("wb")
+            # o remoto pode ser um arquivo antigo com o mesmo nome
+            written = []
+            resumed = []  # a tentativa que deu certo retomou de offset > 0 (conferida depois, ver abaixo)
+            no_resume = []  # reenvio completo: não retoma mais
+
+            def put_from(sftp, wire, offset: int):
                 try:
-                    # Higieniza o nome do arquivo
-                    safe_filename = file.filename.replace(" ", "_").replace("/", "_")
-                    full_path_file = f"{target_dir}/{safe_filename}"
-                    full_path_meta = f"{full_path_file}.json"
-
-                    print(f"Iniciando upload (stream): {safe_filename} -> {full_path_file}")
-                    
-                    # --- CORREÇÃO DE PERFORMANCE (STREAMING) ---
-                    # Reset o ponteiro do arquivo para garantir leitura do início
+                    self._put_stream(sftp, wire, full_path_file, offset, on_open=lambda: written.append(True))
+                except Exception:
+                    if session.is_active():
+                        # Conexão de pé = o servidor recusou uma escrita; com pipelining as
+                        # seguintes podem ter entrado e deixado um buraco: recomeça do zero.
+                        written.clear()
+                    raise
+
+            def put(sftp, attempt: int):
+                offset = 0
+                if written and not no_resume:
+                    offset = self._remote_size(sftp, full_path_file)
+                    print(f"Retomando {safe_filename} a partir de {offset} bytes (tentativa {attempt})")
+                resumed[:] = [True] if offset else []
+
+                # --- CORREÇÃO DE PERFORMANCE (STREAMING) ---
+                # Reset o ponteiro do arquivo para garantir leitura do início
+                # (só se necessário: membros de tar em stream não aceitam seek)
+                if file.file.tell():
                     file.file.seek(0)
-                    
-                    # Usa putfo diretamente com o file-like object do FastAPI/SpooledTemporaryFile
-                    # Isso evita carregar o arquivo na RAM. O Paramiko lê em chunks.
-                    sftp.putfo(file.file, full_path_file)
-                    
-                    # Pega o tamanho real após upload (ou usa file.size se disponível)
-                    file_size = file.size if hasattr(file, 'size') else 0
-
-                    # Upload de Metadados (JSON leve, pode ir para RAM)
-                    meta = metadata_base.copy()
-                    meta["filename"] = safe_filename
-                    meta["uploaded_at"] = datetime.now().isoformat()
-                    meta["size_bytes"] = file_size
-                    
-                    # Escreve JSON direto no pipe
-                    import io
-                    meta_json = json.dumps(meta, indent=4, default=str)
-                    sftp.putfo(io.BytesIO(meta_json.encode('utf-8')), full_path_meta)
-
-                    results.append({
-                        "filename": safe_filename,
-                        "sftp_path": full_path_file,
-                        "status": "uploaded",
-                        "error": None,
-                        "size": file_size
-                    })
-                
-                except Exception as e:
-                    print(f"FALHA no arquivo {file.filename}: {e}")
-                    results.append({
-                        "filename": file.filename,
-                        "sftp_path": "",
-                        "status": "failed",
-                        "error": str(e),
-                        "size": 0
-                    })
-            
+
+                # Stream do file-like object do FastAPI/SpooledTemporaryFile
+                # Isso evita carregar o arquivo na RAM. Lemos em chunks
+                # e o hash é calculado nessa mesma leitura.
+                original = HashingReader(file.file, self.hash_algorithm)
+                if compression:
+                    # origem -> hash do original -> compressão -> hash do que vai pelo fio
+                    # (compressão determinística: a retomada gera os mesmos bytes)
+                    wire = HashingReader(CompressingReader(original, *compression), self.verify_hash_algorithm)
+                else:
+                    extra = set(self._extra_hash_algorithms())
+                    if offset:
+                        # Retomada é sempre conferida pelo hash (ver abaixo)
+                        extra.add(self.verify_hash_algorithm)
+                    original.hashers.update({a: new_hasher(a) for a in extra if a not in original.hashers})
+                    wire = original
+                # Conferência do tamanho fica com _verify_remote (um único stat)
+                put_from(sftp, wire, offset)
+                return original, wire
+
+            def send() -> Tuple[HashingReader, HashingReader]:
+                with stage_timer("putfo"):
+                    return self._retry(
+                        session,
+                        lambda sftp, attempt: self._open_remote(sftp, target_dir, lambda: put(sftp, attempt)),
+                        safe_filename,
+                        attempts,
+                        errors
+                    )
+
+            # Retomar exige reler a origem do início: membro de tar em stream tem uma tentativa só
+            attempts = None if self._rewindable(file.file) else 1
+            original, wire = send()
+
+            # A retomada parte do stat().st_size, mas uma escrita pipelined perdida antes da
+            # queda pode deixar um buraco com o tamanho certo. Retomou: confere o hash no
+            # servidor (check-file); sem check-file ou divergindo, reenvia do zero, sem retomar.
+            verification = None
+            if resumed:
+                local_digest = wire.hexdigest(self.verify_hash_algorithm)
+                with stage_timer("verify"):
+                    remote_digest = self._retry(
+                        session,
+                        lambda sftp, _: self._remote_digest(sftp, full_path_file, self.verify_hash_algorithm),
+                        safe_filename,
+                        errors=errors
+                    )
+                if remote_digest == local_digest:
+                    verification = "checksum"
+                else:
+                    print(f"Retomada de {safe_filename} não confirmada pelo servidor; reenviando do zero")
+                    no_resume.append(True)
+                    original, wire = send()
+
+            file_size = original.bytes_read
+            content_hash = original.hexdigest()
+
+            if file.size is not None and file.size != file_size:
+                raise TransferMismatch(f"Lidos {file_size} bytes, esperado {file.size}")
+
+            verify_digest = None
+            if self.verify_hash_algorithm in wire.hashers:
+                verify_digest = wire.hexdigest(self.verify_hash_algorithm)
+            if verification is None:
+                with stage_timer("verify"):
+                    verification = self._retry(
+                        session,
+                        lambda sftp, _: self._verify_remote(sftp, full_path_file, wire.bytes_read, verify_digest),
+                        safe_filename,
+                        errors=errors
+                    )
+
+            # Metadados (JSON leve, pode ir para RAM)
+            meta = metadata_base.copy()
+            meta["filename"] = safe_filename
+            meta["uploaded_at"] = datetime.now().isoformat()
+            meta["size_bytes"] = file_size
+            meta["hash_algorithm"] = self.hash_algorithm
+            meta["content_hash"] = content_hash
+            meta["verification"] = verification
+            if compression:
+                meta["original_filename"] = file.filename
+                meta["compression"] = compression[0]
+                meta["compression_level"] = compression[1]
+                meta["original_size"] = file_size
+                meta["compressed_size"] = wire.bytes_read
+
+            result = self._uploaded_result(
+                safe_filename,
+                full_path_file,
+                file_size,
+                wire.bytes_read if compression else None,
+                content_hash,
+                verification
+            )
+            with stage_timer("metadata_write"):
+                self._retry(
+                    session,
+                    lambda sftp, _: self._store_metadata(sftp, full_path_file, meta, result),
+                    safe_filename,
+                    errors=errors
+                )
+            # Só agora: a escrita do metadado também pode ter precisado de retry
+            result.update(attempts=len(errors) + 1, last_error=errors[-1] if errors else None)
+            return result
+
+        except Exception as e:
+            print(f"FALHA no arquivo {file.filename}: {e}")
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            return self._failed_result(file.filename, error, attempts=max(1, len(errors)))
+
+    @staticmethod
+    def _rewindable(fileobj) -> bool:
+        try:
+            return fileobj.seekable()
+        except (AttributeError, ValueError):
+            # Membro de tar em stream: o _Stream por baixo nem tem seekable()
+            return False
+
+    @staticmethod
+    def _remote_size(sftp, remote_path: str) -> int:
+        try:
+            return sftp.stat(remote_path).st_size
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _uploaded_result(filename: str, sftp_path: str, size: int, compressed_size: Optional[int],
+                         content_hash: Optional[str], verification: Optional[str]) -> dict:
+        return {
+            "filename": filename,
+            "sftp_path": sftp_path,
+            "status": "uploaded",
+            "error": None,
+            "size": size,
+            "compressed_size": compressed_size,
+            "content_hash": content_hash,
+            "verification": verification,
+            "attempts": 1,
+            "last_error": None
+        }
+
+    @staticmethod
+    def _failed_result(filename: str, error: str, attempts: int = 1) -> dict:
+        return {
+            "filename": filename,
+            "sftp_path": "",
+            "status": "failed",
+            "error": error,
+            "size": 0,
+            "compressed_size": None,
+            "content_hash": None,
+            "verification": None,
+            "attempts": attempts,
+            "last_error": error
+        }
+
+    def _extra_hash_algorithms(self) -> Tuple[str, ...]:
+        if self.verify_mode == "checksum" and self._check_file_supported:
+            return (self.verify_hash_algorithm,)
+        return ()
+
+    def _verify_remote(self, sftp, remote_path: str, size: int, local_digest: Optional[str]) -> Optional[str]:
+        """
+        Confere o que chegou no servidor sem reler o arquivo local: tamanho via stat e,
+        no modo "checksum", o hash calculado pelo próprio servidor (extensão check-file).
+        Retorna o nível de verificação aplicado ou levanta TransferMismatch se divergir.
+        """
+        if self.verify_mode == "off":
+            return None
+
+        remote_size = sftp.stat(remote_path).st_size
+        if remote_size != size:
+            raise TransferMismatch(f"Tamanho remoto ({remote_size}) difere do enviado ({size})")
+
+        if self.verify_mode != "checksum" or local_digest is None:
+            return "size"
+
+        remote_digest = self._remote_digest(sftp, remote_path, self.verify_hash_algorithm)
+        if remote_digest is None:
+            return "size"
+        if remote_digest != local_digest:
+            raise TransferMismatch(f"Checksum remoto ({self.verify_hash_algorithm}) difere do local")
+        return "checksum"
+
+    def _remote_digest(self, sftp, remote_path: str, algorithm: str) -> Optional[str]:
+        """
+        Hash calculado pelo próprio servidor (extensão check-file), sem trafegar o arquivo.
+        None se o servidor não oferece a extensão (ou o algoritmo).
+        """
+        if not self._check_file_supported:
+            return None
+        try:
+            with sftp.open(remote_path, "rb") as remote_file:
+                return remote_file.check(algorithm, 0, 0, 0).hex()
+        except IOError as e:
+            if "unsupported" in str(e).lower():
+                # Servidor sem check-file: não tenta mais neste processo
+                print(f"Servidor SFTP sem suporte a check-file; verificação só por tamanho: {e}")
+                self._check_file_supported = False
+            return None
+
+    def _run_workers(
+        self,
+        session,
+        files: List[UploadFile],
+        target_dir: str,
+        metadata_base: dict,
+        compression: Optional[Tuple[str, int]] = None
+    ) -> List[dict]:
+        return self._fan_out(
+            session,
+            len(files),
+            lambda current_session, idx: self._upload_file(
+                current_session, files[idx], target_dir, metadata_base, compression
+            ),
+            lambda idx: files[idx].filename
+        )
+
+    def _fan_out(
+        self,
+        session,
+        count: int,
+        work: Callable[[PooledSession, int], dict],
+        name_of: Callable[[int], str]
+    ) -> List[dict]:
+        """
+        Distribui `count` itens entre vários canais SFTP em paralelo (um por sessão do pool).
+        A thread chamadora usa a sessão que já tem; as extras só entram se houver sessão
+        livre no pool na hora (timeout=0), então nunca ficamos esperando segurando outra sessão.
+        `work(sessão, idx)` envia um item e devolve seu resultado (recebe a sessão, e não
+        só o canal, para poder recuperá-la em erro transitório).
+        """
+        results: List[Optional[dict]] = [None] * count
+        pending = iter(range(count))
+        lock = threading.Lock()
+
+        def next_index() -> Optional[int]:
+            with lock:
+                return next(pending, None)
+
+        def drain(current_session):
+            # Para de pegar trabalho se o transporte morreu (e as retentativas não o
+            # recuperaram); outro canal assume o resto
+            while current_session.is_active():
+                idx = next_index()
+                if idx is None:
+                    return
+                results[idx] = work(current_session, idx)
+
+        def extra_worker():
+            try:
+                with self.pool.session(timeout=0) as extra_session:
+                    drain(extra_session)
+            except HTTPException:
+                # Pool cheio ou falha ao conectar: os outros canais dão conta
+                pass
+
+        lost = "Conexão SFTP perdida durante o batch"
+        extra_channels = min(self.transfer_concurrency, count) - 1
+        try:
+            if extra_channels > 0:
+                with ThreadPoolExecutor(max_workers=extra_channels) as executor:
+                    futures = [executor.submit(extra_worker) for _ in range(extra_channels)]
+                    drain(session)
+                    for future in futures:
+                        future.result()
+            else:
+                drain(session)
+        except Exception as e:
+            if all(result is None for result in results):
+                raise
+            # Parte dos itens já foi enviada: o resto vira falha por item, sem perder os entregues
+            print(f"Batch interrompido após {count - results.count(None)} de {count} itens: {e}")
+            lost = f"{lost}: {e}"
+
+        # Itens que sobraram porque todas as conexões caíram
+        return [
+            result if result is not None else self._failed_result(name_of(idx), lost)
+            for idx, result in enumerate(results)
+        ]
+
+    def _batch_failed(self, e: Exception, results: List[dict]) -> List[dict]:
+        """
+        Erro que escapou de um batch depois de o trabalho começar.
+        Se algum arquivo já chegou ao servidor, devolve os resultados por arquivo (os que
+        não foram entregues já estão como falha) em vez de 503: o roteador reenviaria o
+        batch inteiro ao próximo destino e duplicaria o que já foi gravado.
+        Sem nada entregue: 503 se transitório (o roteador tenta outro destino), senão 500.
+        """
+        if any(result["status"] == "uploaded" for result in results):
+            for result in results:
+                # Manifesto não chegou a ser gravado: o arquivo fica sem metadados, igual a falha do sidecar
+                if result.pop("metadata", None) is not None and result["status"] == "uploaded":
+                    error = f"Manifesto não gravado: {e}"
+                    result.update(status="failed", sftp_path="", error=error, last_error=error)
             return results
+        if is_transient(e):
+            raise HTTPException(status_code=503, detail=f"Conexão SFTP perdida: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    def upload_batch(self, files: List[UploadFile], data_type: str, metadata_base: dict) -> List[dict]:
+        results: List[dict] = []
+        try:
+            # Pega uma sessão já autenticada do pool (devolvida ao final do batch)
+            with batch_span("sftp.upload_batch", data_type=data_type, files=len(files)), \
+                    self.pool.session() as session:
+                target_dir = self._target_dir(data_type)
+
+                # Cria a estrutura de pastas uma única vez
+                self._ensure_directories(session.sftp, target_dir)
+
+                compression = self.compression.get(data_type)
+                results = self._run_workers(session, files, target_dir, metadata_base, compression)
+                self._write_manifest(session, target_dir, metadata_base, results)
+            record_results(data_type, results)
+            return results
+
+        except HTTPException:
+            # Falha de conexão/pool esgotado já vem com o status correto (503)
+            raise
 
         except Exception as e:
             print(f"Erro Crítico no Batch: {e}")
-            # Não paramos a API, mas retornamos erro para o controller tratar
-            raise HTTPException(status_code=500, detail=str(e))
-        
+            # Conexão caiu fora das retentativas por arquivo: 503 só se nada foi gravado
+            # (o roteador tenta outro destino); senão o resultado por arquivo
+            results = self._batch_failed(e, results)
+            record_results(data_type, results)
+            return results
+
+    # ------------------------------------------------------------------
+    # Pacotes (zip/tar): cada entrada vira um arquivo na subárvore remota
+    # ------------------------------------------------------------------
+    def upload_archive(self, archive: UploadFile, data_type: str, metadata_base: dict) -> List[dict]:
+        """
+        Extrai um zip ou tar(.gz) em streaming direto para o SFTP, sem descompactar em disco:
+        /remote/tipo/ano/mes/<nome do pacote>/<caminho da entrada>.
+        Zip: entradas lidas em paralelo (acesso aleatório), uma por canal SFTP.
+        Tar: lido uma única vez, em ordem, no canal da requisição.
+        Retorna um resultado por entrada, no mesmo formato de upload_batch.
+        """
+        try:
+            kind, opened = open_archive(archive.file)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{archive.filename}: {e}")
+
+        results: List[dict] = []
+        try:
+            with opened, batch_span("sftp.upload_archive", data_type=data_type), self.pool.session() as session:
+                root_dir = f"{self._target_dir(data_type)}/{archive_stem(archive.filename)}"
+                self._ensure_directories(session.sftp, root_dir)
+                compression = self.compression.get(data_type)
+
+                def send(current_session, fileobj, name: str, size: int, original_name: str) -> dict:
+                    subdir, filename = entry_path(name)
+                    entry_dir = f"{root_dir}/{subdir}" if subdir else root_dir
+                    self._ensure_directories(current_session.sftp, entry_dir)
+                    meta = metadata_base.copy()
+                    meta["archive"] = archive.filename
+                    meta["archive_entry"] = original_name
+                    return self._upload_file(
+                        current_session, UploadFile(fileobj, filename=filename, size=size), entry_dir, meta, compression
+                    )
+
+                if kind == "zip":
+                    entries = [
+                        info for info in opened.infolist()
+                        if not info.is_dir() and entry_path(info.filename)
+                    ]
+
+                    def work(current_session, idx: int) -> dict:
+                        info = entries[idx]
+                        try:
+                            # ZipFile aceita vários membros abertos ao mesmo tempo (um por thread)
+                            with opened.open(info) as fileobj:
+                                return send(current_session, fileobj, info.filename, info.file_size, info.filename)
+                        except Exception as e:
+                            print(f"FALHA na entrada {info.filename}: {e}")
+                            return self._failed_result(info.filename, str(e))
+
+                    results = self._fan_out(session, len(entries), work, lambda idx: entries[idx].filename)
+                    self._write_manifest(session, root_dir, metadata_base, results)
+                    record_results(data_type, results)
+                    return results
+
+                try:
+                    for member in opened:
+                        if not member.isfile() or not entry_path(member.name):
+                            continue
+                        # Cada membro só pode ser lido antes de avançar para o próximo
+                        fileobj = opened.extractfile(member)
+                        results.append(send(session, fileobj, member.name, member.size, member.name))
+                except (tarfile.TarError, EOFError, OSError) as e:
+                    # Pacote truncado/corrompido: o que já foi entregue continua valendo
+                    print(f"Pacote {archive.filename} interrompido: {e}")
+                    results.append(self._failed_result(archive.filename, f"Pacote corrompido: {e}"))
+                self._write_manifest(session, root_dir, metadata_base, results)
+                record_results(data_type, results)
+                return results
+
+        except HTTPException:
+            raise
+
+        except Exception as e:
+            print(f"Erro Crítico no pacote {archive.filename}: {e}")
+            results = self._batch_failed(e, results)
+            record_results(data_type, results)
+            return results
+
+    # ------------------------------------------------------------------
+    # Upload resumível (sessão criada via API, chunks gravados por offset)
+    # ------------------------------------------------------------------
+    def create_remote_file(self, data_type: str, filename: str, session_id: str) -> Tuple[str, str]:
+        """
+        Cria o arquivo temporário vazio de uma sessão resumível.
+        Retorna (caminho do .part, caminho final).
+        """
+        with self.pool.session() as session:
+            target_dir = self._target_dir(data_type)
+            self._ensure_directories(session.sftp, target_dir)
+
+            final_path = f"{target_dir}/{self._safe_filename(filename)}"
+            part_path = f"{final_path}.{session_id}.part"
+            self._open_remote(session.sftp, target_dir, lambda: session.sftp.open(part_path, "wb")).close()
+            return part_path, final_path
+
+    def open_chunk_writer(self, remote_path: str, offset: int) -> "RemoteChunkWriter":
+        return RemoteChunkWriter(self.pool, remote_path, offset)
+
+    def finalize_remote_file(
+        self, part_path: str, final_path: str, size: int, metadata: dict, digests: Optional[Dict[str, str]] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Fecha uma sessão resumível: descarta bytes além do offset confirmado,
+        confere o tamanho (e, no modo "checksum", o hash), move o .part para o nome
+        final e grava o .json.
+        `digests` = {algoritmo: hash} acumulados chunk a chunk pela API; sem eles o
+        content_hash vem do check-file do servidor, se houver. O arquivo nunca é relido.
+        Idempotente: se um finalize anterior já renomeou o .part (e caiu antes do log),
+        confere o arquivo final e segue.
+        Retorna (content_hash ou None, verificação aplicada).
+        """
+        digests = digests or {}
+        with self.pool.session() as session:
+            sftp = session.sftp
+            path = part_path
+            try:
+                remote_size = sftp.stat(part_path).st_size
+            except FileNotFoundError:
+                path = final_path
+                remote_size = sftp.stat(final_path).st_size
+            if remote_size > size and path == part_path:
+                # Um chunk interrompido deixou bytes além do offset confirmado
+                sftp.truncate(part_path, size)
+                remote_size = sftp.stat(part_path).st_size
+            if remote_size != size:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Tamanho remoto ({remote_size}) difere do confirmado ({size})."
+                )
+
+            with stage_timer("verify"):
+                try:
+                    verification = self._verify_remote(sftp, path, size, digests.get(self.verify_hash_algorithm))
+                except TransferMismatch as e:
+                    raise HTTPException(status_code=409, detail=str(e))
+                content_hash = digests.get(self.hash_algorithm) or self._remote_digest(sftp, path, self.hash_algorithm)
+            metadata = dict(
+                metadata, hash_algorithm=self.hash_algorithm, content_hash=content_hash, verification=verification
+            )
+
+            if path == part_path:
+                try:
+                    sftp.posix_rename(part_path, final_path)
+                except IOError:
+                    # Servidor sem a extensão posix-rename: rename comum não sobrescreve
+                    try:
+                        sftp.remove(final_path)
+                    except IOError:
+                        pass
+                    sftp.rename(part_path, final_path)
+
+            if self.metadata_mode == "manifest":
+                entry = dict(metadata, sftp_path=final_path)
+                self._write_manifest(session, final_path.rsplit("/", 1)[0], metadata, [{"status": "uploaded", "metadata": entry}])
+            else:
+                with stage_timer("metadata_write"):
+                    self._write_metadata(sftp, f"{final_path}.json", metadata)
+            record_results(metadata.get("data_type", ""), [{"status": "uploaded", "size": size}])
+            return content_hash, verification
+
+    def hash_remote_file(self, remote_path: str) -> str:
+        """
+        Hash (UPLOAD_HASH_ALGORITHM) relendo o arquivo remoto inteiro. Caro em arquivos
+        grandes: só para rodar em background (finalize sem hash acumulado nem check-file).
+        """
+        with self.pool.session() as session, session.sftp.open(remote_path, "rb") as remote_file:
+            remote_file.prefetch()
+            return hash_fileobj(remote_file, self.hash_algorithm)
+
+    def remove_remote_file(self, remote_path: str):
+        with self.pool.session() as session:
+            try:
+                session.sftp.remove(remote_path)
+            except IOError:
+                pass
+
+    def open_batch_writer(self, data_type: str, metadata_base: dict) -> "RemoteBatchWriter":
+        return RemoteBatchWriter(self, data_type, metadata_base)
+
+    def close(self):
+        self.pool.close_all()
+
+
+class RemoteChunkWriter:
+    """
+    Escreve um chunk direto no arquivo remoto a partir de um offset.
+    Segura uma sessão do pool até close()/abort().
+    """
+    def __init__(self, pool: SFTPConnectionPool, remote_path: str, offset: int):
+        self.pool = pool
+        self.session = pool.acquire()
+        self.written = 0
+        try:
+            # r+b: escreve sem truncar o que já foi confirmado
+            self.handle = self.session.sftp.open(remote_path, "r+b")
+            self.handle.seek(offset)
+            # Não espera o ACK de cada escrita; erros aparecem no close()
+            self.handle.set_pipelined(True)
+        except Exception:
+            pool.release(self.session, discard=not self.session.is_active())
+            raise
+
+    def write(self, data: bytes):
+        self.handle.write(data)
+        self.written += len(data)
+
+    def close(self) -> int:
+        """
+        Confirma as escritas pendentes e devolve a sessão. Retorna os bytes gravados.
+        """
+        try:
+            self.handle.close()
+        except Exception:
+            self.pool.release(self.session, discard=not self.session.is_active())
+            raise
+        self.pool.release(self.session)
+        return self.written
+
+    def abort(self):
+        try:
+            self.handle.close()
+        except Exception:
+            pass
+        self.pool.release(self.session, discard=not self.session.is_active())
+
+
+class RemoteBatchWriter:
+    """
+    Recebe arquivos em pedaços (ex.: direto do corpo multipart) e escreve cada um
+    num handle remoto aberto, sem spool local. Um arquivo por vez, falhas isoladas.
+    """
+    def __init__(self, service: SFTPService, data_type: str, metadata_base: dict):
+        self.service = service
+        self.data_type = data_type
+        self.metadata_base = metadata_base
+        self.compression = service.compression.get(data_type)
+        self.results: List[dict] = []
+        self._released = False
+        self.session = service.pool.acquire()
+        try:
+            self.target_dir = service._target_dir(data_type)
+            service._ensure_directories(self.session.sftp, self.target_dir)
+        except Exception:
+            self._release()
+            raise
+        self._handle = None
+        self._current = None
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self.service.pool.release(self.session, discard=not self.session.is_active())
+
+    def open_file(self, filename: str):
+        safe_filename = self.service._safe_filename(filename)
+        compression = self.compression
+        if compression and safe_filename.lower().endswith(ALREADY_COMPRESSED):
+            compression = None
+        if compression:
+            safe_filename += COMPRESSION_SUFFIXES[compression[0]]
+        full_path_file = f"{self.target_dir}/{safe_filename}"
+
+        # Sem compressão, original e fio são os mesmos bytes: um só conjunto de hashers
+        hashers = {self.service.hash_algorithm: new_hasher(self.service.hash_algorithm)}
+        wire_hashers = {a: new_hasher(a) for a in self.service._extra_hash_algorithms()}
+        if not compression:
+            hashers.update(wire_hashers)
+            wire_hashers = hashers
+
+        self._current = {
+            "filename": safe_filename,
+            "original_filename": filename,
+            "sftp_path": full_path_file,
+            "size": 0,
+            "wire_size": 0,
+            "error": None,
+            "compression": compression,
+            "compressor": make_compressor(*compression) if compression else None,
+            "hashers": hashers,
+            "wire_hashers": wire_hashers
+        }
+        print(f"Iniciando upload (stream direto): {safe_filename} -> {full_path_file}")
+        try:
+            # Acumula até write_chunk do perfil antes de despachar os pedidos pipelined
+            bufsize = self.service.pool.profile.write_chunk
+            self._handle = self.service._open_remote(
+                self.session.sftp,
+                self.target_dir,
+                lambda: self.session.sftp.open(full_path_file, "wb", bufsize=bufsize)
+            )
+            self._handle.set_pipelined(True)
+        except Exception as e:
+            self._fail(self._current, e)
+
+    def write(self, data: bytes):
+        if self._handle is None:
+            # Arquivo atual já falhou: descarta o resto dele
+            return
+        current = self._current
+        try:
+            current["size"] += len(data)
+            for hasher in current["hashers"].values():
+                hasher.update(data)
+            if current["compressor"] is not None:
+                self._send(current, current["compressor"].compress(data))
+            else:
+                self._send(current, data)
+        except Exception as e:
+            self._fail(current, e)
+
+    def _send(self, current: dict, data: bytes):
+        if not data:
+            return
+        self._handle.write(data)
+        current["wire_size"] += len(data)
+        if current["wire_hashers"] is not current["hashers"]:
+            for hasher in current["wire_hashers"].values():
+                hasher.update(data)
+
+    def close_file(self):
+        current = self._current
+        if current is None:
+            return
+        self._current = None
+
+        hashers = current["hashers"]
+        verification = None
+        if self._handle is not None:
+            try:
+                if current["compressor"] is not None:
+                    self._send(current, current["compressor"].flush())
+                self._handle.close()
+                self._handle = None
+
+                verify_hasher = current["wire_hashers"].get(self.service.verify_hash_algorithm)
+                with stage_timer("verify"):
+                    verification = self.service._verify_remote(
+                        self.session.sftp,
+                        current["sftp_path"],
+                        current["wire_size"],
+                        verify_hasher.hexdigest() if verify_hasher else None
+                    )
+
+                meta = self.metadata_base.copy()
+                meta["filename"] = current["filename"]
+                meta["uploaded_at"] = datetime.now().isoformat()
+                meta["size_bytes"] = current["size"]
+                meta["hash_algorithm"] = self.service.hash_algorithm
+                meta["content_hash"] = hashers[self.service.hash_algorithm].hexdigest()
+                meta["verification"] = verification
+                compression = current["compression"]
+                if compression:
+                    meta["original_filename"] = current["original_filename"]
+                    meta["compression"] = compression[0]
+                    meta["compression_level"] = compression[1]
+                    meta["original_size"] = current["size"]
+                    meta["compressed_size"] = current["wire_size"]
+                with stage_timer("metadata_write"):
+                    self.service._store_metadata(self.session.sftp, current["sftp_path"], meta, current)
+            except Exception as e:
+                self._fail(current, e)
+
+        if current["error"] is None:
+            # Stream direto não tem retry: sempre uma tentativa
+            result = SFTPService._uploaded_result(
+                current["filename"],
+                current["sftp_path"],
+                current["size"],
+                current["wire_size"] if current["compression"] else None,
+                hashers[self.service.hash_algorithm].hexdigest(),
+                verification
+            )
+            if "metadata" in current:
+                result["metadata"] = current["metadata"]
+            self.results.append(result)
+        else:
+            self.results.append(SFTPService._failed_result(current["filename"], current["error"]))
+
+    def _fail(self, current: dict, error: Exception):
+        print(f"FALHA no arquivo {current['filename']}: {error}")
+        current["error"] = str(error)
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except Exception:
+                pass
+            self._handle = None
+
+    def finish(self) -> List[dict]:
+        self.close_file()
+        try:
+            self.service._write_manifest(self.session, self.target_dir, self.metadata_base, self.results)
         finally:
-            if sftp: sftp.close()
-            if ssh: ssh.close()
+            self._release()
+        for result in self.results:
+            result["sftp_host"] = self.service.name
+        record_results(self.data_type, self.results)
+        return self.results
 
-# Instância Singleton
-sftp_service = SFTPService()
\ No newline at end of file
+    def abort(self):
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except Exception:
+                pass
+            self._handle = None
+        self._release()
@@ -0,0 +1,371 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+import asyncssh
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.core.metrics import batch_span, record_results, stage_timer
+from app.services.sftp import SFTPService, remote_dir_cache
+from app.services.sftp_pool import TransferMismatch, backoff_delay, is_transient
+from app.services.streams import ALREADY_COMPRESSED, COMPRESSION_SUFFIXES, make_compressor, new_hasher
+
+
+class AsyncSFTPService:
+    """
+    Backend assíncrono (asyncssh) do upload, usado quando SFTP_BACKEND=asyncssh.
+
+    Em vez de segurar uma thread do threadpool por transferência, cada arquivo é
+    uma corrotina. Um único canal SFTP multiplexa várias escritas ao mesmo tempo
+    (SFTP_ASYNC_MAX_REQUESTS pedidos em voo por arquivo), então poucas conexões
+    bastam para centenas de uploads simultâneos.
+
+    Mesmo layout remoto, mesmos metadados (sidecar/manifest), mesma compressão e
+    mesmo formato de resultado que SFTPService.upload_batch. Limites: um único
+    destino (sem o roteador, failover ou réplicas) e verificação só por tamanho
+    (asyncssh não expõe check-file).
+    """
+    BLOCK_SIZE = 32768  # tamanho de cada pedido de escrita SFTP (aceito por qualquer servidor)
+
+    def __init__(self, destination: Optional[dict] = None):
+        # Mesmo formato de SFTPService: um item de SFTP_DESTINATIONS, o resto das variáveis SFTP_*
+        destination = destination or {}
+        self.host = destination.get("host", settings.SFTP_HOST)
+        self.port = int(destination.get("port", settings.SFTP_PORT))
+        self.username = destination.get("username", settings.SFTP_USERNAME)
+        self.key_path = destination.get("key_path", settings.SFTP_KEY_PATH)
+        self.base_remote_dir = destination.get("remote_path", settings.SFTP_REMOTE_PATH).rstrip("/")
+        # Nome gravado em upload_logs.sftp_host, igual ao do roteador (for_host/catálogo usam ele)
+        self.name = destination.get("name") or self.host
+
+        self.hash_algorithm = settings.UPLOAD_HASH_ALGORITHM
+        self.verify_mode = settings.SFTP_VERIFY_MODE
+        self.metadata_mode = settings.SFTP_METADATA_MODE
+        self.transfer_concurrency = max(1, settings.SFTP_TRANSFER_CONCURRENCY)
+        self.pool_size = max(1, settings.SFTP_ASYNC_CONNECTIONS)
+        self.write_chunk = settings.SFTP_ASYNC_WRITE_CHUNK
+        self.max_requests = settings.SFTP_ASYNC_MAX_REQUESTS
+        self.retry_attempts = max(1, settings.SFTP_RETRY_ATTEMPTS)
+        self.retry_backoff = settings.SFTP_RETRY_BACKOFF
+        self.retry_backoff_max = settings.SFTP_RETRY_BACKOFF_MAX
+
+        # Mesma política de compressão do backend síncrono
+        self.compression = SFTPService.parse_compression_policy()
+
+        self._pkey = None
+        self._clients: List[Tuple[asyncssh.SSHClientConnection, asyncssh.SFTPClient]] = []
+        self._next = 0
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ------------------------------------------------------------------
+    # Conexões
+    # ------------------------------------------------------------------
+    async def _connect(self) -> Tuple[asyncssh.SSHClientConnection, asyncssh.SFTPClient]:
+        try:
+            with stage_timer("key_load"):
+                if self._pkey is None:
+                    self._pkey = asyncssh.read_private_key(self.key_path)
+            with stage_timer("ssh_connect"):
+                conn = await asyncio.wait_for(
+                    asyncssh.connect(
+                        self.host,
+                        self.port,
+                        username=self.username,
+                        client_keys=[self._pkey],
+                        known_hosts=None,  # mesmo comportamento do AutoAddPolicy do backend síncrono
+                        keepalive_interval=settings.SFTP_KEEPALIVE_INTERVAL,
+                        **self._transfer_options(),
+                    ),
+                    timeout=settings.SFTP_CONNECT_TIMEOUT,
+                )
+                sftp = await conn.start_sftp_client()
+            return conn, sftp
+        except Exception as e:
+            if isinstance(e, asyncssh.PermissionDenied):
+                self._pkey = None
+            print(f"Erro ao conectar no SFTP ({self.host}): {e}")
+            raise HTTPException(status_code=503, detail=f"Falha na conexão SFTP: {str(e)}")
+
+    @staticmethod
+    def _transfer_options() -> dict:
+        """
+        Mesmo perfil de transferência do backend paramiko (janela, pacote, compressão, cifras).
+        """
+        options = {}
+        if settings.SFTP_WINDOW_SIZE:
+            options["window"] = settings.SFTP_WINDOW_SIZE
+        if settings.SFTP_MAX_PACKET_SIZE:
+            options["max_pktsize"] = settings.SFTP_MAX_PACKET_SIZE
+        if settings.SFTP_SSH_COMPRESSION:
+            options["compression_algs"] = ["zlib@openssh.com", "zlib", "none"]
+        if settings.SFTP_PREFERRED_CIPHERS:
+            defaults = [alg.decode() for alg in asyncssh.encryption.get_default_encryption_algs()]
+            preferred = [alg for alg in settings.SFTP_PREFERRED_CIPHERS if alg in defaults]
+            options["encryption_algs"] = preferred + [alg for alg in defaults if alg not in preferred]
+        return options
+
+    async def _client(self) -> asyncssh.SFTPClient:
+        """
+        Devolve um cliente SFTP aberto, em rodízio entre até SFTP_ASYNC_CONNECTIONS conexões.
+        Conexões que caíram são descartadas e refeitas na hora.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Conexões e lock pertencem a um event loop; outro loop (testes, scripts) começa do zero
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._clients = []
+        async with self._lock:
+            self._clients = [(conn, sftp) for conn, sftp in self._clients if not conn.is_closed()]
+            if len(self._clients) < self.pool_size:
+                self._clients.append(await self._connect())
+                return self._clients[-1][1]
+            self._next = (self._next + 1) % len(self._clients)
+            return self._clients[self._next][1]
+
+    async def close(self):
+        clients, self._clients = self._clients, []
+        for conn, sftp in clients:
+            sftp.exit()
+            conn.close()
+        for conn, _ in clients:
+            await conn.wait_closed()
+
+    # ------------------------------------------------------------------
+    # Upload
+    # ------------------------------------------------------------------
+    def _target_dir(self, data_type: str) -> str:
+        date_folder = datetime.now().strftime("%Y/%m")
+        return f"{self.base_remote_dir}/{data_type}/{date_folder}".replace("//", "/")
+
+    async def _ensure_directories(self, sftp: asyncssh.SFTPClient, remote_path: str):
+        # Cache de diretórios compartilhado com o backend síncrono
+        if remote_dir_cache.contains(self.name, remote_path):
+            return
+        with stage_timer("mkdir"):
+            await sftp.makedirs(remote_path, exist_ok=True)
+        current_path = ""
+        for dir_name in filter(None, remote_path.split("/")):
+            current_path += f"/{dir_name}"
+            remote_dir_cache.add(self.name, current_path)
+
+    async def _write_json(self, sftp: asyncssh.SFTPClient, path: str, payload: str):
+        async with sftp.open(path, "wb") as remote_file:
+            await remote_file.write(payload.encode("utf-8"))
+
+    @staticmethod
+    def _is_transient(error: BaseException) -> bool:
+        # Mesma classificação do backend paramiko (sftp_pool.is_transient), com os erros do asyncssh
+        if isinstance(error, (asyncssh.SFTPConnectionLost, asyncssh.SFTPNoConnection, asyncssh.SFTPFailure,
+                              asyncssh.ConnectionLost, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, (asyncssh.Error, asyncssh.SFTPError)):
+            return False
+        return is_transient(error)
+
+    async def _retry(
+        self,
+        sftp: asyncssh.SFTPClient,
+        call: Callable[[asyncssh.SFTPClient, int], Awaitable[Any]],
+        what: str,
+        errors: List[str]
+    ) -> Tuple[asyncssh.SFTPClient, Any]:
+        """
+        Como SFTPService._retry: até SFTP_RETRY_ATTEMPTS tentativas, backoff com jitter
+        em erro transitório. A recuperação é pegar outro cliente em _client() (conexões
+        que caíram saem do rodízio e são refeitas). Retorna (cliente usado, resultado).
+        """
+        for attempt in range(1, self.retry_attempts + 1):
+            try:
+                if attempt > 1:
+                    sftp = await self._client()
+                return sftp, await call(sftp, attempt)
+            except Exception as e:
+                error = e.detail if isinstance(e, HTTPException) else str(e) or type(e).__name__
+                errors.append(error)
+                if attempt == self.retry_attempts or not self._is_transient(e):
+                    raise
+                delay = backoff_delay(attempt, self.retry_backoff, self.retry_backoff_max)
+                print(f"Erro transitório em {what} ({self.host}), tentativa {attempt}/{self.retry_attempts}; "
+                      f"repetindo em {delay:.2f}s: {error}")
+                with stage_timer("retry_backoff"):
+                    await asyncio.sleep(delay)
+
+    @staticmethod
+    async def _remote_size(sftp: asyncssh.SFTPClient, remote_path: str) -> int:
+        try:
+            return (await sftp.stat(remote_path)).size
+        except asyncssh.SFTPNoSuchFile:
+            return 0
+
+    async def _upload_file(
+        self,
+        sftp: asyncssh.SFTPClient,
+        file: UploadFile,
+        target_dir: str,
+        metadata_base: dict,
+        compression: Optional[Tuple[str, int]],
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> dict:
+        errors: List[str] = []
+        try:
+            safe_filename = SFTPService._safe_filename(file.filename)
+            if compression and safe_filename.lower().endswith(ALREADY_COMPRESSED):
+                compression = None
+            if compression:
+                safe_filename += COMPRESSION_SUFFIXES[compression[0]]
+            full_path_file = f"{target_dir}/{safe_filename}"
+
+            print(f"Iniciando upload (asyncssh): {safe_filename} -> {full_path_file}")
+
+            # Cada tentativa reenvia do zero: retomar do stat().st_size pode deixar um buraco
+            # (escrita pipelined perdida antes da queda) e asyncssh não expõe check-file para
+            # conferir a retomada (ver SFTPService._upload_file)
+            async def put(sftp: asyncssh.SFTPClient, attempt: int) -> Tuple[int, int, str]:
+                hasher = new_hasher(self.hash_algorithm)
+                compressor = make_compressor(*compression) if compression else None
+                file_size = wire_size = 0
+
+                await file.seek(0)
+                # Cada write de write_chunk vira vários pedidos de BLOCK_SIZE em voo (pipeline)
+                async with sftp.open(
+                    full_path_file, "wb", block_size=self.BLOCK_SIZE, max_requests=self.max_requests
+                ) as remote_file:
+                    while True:
+                        chunk = await file.read(self.write_chunk)
+                        if not chunk:
+                            break
+                        if throttle is not None:
+                            await throttle(len(chunk))
+                        file_size += len(chunk)
+                        hasher.update(chunk)
+                        if compressor is not None:
+                            chunk = compressor.compress(chunk)
+                        if chunk:
+                            await remote_file.write(chunk)
+                            wire_size += len(chunk)
+                    if compressor is not None:
+                        tail = compressor.flush()
+                        await remote_file.write(tail)
+                        wire_size += len(tail)
+                return file_size, wire_size, hasher.hexdigest()
+
+            with stage_timer("putfo"):
+                sftp, (file_size, wire_size, content_hash) = await self._retry(sftp, put, safe_filename, errors)
+
+            if file.size is not None and file.size != file_size:
+                raise TransferMismatch(f"Lidos {file_size} bytes, esperado {file.size}")
+
+            verification = None
+            if self.verify_mode != "off":
+                # asyncssh não expõe check-file: a verificação aqui é sempre por tamanho
+                with stage_timer("verify"):
+                    sftp, remote_size = await self._retry(
+                        sftp, lambda client, _: self._remote_size(client, full_path_file), safe_filename, errors
+                    )
+                if remote_size != wire_size:
+                    raise TransferMismatch(f"Tamanho remoto ({remote_size}) difere do enviado ({wire_size})")
+                verification = "size"
+
+            meta = metadata_base.copy()
+            meta["filename"] = safe_filename
+            meta["uploaded_at"] = datetime.now().isoformat()
+            meta["size_bytes"] = file_size
+            meta["hash_algorithm"] = self.hash_algorithm
+            meta["content_hash"] = content_hash
+            meta["verification"] = verification
+            if compression:
+                meta["original_filename"] = file.filename
+                meta["compression"] = compression[0]
+                meta["compression_level"] = compression[1]
+                meta["original_size"] = file_size
+                meta["compressed_size"] = wire_size
+
+            result = SFTPService._uploaded_result(
+                safe_filename,
+                full_path_file,
+                file_size,
+                wire_size if compression else None,
+                content_hash,
+                verification
+            )
+            if self.metadata_mode == "manifest":
+                meta["sftp_path"] = full_path_file
+                result["metadata"] = meta
+            else:
+                payload = json.dumps(meta, indent=4, default=str)
+                with stage_timer("metadata_write"):
+                    await self._retry(
+                        sftp,
+                        lambda client, _: self._write_json(client, f"{full_path_file}.json", payload),
+                        safe_filename,
+                        errors
+                    )
+            result.update(attempts=len(errors) + 1, last_error=errors[-1] if errors else None)
+            return result
+
+        except Exception as e:
+            print(f"FALHA no arquivo {file.filename}: {e}")
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            return SFTPService._failed_result(file.filename, error, attempts=max(1, len(errors)))
+
+    async def _write_manifest(self, sftp: asyncssh.SFTPClient, target_dir: str, metadata_base: dict, results: List[dict]):
+        entries = [result.pop("metadata") for result in results if "metadata" in result]
+        if not entries:
+            return
+        batch_id = metadata_base.get("batch_id") or datetime.now().strftime("%Y%m%d%H%M%S%f")
+        manifest_path = f"{target_dir}/{batch_id}.manifest.jsonl"
+        body = "".join(json.dumps(entry, separators=(",", ":"), default=str) + "\n" for entry in entries)
+        try:
+            with stage_timer("metadata_write"):
+                await self._write_json(sftp, manifest_path, body)
+        except Exception as e:
+            print(f"FALHA ao gravar manifesto {manifest_path}: {e}")
+            for result in results:
+                if result["status"] == "uploaded":
+                    result.update(status="failed", sftp_path="", error=f"Falha ao gravar manifesto: {e}")
+
+    async def upload_batch(
+        self,
+        files: List[UploadFile],
+        data_type: str,
+        metadata_base: dict,
+        throttle: Optional[Callable[[int], Awaitable[None]]] = None
+    ) -> List[dict]:
+        """
+        `throttle(bytes)` é aguardado a cada bloco lido (ex.: Ticket.throttle_async do
+        escalonador): o limite de bytes/s espera no event loop, sem ocupar thread.
+        """
+        try:
+            with batch_span("sftp.upload_batch", data_type=data_type, files=len(files), backend="asyncssh"):
+                sftp = await self._client()
+                target_dir = self._target_dir(data_type)
+                await self._ensure_directories(sftp, target_dir)
+                compression = self.compression.get(data_type)
+
+                # Até SFTP_TRANSFER_CONCURRENCY arquivos do batch em voo ao mesmo tempo
+                limit = asyncio.Semaphore(self.transfer_concurrency)
+
+                async def upload_one(file: UploadFile) -> dict:
+                    async with limit:
+                        return await self._upload_file(sftp, file, target_dir, metadata_base, compression, throttle)
+
+                results = list(await asyncio.gather(*(upload_one(file) for file in files)))
+                await self._write_manifest(sftp, target_dir, metadata_base, results)
+                for result in results:
+                    result["sftp_host"] = self.name
+                record_results(data_type, results)
+                return results
+
+        except HTTPException:
+            raise
+
+        except Exception as e:
+            print(f"Erro Crítico no Batch: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+# Instância Singleton (o backend assíncrono só atende a configuração de destino único)
+async_sftp_service = AsyncSFTPService((settings.SFTP_DESTINATIONS or [{}])[0])
@@ -0,0 +1,452 @@
+import errno
+import paramiko
+import random
+import socket
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from fastapi import HTTPException
+from paramiko.common import DEFAULT_MAX_PACKET_SIZE, DEFAULT_WINDOW_SIZE
+from typing import Deque, Iterator, List, Optional, Sequence
+
+from app.core.metrics import observe_stage, stage_timer
+
+# Erros que indicam que o transporte SSH morreu e a sessão não pode voltar ao pool
+TRANSPORT_ERRORS = (socket.error, EOFError, paramiko.SSHException)
+
+# Erros do servidor SFTP que não mudam com uma nova tentativa
+PERMANENT_ERRNOS = {errno.ENOENT, errno.EACCES, errno.EPERM, errno.ENOSPC, errno.EDQUOT, errno.EROFS,
+                    errno.EISDIR, errno.ENOTDIR, errno.ENAMETOOLONG}
+
+
+class TransferMismatch(IOError):
+    """
+    O que chegou (ou foi lido) não bate com o esperado: tamanho ou checksum. Repetir não resolve.
+    """
+
+
+def is_transient(error: BaseException) -> bool:
+    """
+    Vale tentar de novo? Queda/timeout de conexão, canal fechado, falha genérica do
+    servidor e 503 ao reconectar sim; arquivo/diretório inexistente, permissão, disco
+    cheio, autenticação e divergência de conteúdo não.
+    """
+    if isinstance(error, HTTPException):
+        return error.status_code == 503
+    if isinstance(error, (TransferMismatch, paramiko.AuthenticationException, paramiko.BadHostKeyException)):
+        return False
+    if isinstance(error, TRANSPORT_ERRORS):
+        # socket.error é OSError: o errno separa "conexão caiu" de "sem permissão"
+        return getattr(error, "errno", None) not in PERMANENT_ERRNOS
+    return False
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Espera antes da tentativa seguinte: exponencial com jitter "cheio", para canais
+    que caíram juntos não reconectarem todos ao mesmo tempo.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+# Limites do auto-tune
+MAX_AUTO_WINDOW = 64 * 1024 * 1024
+MAX_AUTO_WRITE_CHUNK = 4 * 1024 * 1024
+RTT_PROBES = 5
+
+
+class PoolExhausted(HTTPException):
+    """
+    503 por falta de sessão livre: o servidor está ocupado, não fora do ar.
+    """
+    def __init__(self):
+        super().__init__(status_code=503, detail="Pool de conexões SFTP esgotado, tente novamente.")
+
+
+class TransferProfile:
+    """
+    Parâmetros de transferência aplicados a cada sessão do pool.
+
+    - window_size / max_packet_size: janela e pacote SSH anunciados ao servidor
+      (0 = padrão do paramiko, 2 MB / 32 KB).
+    - write_chunk: bytes lidos da origem e entregues a cada write pipelined.
+    - compression: compressão SSH (vale para dados compressíveis em link lento).
+    - ciphers: cifras preferidas, na frente da lista padrão (ex.: aes128-gcm@openssh.com).
+    """
+    def __init__(
+        self,
+        window_size: int = 0,
+        max_packet_size: int = 0,
+        write_chunk: int = 32768,
+        compression: bool = False,
+        ciphers: Sequence[str] = (),
+    ):
+        self.window_size = window_size or DEFAULT_WINDOW_SIZE
+        self.max_packet_size = max_packet_size or DEFAULT_MAX_PACKET_SIZE
+        self.write_chunk = max(32768, write_chunk)
+        self.compression = compression
+        self.ciphers = tuple(ciphers)
+
+    def tuned_for(self, rtt: float, link_mbps: float) -> "TransferProfile":
+        """
+        Perfil com janela e blocos dimensionados pelo produto banda x atraso (BDP):
+        a janela precisa cobrir o que está "em voo" no link para não parar esperando ACK.
+        """
+        bdp = int(rtt * link_mbps * 1_000_000 / 8)
+        window = min(MAX_AUTO_WINDOW, max(self.window_size, 2 * bdp))
+        write_chunk = min(MAX_AUTO_WRITE_CHUNK, max(self.write_chunk, bdp))
+        return TransferProfile(
+            window_size=window,
+            max_packet_size=self.max_packet_size,
+            write_chunk=write_chunk - write_chunk % 32768,
+            compression=self.compression,
+            ciphers=self.ciphers,
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "window_size": self.window_size,
+            "max_packet_size": self.max_packet_size,
+            "write_chunk": self.write_chunk,
+            "compression": self.compression,
+            "ciphers": list(self.ciphers),
+        }
+
+
+class PooledSession:
+    """
+    Sessão SSH autenticada (Transport + SFTPClient) mantida pelo pool.
+    """
+    def __init__(self, transport: paramiko.Transport, sftp: paramiko.SFTPClient):
+        self.transport = transport
+        self.sftp = sftp
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def is_active(self) -> bool:
+        return self.transport is not None and self.transport.is_active()
+
+    def close(self):
+        try:
+            self.sftp.close()
+        except Exception:
+            pass
+        try:
+            self.transport.close()
+        except Exception:
+            pass
+
+
+class SFTPConnectionPool:
+    """
+    Pool limitado e thread-safe de sessões SFTP reaproveitadas entre requisições.
+
+    - Keepalive no transporte para o NAS/firewall não derrubar a conexão ociosa.
+    - Health check no checkout (transporte ativo + ping SFTP se ficou ocioso).
+    - Sessões ociosas demais ou velhas demais são descartadas.
+    - Se a sessão estiver morta, reconecta de forma transparente.
+    """
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str,
+        key_path: str,
+        max_size: int = 8,
+        acquire_timeout: float = 30.0,
+        connect_timeout: float = 20.0,
+        keepalive_interval: int = 30,
+        max_idle: float = 300.0,
+        max_lifetime: float = 3600.0,
+        healthcheck_after: float = 30.0,
+        profile: Optional[TransferProfile] = None,
+        auto_tune: bool = False,
+        link_mbps: float = 1000.0,
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.key_path = key_path
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.connect_timeout = connect_timeout
+        self.keepalive_interval = keepalive_interval
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.healthcheck_after = healthcheck_after
+        self.profile = profile or TransferProfile()
+        # Auto-tune: mede o RTT na primeira conexão e redimensiona o perfil
+        self.auto_tune = auto_tune
+        self.link_mbps = link_mbps
+        self.rtt: Optional[float] = None
+
+        self._cond = threading.Condition()
+        self._idle: Deque[PooledSession] = deque()
+        self._size = 0       # sessões abertas (ociosas + em uso + conectando)
+        self._in_use = 0
+        self._pkey = None
+        self._key_lock = threading.Lock()
+
+        # Estatísticas
+        self._created = 0
+        self._reused = 0
+        self._discarded = 0
+        self._revived = 0  # sessões recuperadas após erro transitório (revive)
+        self._acquires = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+
+    # ------------------------------------------------------------------
+    # Conexão
+    # ------------------------------------------------------------------
+    def _load_key(self):
+        # A chave é lida do disco uma única vez por processo
+        with self._key_lock:
+            if self._pkey is None:
+                self._pkey = paramiko.RSAKey.from_private_key_file(self.key_path)
+            return self._pkey
+
+    def _connect(self) -> PooledSession:
+        transport = None
+        try:
+            with stage_timer("key_load"):
+                pkey = self._load_key()
+            with stage_timer("ssh_connect"):
+                profile = self.profile
+                sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+                transport = paramiko.Transport(
+                    sock,
+                    default_window_size=profile.window_size,
+                    default_max_packet_size=profile.max_packet_size,
+                )
+                if profile.compression:
+                    transport.use_compression(True)
+                if profile.ciphers:
+                    options = transport.get_security_options()
+                    preferred = [c for c in profile.ciphers if c in options.ciphers]
+                    options.ciphers = tuple(preferred + [c for c in options.ciphers if c not in preferred])
+                # Sem hostkey: mesmo comportamento do antigo AutoAddPolicy
+                transport.connect(username=self.username, pkey=pkey)
+                if self.keepalive_interval:
+                    transport.set_keepalive(self.keepalive_interval)
+                sftp = self._open_sftp(transport)
+                if self.auto_tune and self.rtt is None:
+                    sftp = self._tune(transport, sftp)
+            with self._cond:
+                self._created += 1
+            return PooledSession(transport, sftp)
+        except Exception as e:
+            if transport is not None:
+                transport.close()
+            if isinstance(e, paramiko.AuthenticationException):
+                # Força recarregar a chave na próxima tentativa (pode ter sido trocada)
+                with self._key_lock:
+                    self._pkey = None
+            print(f"Erro ao conectar no SFTP ({self.host}): {e}")
+            raise HTTPException(status_code=503, detail=f"Falha na conexão SFTP: {str(e)}")
+
+    def _open_sftp(self, transport: paramiko.Transport) -> paramiko.SFTPClient:
+        return paramiko.SFTPClient.from_transport(
+            transport,
+            window_size=self.profile.window_size,
+            max_packet_size=self.profile.max_packet_size,
+        )
+
+    def _tune(self, transport: paramiko.Transport, sftp: paramiko.SFTPClient) -> paramiko.SFTPClient:
+        """
+        Mede o RTT (mediana de alguns round trips SFTP) e troca o perfil pelo
+        dimensionado para o link. O canal desta conexão é reaberto com a janela nova.
+        """
+        samples = []
+        for _ in range(RTT_PROBES):
+            start = time.perf_counter()
+            sftp.normalize(".")
+            samples.append(time.perf_counter() - start)
+        self.rtt = sorted(samples)[len(samples) // 2]
+        self.profile = self.profile.tuned_for(self.rtt, self.link_mbps)
+        print(f"SFTP auto-tune ({self.host}): RTT {self.rtt * 1000:.1f} ms -> {self.profile.as_dict()}")
+
+        sftp.close()
+        return self._open_sftp(transport)
+
+    def _is_expired(self, session: PooledSession, now: float) -> bool:
+        if self.max_lifetime and now - session.created_at > self.max_lifetime:
+            return True
+        if self.max_idle and now - session.last_used > self.max_idle:
+            return True
+        return False
+
+    def _is_healthy(self, session: PooledSession) -> bool:
+        if not session.is_active():
+            return False
+        if time.monotonic() - session.last_used < self.healthcheck_after:
+            return True
+        try:
+            # Ping barato: um round trip no subsistema SFTP
+            session.sftp.normalize(".")
+            return True
+        except Exception:
+            return False
+
+    def _evict_expired_locked(self, now: float) -> List[PooledSession]:
+        expired = [s for s in self._idle if self._is_expired(s, now)]
+        for session in expired:
+            self._idle.remove(session)
+            self._size -= 1
+            self._discarded += 1
+        return expired
+
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+    def acquire(self, timeout: Optional[float] = None) -> PooledSession:
+        """
+        Retira uma sessão do pool. `timeout=0` não espera: falha na hora se o pool estiver cheio.
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        waited = False
+        session = None
+        to_close: List[PooledSession] = []
+
+        with self._cond:
+            self._acquires += 1
+            while True:
+                expired = self._evict_expired_locked(time.monotonic())
+                if expired:
+                    to_close.extend(expired)
+                    self._cond.notify_all()
+                if self._idle:
+                    # LIFO: reaproveita a sessão mais "quente"
+                    session = self._idle.pop()
+                    self._reused += 1
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    if timeout > 0:
+                        self._timeouts += 1
+                    for old in to_close:
+                        old.close()
+                    raise PoolExhausted()
+                waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+            elapsed = time.monotonic() - start
+            if waited:
+                self._waits += 1
+                self._wait_total += elapsed
+                self._wait_max = max(self._wait_max, elapsed)
+
+        observe_stage("pool_wait", elapsed)
+        for old in to_close:
+            old.close()
+
+        if session is not None and not self._is_healthy(session):
+            print(f"Sessão SFTP inválida descartada ({self.host}), reconectando...")
+            session.close()
+            with self._cond:
+                self._discarded += 1
+            session = None
+
+        if session is None:
+            try:
+                session = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+
+        return session
+
+    def release(self, session: PooledSession, discard: bool = False):
+        now = time.monotonic()
+        if not discard and (not session.is_active() or self._is_expired(session, now)):
+            discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+                self._discarded += 1
+            else:
+                session.last_used = now
+                self._idle.append(session)
+            self._cond.notify()
+
+        if discard:
+            session.close()
+
+    @contextmanager
+    def session(self, timeout: Optional[float] = None) -> Iterator[PooledSession]:
+        session = self.acquire(timeout)
+        discard = False
+        try:
+            yield session
+        except TRANSPORT_ERRORS:
+            discard = True
+            raise
+        finally:
+            self.release(session, discard=discard or not session.is_active())
+
+    def revive(self, session: PooledSession):
+        """
+        Deixa a sessão utilizável de novo depois de um erro transitório, sem trocar
+        de vaga no pool: com o transporte vivo só reabre o canal SFTP (um round trip);
+        se a conexão caiu, reconecta (503 se não conseguir).
+        """
+        with self._cond:
+            self._revived += 1
+        if session.is_active():
+            try:
+                session.sftp.close()
+            except Exception:
+                pass
+            try:
+                session.sftp = self._open_sftp(session.transport)
+                return
+            except Exception as e:
+                print(f"Canal SFTP não reabriu ({self.host}), reconectando: {e}")
+
+        session.close()
+        fresh = self._connect()
+        session.transport, session.sftp = fresh.transport, fresh.sftp
+        session.created_at = fresh.created_at
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for session in idle:
+            session.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "host": self.host,
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "created": self._created,
+                "reused": self._reused,
+                "discarded": self._discarded,
+                "revived": self._revived,
+                "acquires": self._acquires,
+                "waits": self._waits,
+                "wait_timeouts": self._timeouts,
+                "wait_avg_ms": round(self._wait_total / self._waits * 1000, 2) if self._waits else 0.0,
+                "wait_max_ms": round(self._wait_max * 1000, 2),
+                "rtt_ms": round(self.rtt * 1000, 2) if self.rtt is not None else None,
+                "transfer_profile": self.profile.as_dict(),
+            }
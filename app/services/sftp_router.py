@@ -0,0 +1,315 @@
+import hashlib
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from app.core.config import settings
+from app.services.sftp import RemoteBatchWriter, RemoteChunkWriter, SFTPService
+from app.services.sftp_pool import PoolExhausted
+
+
+class Destination:
+    """
+    Um servidor SFTP de destino: o SFTPService (com seu próprio pool), o peso e
+    o estado de saúde usado para tirá-lo do rodízio.
+    """
+    def __init__(self, service: SFTPService, weight: float):
+        if weight <= 0:
+            raise ValueError(f"Peso do destino SFTP '{service.name}' precisa ser positivo.")
+        self.service = service
+        self.name = service.name
+        self.weight = weight
+        self.inflight = 0  # batches em andamento neste destino
+        self.routed = 0  # batches entregues aqui (desempate ponderado)
+        self.failed = 0  # batches que falharam aqui e foram para o próximo ou erro
+        self.failures = 0  # falhas seguidas
+        self.ejected_until = 0.0
+        self._lock = threading.Lock()
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        with self._lock:
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def mark_ok(self):
+        with self._lock:
+            self.routed += 1
+            if self.failures >= settings.SFTP_EJECT_AFTER_FAILURES:
+                print(f"Destino SFTP '{self.name}' de volta ao rodízio.")
+            self.failures = 0
+            self.ejected_until = 0.0
+
+    def mark_failed(self, error: HTTPException):
+        with self._lock:
+            self.failed += 1
+        if isinstance(error, PoolExhausted):
+            # Destino ocupado, não fora do ar: o batch só vai para o próximo
+            return
+        with self._lock:
+            self.failures += 1
+            if self.failures >= settings.SFTP_EJECT_AFTER_FAILURES:
+                # Depois do prazo volta a ser tentado; uma nova falha o tira de novo
+                self.ejected_until = time.monotonic() + settings.SFTP_EJECT_SECONDS
+                print(f"Destino SFTP '{self.name}' fora do rodízio por {settings.SFTP_EJECT_SECONDS}s "
+                      f"({self.failures} falhas seguidas): {error.detail}")
+
+
+class SFTPRouter:
+    """
+    Distribui os batches entre os destinos de SFTP_DESTINATIONS (ou só SFTP_HOST).
+
+    Expõe a mesma API do SFTPService usada pelas rotas e pelo ingest; cada
+    resultado ganha "sftp_host" com o nome do destino que recebeu o arquivo.
+    Políticas (SFTP_ROUTING_POLICY):
+    - least_loaded: destino com menos batches em andamento em relação ao peso
+      (empate: o que recebeu menos batches em relação ao peso);
+    - hash: hashing por rendezvous (ponderado) da chave SFTP_ROUTING_KEY, estável
+      quando um destino sai do rodízio (só as chaves dele mudam de lugar);
+    - replicate: o batch vai para SFTP_REPLICAS destinos, um depois do outro.
+    Falha de conexão (503) passa o batch para o próximo destino; destinos com
+    SFTP_EJECT_AFTER_FAILURES falhas seguidas saem do rodízio por SFTP_EJECT_SECONDS.
+    """
+    def __init__(self):
+        configured = settings.SFTP_DESTINATIONS or [{}]
+        self.destinations = [
+            Destination(SFTPService(destination), float(destination.get("weight", 1)))
+            for destination in configured
+        ]
+        names = [destination.name for destination in self.destinations]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Nomes repetidos em SFTP_DESTINATIONS: {names}")
+        self._by_name = {destination.name: destination for destination in self.destinations}
+
+        self.policy = settings.SFTP_ROUTING_POLICY
+        self.routing_key = settings.SFTP_ROUTING_KEY
+        self.replicas = max(1, min(settings.SFTP_REPLICAS, len(self.destinations)))
+
+        # Mesma configuração de hash em todos os destinos (vem de settings)
+        self.hash_algorithm = self.destinations[0].service.hash_algorithm
+
+    # ------------------------------------------------------------------
+    # Escolha do destino
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _rendezvous_score(key: str, destination: Destination) -> float:
+        digest = hashlib.sha1(f"{key}|{destination.name}".encode("utf-8")).digest()
+        uniform = (int.from_bytes(digest[:8], "big") + 1) / (2 ** 64 + 1)  # em (0, 1)
+        return -destination.weight / math.log(uniform)
+
+    def _candidates(self, data_type: str, metadata_base: dict) -> List[Destination]:
+        """
+        Destinos em ordem de preferência para um batch. Os que estão fora do
+        rodízio vão para o fim: só são tentados se todos os outros falharem.
+        """
+        if self.policy == "hash":
+            key = metadata_base.get("uploaded_by") if self.routing_key == "user" else data_type
+            ordered = sorted(self.destinations, key=lambda d: self._rendezvous_score(str(key), d), reverse=True)
+        else:
+            # Menos carga por peso; sem carga (batches em sequência), vira um rodízio ponderado
+            ordered = sorted(self.destinations, key=lambda d: (d.inflight / d.weight, d.routed / d.weight))
+        now = time.monotonic()
+        return [d for d in ordered if d.available(now)] + [d for d in ordered if not d.available(now)]
+
+    def for_host(self, name: Optional[str]) -> SFTPService:
+        """
+        Serviço de um destino pelo nome gravado no banco (vazio = primeiro destino,
+        caso de registros anteriores à configuração de vários destinos).
+        """
+        if not name:
+            return self.destinations[0].service
+        destination = self._by_name.get(name)
+        if destination is None:
+            raise HTTPException(status_code=503, detail=f"Destino SFTP '{name}' não está configurado.")
+        return destination.service
+
+    # ------------------------------------------------------------------
+    # Execução com failover / réplicas
+    # ------------------------------------------------------------------
+    def _run(
+        self,
+        candidates: List[Destination],
+        call: Callable[[SFTPService], List[dict]],
+        rewind: Callable[[], None]
+    ) -> List[dict]:
+        last_error = None
+        for destination in candidates:
+            rewind()
+            with destination.track():
+                try:
+                    results = call(destination.service)
+                except HTTPException as e:
+                    if e.status_code < 500:
+                        raise
+                    destination.mark_failed(e)
+                    if e.status_code != 503:
+                        raise
+                    # 503 = nenhum arquivo chegou a este destino (sem conexão, pool esgotado ou
+                    # queda antes da primeira escrita); se parte já tivesse sido gravada o
+                    # serviço devolveria o resultado por arquivo. Reenviar tudo ao próximo não duplica
+                    last_error = e
+                    continue
+            destination.mark_ok()
+            for result in results:
+                result["sftp_host"] = destination.name
+            return results
+        raise last_error
+
+    def _replicate(
+        self,
+        candidates: List[Destination],
+        call: Callable[[SFTPService], List[dict]],
+        rewind: Callable[[], None]
+    ) -> List[dict]:
+        """
+        Envia o mesmo batch para até SFTP_REPLICAS destinos. Um arquivo fica como
+        enviado se chegou a pelo menos um; sftp_host lista onde ele está.
+        """
+        copies = []
+        last_error = None
+        for destination in candidates:
+            if len(copies) == self.replicas:
+                break
+            try:
+                copies.append(self._run([destination], call, rewind))
+            except HTTPException as e:
+                if e.status_code < 500:
+                    raise
+                last_error = e
+        if not copies:
+            raise last_error
+        if len(copies) < self.replicas:
+            print(f"Aviso: batch replicado em {len(copies)} de {self.replicas} destinos.")
+
+        merged = []
+        for replicas in zip(*copies):
+            uploaded = [result for result in replicas if result["status"] == "uploaded"]
+            if not uploaded:
+                merged.append(replicas[0])
+                continue
+            result = dict(uploaded[0])
+            result["sftp_host"] = ",".join(replica["sftp_host"] for replica in uploaded)
+            if len(uploaded) < len(replicas):
+                print(f"Aviso: {result['filename']} replicado só em {result['sftp_host']}.")
+            merged.append(result)
+        return merged
+
+    def _dispatch(self, data_type: str, metadata_base: dict, call, rewind=lambda: None) -> List[dict]:
+        candidates = self._candidates(data_type, metadata_base)
+        if self.policy == "replicate":
+            return self._replicate(candidates, call, rewind)
+        return self._run(candidates, call, rewind)
+
+    # ------------------------------------------------------------------
+    # API do SFTPService
+    # ------------------------------------------------------------------
+    def upload_batch(self, files: List[UploadFile], data_type: str, metadata_base: dict) -> List[dict]:
+        # _upload_file volta cada arquivo ao início, então réplicas/failover releem o mesmo spool
+        return self._dispatch(
+            data_type, metadata_base, lambda service: service.upload_batch(files, data_type, metadata_base)
+        )
+
+    def upload_archive(self, archive: UploadFile, data_type: str, metadata_base: dict) -> List[dict]:
+        return self._dispatch(
+            data_type,
+            metadata_base,
+            lambda service: service.upload_archive(archive, data_type, metadata_base),
+            rewind=lambda: archive.file.seek(0)
+        )
+
+    def open_batch_writer(self, data_type: str, metadata_base: dict) -> RemoteBatchWriter:
+        """
+        Stream direto do corpo da requisição: não dá para reler, então vai para um
+        único destino (o primeiro candidato que conectar), mesmo em "replicate".
+        """
+        last_error = None
+        for destination in self._candidates(data_type, metadata_base):
+            try:
+                writer = destination.service.open_batch_writer(data_type, metadata_base)
+            except HTTPException as e:
+                destination.mark_failed(e)
+                last_error = e
+                continue
+            destination.mark_ok()
+            return writer
+        raise last_error
+
+    def create_remote_file(self, data_type: str, filename: str, session_id: str) -> Tuple[str, str, str]:
+        """
+        Cria o .part de uma sessão resumível num destino escolhido pela política.
+        Retorna (nome do destino, caminho do .part, caminho final); os chunks
+        seguintes usam for_host(nome).
+        """
+        last_error = None
+        for destination in self._candidates(data_type, {}):
+            try:
+                part_path, final_path = destination.service.create_remote_file(data_type, filename, session_id)
+            except HTTPException as e:
+                destination.mark_failed(e)
+                last_error = e
+                continue
+            destination.mark_ok()
+            return destination.name, part_path, final_path
+        raise last_error
+
+    def open_chunk_writer(self, host: Optional[str], remote_path: str, offset: int) -> RemoteChunkWriter:
+        return self.for_host(host).open_chunk_writer(remote_path, offset)
+
+    def finalize_remote_file(
+        self,
+        host: Optional[str],
+        part_path: str,
+        final_path: str,
+        size: int,
+        metadata: dict,
+        digests: Optional[Dict[str, str]] = None
+    ) -> Tuple[Optional[str], Optional[str]]:
+        return self.for_host(host).finalize_remote_file(part_path, final_path, size, metadata, digests)
+
+    def hash_remote_file(self, host: Optional[str], remote_path: str) -> str:
+        return self.for_host(host).hash_remote_file(remote_path)
+
+    def remove_remote_file(self, host: Optional[str], remote_path: str):
+        self.for_host(host).remove_remote_file(remote_path)
+
+    def precreate_directories(self):
+        for destination in self.destinations:
+            destination.service.precreate_directories()
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "policy": self.policy,
+            "destinations": [
+                {
+                    "name": destination.name,
+                    "weight": destination.weight,
+                    "healthy": destination.available(now),
+                    "inflight": destination.inflight,
+                    "routed": destination.routed,
+                    "failed": destination.failed,
+                    "consecutive_failures": destination.failures,
+                    "ejected_for_s": round(max(0.0, destination.ejected_until - now), 1),
+                    "pool": destination.service.pool.stats(),
+                }
+                for destination in self.destinations
+            ],
+        }
+
+    def close(self):
+        for destination in self.destinations:
+            destination.service.close()
+
+# Instância Singleton (mesma API do antigo SFTPService único)
+sftp_service = SFTPRouter()
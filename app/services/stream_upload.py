@@ -0,0 +1,97 @@
+from fastapi import HTTPException
+from typing import List, Optional
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app.services.sftp import RemoteBatchWriter
+from app.services.sftp_router import sftp_service
+
+
+class MultipartSFTPStreamer:
+    """
+    Faz o parse incremental de um corpo multipart/form-data e manda cada parte de
+    arquivo direto para um handle remoto no SFTP (sem SpooledTemporaryFile).
+    Campos que não são arquivo são ignorados; o data_type vem na query string.
+
+    Os métodos são bloqueantes (escrevem no SFTP): chamar via run_in_threadpool.
+    """
+    def __init__(self, content_type: Optional[str], data_type: str, metadata_base: dict):
+        content_type, params = parse_options_header(content_type or "")
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise HTTPException(status_code=400, detail="Esperado corpo multipart/form-data com boundary.")
+
+        self.data_type = data_type
+        self.metadata_base = metadata_base
+        self.writer: Optional[RemoteBatchWriter] = None
+
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._headers = {}
+        self._in_file = False
+
+        self.parser = MultipartParser(boundary, callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    # --- Callbacks do parser -------------------------------------------
+    def _on_part_begin(self):
+        self._headers = {}
+        self._in_file = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field.extend(data[start:end])
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value.extend(data[start:end])
+
+    def _on_header_end(self):
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        if filename:
+            self._in_file = True
+            self.writer.open_file(filename.decode("utf-8", errors="replace"))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self.writer.write(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_file:
+            self.writer.close_file()
+            self._in_file = False
+
+    # --- API ------------------------------------------------------------
+    def start(self):
+        self.writer = sftp_service.open_batch_writer(self.data_type, self.metadata_base)
+
+    def feed(self, chunk: bytes):
+        try:
+            self.parser.write(chunk)
+        except ValueError as e:  # MultipartParseError herda de ValueError
+            raise HTTPException(status_code=400, detail=f"Multipart inválido: {e}")
+
+    def finish(self) -> List[dict]:
+        try:
+            self.parser.finalize()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Multipart inválido: {e}")
+        return self.writer.finish()
+
+    def abort(self):
+        if self.writer is not None:
+            self.writer.abort()
@@ -0,0 +1,147 @@
+import hashlib
+import time
+import zlib
+from typing import BinaryIO, Iterable, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd é opcional; gzip sempre disponível
+    zstandard = None
+
+# Tamanho de leitura ao calcular hash de um arquivo local
+HASH_READ_SIZE = 1024 * 1024
+
+
+# Extensão acrescentada ao nome remoto de cada codec
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+DEFAULT_COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+
+# Não vale a pena recomprimir o que já chega comprimido
+ALREADY_COMPRESSED = (".gz", ".zst", ".zip", ".bz2", ".xz", ".7z", ".tgz")
+
+
+def parse_compression(spec: str) -> Optional[Tuple[str, int]]:
+    """
+    "gzip", "gzip:9", "zstd:3" -> (codec, nível). "" ou "none" -> None.
+    """
+    if not spec or spec.lower() == "none":
+        return None
+    codec, _, level = spec.lower().partition(":")
+    if codec not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Compressão desconhecida: {spec}")
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("Compressão zstd configurada, mas o pacote 'zstandard' não está instalado")
+    return codec, int(level) if level else DEFAULT_COMPRESSION_LEVELS[codec]
+
+
+def make_compressor(codec: str, level: int):
+    """
+    Objeto com compress(data) / flush(), igual para gzip e zstd.
+    """
+    if codec == "gzip":
+        # wbits=31: formato gzip (com cabeçalho), legível por gunzip
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+class CompressingReader:
+    """
+    File-like que entrega a versão comprimida de outro file-like, em streaming:
+    lê um bloco da origem, comprime e devolve, sem materializar o arquivo inteiro.
+    """
+    READ_SIZE = 256 * 1024
+
+    def __init__(self, fileobj: BinaryIO, codec: str, level: int):
+        self.fileobj = fileobj
+        self.compressor = make_compressor(codec, level)
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while not self._eof and (size < 0 or len(self._buffer) < size):
+            data = self.fileobj.read(self.READ_SIZE)
+            if data:
+                self._buffer += self.compressor.compress(data)
+            else:
+                self._buffer += self.compressor.flush()
+                self._eof = True
+
+        if size < 0 or size >= len(self._buffer):
+            out = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            out = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return out
+
+
+def new_hasher(algorithm: str):
+    return hashlib.new(algorithm)
+
+
+class HashingReader:
+    """
+    Envolve um file-like e calcula o hash (e o total de bytes) do que é lido,
+    enquanto o Paramiko consome o arquivo. Não exige uma segunda leitura.
+    `extra_algorithms` permite calcular outros hashes na mesma passada
+    (ex.: o exigido pela verificação remota).
+    """
+    def __init__(self, fileobj: BinaryIO, algorithm: str, extra_algorithms: Iterable[str] = ()):
+        self.fileobj = fileobj
+        self.algorithm = algorithm
+        self.hashers = {algorithm: new_hasher(algorithm)}
+        for extra in extra_algorithms:
+            self.hashers.setdefault(extra, new_hasher(extra))
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size)
+        if data:
+            for hasher in self.hashers.values():
+                hasher.update(data)
+            self.bytes_read += len(data)
+        return data
+
+    def hexdigest(self, algorithm: Optional[str] = None) -> str:
+        return self.hashers[algorithm or self.algorithm].hexdigest()
+
+
+class ThrottledReader:
+    """
+    Envolve um file-like limitando a taxa de leitura: cada read consome do
+    `bucket` (ver scheduler.TokenBucket) e dorme o que ele mandar.
+    tell/seek e afins são repassados; reposicionar não consome nada.
+    """
+    def __init__(self, fileobj: BinaryIO, bucket):
+        self.fileobj = fileobj
+        self.bucket = bucket
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fileobj.read(size)
+        if data:
+            wait = self.bucket.consume(len(data))
+            if wait > 0:
+                time.sleep(wait)
+        return data
+
+    def __getattr__(self, name: str):
+        # Atributos privados (ex.: _rolled do SpooledTemporaryFile) não passam: assim o
+        # UploadFile trata o arquivo como "em disco" e lê no threadpool, nunca dormindo no event loop
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.fileobj, name)
+
+
+def hash_fileobj(fileobj: BinaryIO, algorithm: str) -> str:
+    """
+    Hash de um arquivo local (ex.: spool do UploadFile). Volta o ponteiro para o início.
+    """
+    hasher = new_hasher(algorithm)
+    fileobj.seek(0)
+    while True:
+        data = fileobj.read(HASH_READ_SIZE)
+        if not data:
+            break
+        hasher.update(data)
+    fileobj.seek(0)
+    return hasher.hexdigest()
@@ -0,0 +1,348 @@
+"""
+Benchmark do caminho de upload real (SFTPService.upload_batch e POST /api/v1/upload/)
+contra um servidor SFTP local (benchmarks/sftp_server.py).
+
+Uso (a partir da raiz do repositório):
+
+    python -m benchmarks.bench_upload                       # matriz padrão, compara com baseline.json
+    python -m benchmarks.bench_upload --quick               # matriz reduzida
+    python -m benchmarks.bench_upload --latency-ms 5 --bandwidth-mbps 200
+    python -m benchmarks.bench_upload --update-baseline     # grava os resultados como novo baseline
+    python -m benchmarks.bench_upload --fail-on-regression  # exit 1 se piorar além da tolerância
+
+Cada cenário roda num processo separado (settings isoladas e pico de RSS por cenário).
+--backends asyncssh mede o backend assíncrono (SFTP_BACKEND=asyncssh; requer aiosqlite).
+O endpoint usa SQLite em arquivo temporário no lugar do Postgres e um usuário fixo
+no lugar do JWT; o resto (multipart, SFTP, gravação do log) é o código de produção.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import paramiko
+
+from benchmarks.sftp_server import LocalSFTPServer
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DATA_TYPE = "dados_anel"
+
+# Métricas comparadas com o baseline: nome -> True se "maior é melhor"
+COMPARED_METRICS = {"files_per_s": True, "mb_per_s": True, "p50_ms": False, "p99_ms": False}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(size: int) -> str:
+    for unit, factor in (("m", 1024 ** 2), ("k", 1024)):
+        if size >= factor and size % factor == 0:
+            return f"{size // factor}{unit}"
+    return str(size)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    # Nearest-rank: sem interpolação, funciona com poucas amostras
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def scenario_key(scenario: dict) -> str:
+    key = f"{scenario['mode']}-n{scenario['files']}-s{format_size(scenario['size'])}-c{scenario['concurrency']}"
+    if scenario.get("backend", "paramiko") != "paramiko":
+        key += f"-{scenario['backend']}"
+    return key
+
+
+# ----------------------------------------------------------------------
+# Processo filho: configura o ambiente, importa a app e mede
+# ----------------------------------------------------------------------
+def _configure_env(scenario: dict, workdir: str):
+    os.environ.update({
+        "SFTP_HOST": "127.0.0.1",
+        "SFTP_PORT": str(scenario["port"]),
+        "SFTP_USERNAME": "bench",
+        "SFTP_KEY_PATH": scenario["key_path"],
+        "SFTP_REMOTE_PATH": "/data",
+        "SFTP_TRANSFER_CONCURRENCY": str(scenario["concurrency"]),
+        "SFTP_BACKEND": scenario.get("backend", "paramiko"),
+        "SFTP_POOL_SIZE": str(max(8, scenario["concurrency"])),
+        "SFTP_PRECREATE_DIRECTORIES": "false",
+        "INGEST_SPOOL_DIR": os.path.join(workdir, "spool"),
+    })
+    # Obrigatórias nas settings, mas não usadas (o endpoint roda com SQLite)
+    for name in ("POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB", "DB_USER", "DB_PASSWORD", "DB_NAME"):
+        os.environ.setdefault(name, "bench")
+
+
+def _bench_service(scenario: dict, payload: bytes) -> List[float]:
+    from tempfile import SpooledTemporaryFile
+    from fastapi import UploadFile
+    from app.services.sftp_router import sftp_service
+    from app.services.sftp_async import async_sftp_service
+
+    if scenario.get("backend") == "asyncssh":
+        loop = asyncio.new_event_loop()
+        upload_batch = lambda *args: loop.run_until_complete(async_sftp_service.upload_batch(*args))
+    else:
+        upload_batch = sftp_service.upload_batch
+
+    latencies = []
+    for iteration in range(scenario["iterations"] + 1):
+        files = []
+        for idx in range(scenario["files"]):
+            spooled = SpooledTemporaryFile(max_size=1024 * 1024)
+            spooled.write(payload)
+            spooled.seek(0)
+            files.append(UploadFile(spooled, filename=f"bench_{iteration}_{idx}.bin", size=len(payload)))
+
+        start = time.perf_counter()
+        results = upload_batch(files, DATA_TYPE, {"batch_id": f"bench{iteration}"})
+        elapsed = time.perf_counter() - start
+
+        failed = [r for r in results if r["status"] != "uploaded"]
+        if failed:
+            raise RuntimeError(f"{len(failed)} arquivos falharam: {failed[0]['error']}")
+        if iteration:  # a primeira iteração é aquecimento (conexão, diretórios)
+            latencies.append(elapsed)
+    if scenario.get("backend") == "asyncssh":
+        loop.run_until_complete(async_sftp_service.close())
+        loop.close()
+    sftp_service.close()
+    return latencies
+
+
+def _bench_endpoint(scenario: dict, payload: bytes, workdir: str) -> List[float]:
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.api import deps
+    from app.core import database
+    from app.core.database import Base, get_db
+    from app.core.user_cache import CachedUser
+    from app.main import app
+    from app.models.user import User, UserRole
+    from app.services.sftp_router import sftp_service
+
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    Base.metadata.create_all(bind=engine)
+    BenchSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with BenchSession() as db:
+        db.add(User(id=1, username="bench", hashed_password="x", role=UserRole.ADMIN, is_active=True))
+        db.commit()
+
+    def bench_db():
+        db = BenchSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    # Backend asyncssh grava o log pela sessão assíncrona (aiosqlite no lugar do asyncpg)
+    database._async_sessionmaker = async_sessionmaker(
+        bind=create_async_engine(f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}"),
+        expire_on_commit=False
+    )
+
+    app.dependency_overrides[get_db] = bench_db
+    app.dependency_overrides[deps.get_current_user] = lambda: CachedUser(
+        id=1, username="bench", role=UserRole.ADMIN, is_active=True
+    )
+
+    # Sem "with": não roda o lifespan (que criaria tabelas no Postgres)
+    client = TestClient(app)
+    latencies = []
+    for iteration in range(scenario["iterations"] + 1):
+        files = [
+            ("files", (f"bench_{iteration}_{idx}.bin", payload, "application/octet-stream"))
+            for idx in range(scenario["files"])
+        ]
+        start = time.perf_counter()
+        response = client.post("/api/v1/upload/", files=files, data={"data_type": DATA_TYPE})
+        elapsed = time.perf_counter() - start
+
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+        if iteration:
+            latencies.append(elapsed)
+    sftp_service.close()
+    return latencies
+
+
+def _run_scenario(scenario: dict, queue):
+    workdir = tempfile.mkdtemp(prefix="bench_upload_")
+    try:
+        _configure_env(scenario, workdir)
+        payload = os.urandom(scenario["size"])
+
+        # Silencia os print() do caminho de upload (um por arquivo)
+        devnull = open(os.devnull, "w")
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            if scenario["mode"] == "service":
+                latencies = _bench_service(scenario, payload)
+            else:
+                latencies = _bench_endpoint(scenario, payload, workdir)
+        finally:
+            sys.stdout = stdout
+            devnull.close()
+
+        total = sum(latencies)
+        files = scenario["files"] * len(latencies)
+        queue.put({
+            "files_per_s": round(files / total, 2),
+            "mb_per_s": round(files * scenario["size"] / total / 1024 ** 2, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            # ru_maxrss é em KiB no Linux
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        })
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_scenario(scenario: dict, timeout: float) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_scenario, args=(scenario, queue))
+    process.start()
+    try:
+        return queue.get(timeout=timeout)
+    except Exception:
+        return {"error": "timeout"}
+    finally:
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+
+
+# ----------------------------------------------------------------------
+# Comparação com o baseline
+# ----------------------------------------------------------------------
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    Imprime a variação de cada métrica e retorna as regressões além da tolerância.
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if not base or "error" in result:
+            continue
+        deltas = []
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            deltas.append(f"{metric} {change:+.0%}")
+            if worse > tolerance:
+                regressions.append(f"{key}: {metric} {old} -> {new} ({change:+.0%})")
+        print(f"  {key:<32} " + ", ".join(deltas))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do upload SFTP contra um servidor local.")
+    parser.add_argument("--modes", default="service,endpoint", help="service, endpoint ou ambos")
+    parser.add_argument("--files", default="1,20,100", help="arquivos por batch (lista)")
+    parser.add_argument("--sizes", default="4k,1m", help="tamanho de cada arquivo (lista, aceita k/m)")
+    parser.add_argument("--concurrency", default="1,4", help="SFTP_TRANSFER_CONCURRENCY (lista)")
+    parser.add_argument("--backends", default="paramiko", help="SFTP_BACKEND: paramiko, asyncssh ou ambos")
+    parser.add_argument("--iterations", type=int, default=5, help="batches medidos por cenário (+1 aquecimento)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latência injetada por operação SFTP")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="limite de banda do servidor (0 = sem limite)")
+    parser.add_argument("--quick", action="store_true", help="matriz reduzida (files=1,20 sizes=4k concurrency=4)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="grava os resultados como baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="piora relativa aceita antes de acusar regressão")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--timeout", type=float, default=600.0, help="tempo máximo por cenário (s)")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.files, args.sizes, args.concurrency = "1,20", "4k", "4"
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    scenarios = [
+        {"mode": mode, "files": int(files), "size": parse_size(size), "concurrency": int(concurrency),
+         "iterations": args.iterations, "backend": backend.strip()}
+        for backend in args.backends.split(",")
+        for mode in modes
+        for files in args.files.split(",")
+        for size in args.sizes.split(",")
+        for concurrency in args.concurrency.split(",")
+    ]
+
+    workdir = tempfile.mkdtemp(prefix="bench_sftp_")
+    key_path = os.path.join(workdir, "id_rsa")
+    paramiko.RSAKey.generate(2048).write_private_key_file(key_path)
+    server = LocalSFTPServer(os.path.join(workdir, "root"), args.latency_ms, args.bandwidth_mbps).start()
+
+    conditions = {"latency_ms": args.latency_ms, "bandwidth_mbps": args.bandwidth_mbps}
+    print(f"Servidor SFTP local na porta {server.port} ({conditions})")
+    print(f"{'cenário':<32} {'files/s':>9} {'MB/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'RSS MB':>7}")
+
+    results = {}
+    try:
+        for scenario in scenarios:
+            key = scenario_key(scenario)
+            # Cada cenário escreve numa árvore limpa (diretórios contam no tempo)
+            shutil.rmtree(os.path.join(server.root, "data"), ignore_errors=True)
+            result = run_scenario(dict(scenario, port=server.port, key_path=key_path), args.timeout)
+            results[key] = result
+            if "error" in result:
+                print(f"{key:<32} ERRO: {result['error']}")
+            else:
+                print(f"{key:<32} {result['files_per_s']:>9} {result['mb_per_s']:>8} "
+                      f"{result['p50_ms']:>9} {result['p99_ms']:>9} {result['peak_rss_mb']:>7}")
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("conditions") != conditions:
+            print(f"Aviso: baseline medido com {baseline.get('conditions')}, comparação pouco confiável.")
+        print(f"\nComparação com {args.baseline} (tolerância {args.tolerance:.0%}):")
+        regressions = compare(results, baseline.get("results", {}), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSÃO {regression}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "conditions": conditions,
+                "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                            "cpus": os.cpu_count()},
+                "results": {k: v for k, v in results.items() if "error" not in v},
+            }, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline gravado em {args.baseline}")
+
+    failed = any("error" in result for result in results.values())
+    return 1 if failed or (regressions and args.fail_on_regression) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Servidor SFTP local (paramiko ServerInterface/SFTPServer em loopback) para os benchmarks.
+
+Aceita qualquer chave pública, grava num diretório temporário e pode simular
+um NAS mais lento: latência fixa por operação SFTP e limite de banda compartilhado
+por todas as conexões (como um link único).
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+import paramiko
+from paramiko import (
+    AUTH_SUCCESSFUL,
+    OPEN_SUCCEEDED,
+    SFTP_OK,
+    ServerInterface,
+    SFTPAttributes,
+    SFTPHandle,
+    SFTPServer,
+    SFTPServerInterface,
+)
+
+# Clientes encerrando no fim de cada cenário geram "Connection reset" no lado servidor
+logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+
+
+class Throttle:
+    """
+    Balde de tokens simples: `consume(n)` dorme o necessário para respeitar `rate` bytes/s.
+    """
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_free = time.monotonic()
+
+    def consume(self, nbytes: int):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_free)
+            self._next_free = start + nbytes / self.rate
+            delay = self._next_free - now
+        time.sleep(delay)
+
+
+class _Server(ServerInterface):
+    def check_auth_publickey(self, username, key):
+        return AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return "publickey"
+
+    def check_channel_request(self, kind, chanid):
+        return OPEN_SUCCEEDED
+
+
+class _Handle(SFTPHandle):
+    server = None  # LocalSFTPServer dono do handle
+
+    def stat(self):
+        return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+    def chattr(self, attr):
+        if attr._flags & attr.FLAG_SIZE:
+            self.writefile.truncate(attr.st_size)
+        return SFTP_OK
+
+    def write(self, offset, data):
+        self.server.throttle.consume(len(data))
+        return super().write(offset, data)
+
+
+class _SFTPInterface(SFTPServerInterface):
+    def __init__(self, server, *args, owner: "LocalSFTPServer" = None, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.owner = owner
+
+    def _delay(self):
+        if self.owner.latency:
+            time.sleep(self.owner.latency)
+
+    def _real(self, path: str) -> str:
+        return self.owner.root + self.canonicalize(path)
+
+    def canonicalize(self, path):
+        return os.path.normpath(path if path.startswith("/") else "/" + path)
+
+    def list_folder(self, path):
+        self._delay()
+        real = self._real(path)
+        out = []
+        for name in os.listdir(real):
+            attr = SFTPAttributes.from_stat(os.stat(os.path.join(real, name)))
+            attr.filename = name
+            out.append(attr)
+        return out
+
+    def stat(self, path):
+        self._delay()
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._real(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        self._delay()
+        try:
+            fd = os.open(self._real(path), flags, 0o666)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        handle = _Handle(flags)
+        handle.server = self.owner
+        handle.filename = self._real(path)
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        self._delay()
+        try:
+            os.remove(self._real(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        self._delay()
+        os.rename(self._real(oldpath), self._real(newpath))
+        return SFTP_OK
+
+    def posix_rename(self, oldpath, newpath):
+        self._delay()
+        os.replace(self._real(oldpath), self._real(newpath))
+        return SFTP_OK
+
+    def mkdir(self, path, attr):
+        self._delay()
+        try:
+            os.mkdir(self._real(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        self._delay()
+        os.rmdir(self._real(path))
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        self._delay()
+        if attr._flags & attr.FLAG_SIZE:
+            os.truncate(self._real(path), attr.st_size)
+        return SFTP_OK
+
+
+class LocalSFTPServer:
+    """
+    Sobe um servidor SFTP em 127.0.0.1 numa porta livre, numa thread daemon.
+
+        server = LocalSFTPServer(root, latency_ms=5, bandwidth_mbps=100).start()
+        ... settings SFTP_HOST=127.0.0.1, SFTP_PORT=server.port ...
+        server.stop()
+    """
+    def __init__(self, root: str, latency_ms: float = 0.0, bandwidth_mbps: float = 0.0):
+        self.root = root.rstrip("/")
+        self.latency = latency_ms / 1000.0
+        # Mbit/s -> bytes/s; 0 = sem limite
+        self.throttle = Throttle(bandwidth_mbps * 1_000_000 / 8)
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.port: Optional[int] = None
+        self._sock: Optional[socket.socket] = None
+        self._transports = []
+        self._stopped = threading.Event()
+
+    def start(self) -> "LocalSFTPServer":
+        os.makedirs(self.root, exist_ok=True)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(128)
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name="bench-sftp", daemon=True).start()
+        return self
+
+    def _accept_loop(self):
+        while not self._stopped.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self.host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, _SFTPInterface, owner=self)
+            transport.start_server(server=_Server())
+            self._transports.append(transport)
+
+    def stop(self):
+        self._stopped.set()
+        if self._sock is not None:
+            self._sock.close()
+        for transport in self._transports:
+            transport.close()